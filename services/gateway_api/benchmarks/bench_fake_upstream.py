@@ -0,0 +1,112 @@
+"""Concurrent streamed completions through the real upstream client.
+
+Starts ``gateway_api.fake_llm`` under uvicorn on a local port and drives
+``openai_client.stream_chat_completion`` against it with the production
+HTTP pool, reporting time to first delta, throughput and errors. No API key
+or network access needed:
+
+    PYTHONPATH=.:services/gateway_api/src GATEWAY_SHARED_SECRET=x \\
+        python services/gateway_api/benchmarks/bench_fake_upstream.py --streams 200 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import time
+
+import uvicorn
+
+from gateway_api import openai_client
+from gateway_api.fake_llm import FakeLLMSettings, create_app
+from gateway_api.settings import get_settings
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def one_stream(settings, messages) -> tuple[float | None, int, str | None]:
+    started = time.perf_counter()
+    first_delta = None
+    tokens = 0
+    try:
+        async for event in openai_client.stream_chat_completion(settings, "gpt-5.2", messages):
+            if event["type"] == "delta":
+                tokens += 1
+                if first_delta is None:
+                    first_delta = time.perf_counter() - started
+    except openai_client.OpenAIError as exc:
+        return first_delta, tokens, exc.code
+    return first_delta, tokens, None
+
+
+async def run(args: argparse.Namespace) -> None:
+    port = free_port()
+    fake = FakeLLMSettings.model_validate(
+        {
+            "FAKE_LLM_TTFT_MS": args.ttft_ms,
+            "FAKE_LLM_TOKENS_PER_SECOND": args.tokens_per_second,
+            "FAKE_LLM_JITTER_MS": args.jitter_ms,
+            "FAKE_LLM_COMPLETION_TOKENS": args.tokens,
+            "FAKE_LLM_ERROR_RATE": args.error_rate,
+            "FAKE_LLM_RATE_LIMIT_RATE": args.rate_limit_rate,
+            "FAKE_LLM_RETRY_AFTER_SECONDS": 0,
+        }
+    )
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    settings = get_settings().model_copy(
+        update={
+            "openai_api_key": "fake",
+            "openai_base_url": f"http://127.0.0.1:{port}/v1",
+            "openai_http2": False,
+            "openai_upstream_cooldown_seconds": 0.0,
+        }
+    )
+    messages = [{"role": "user", "content": "benchmark prompt " * 20}]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited():
+        async with semaphore:
+            return await one_stream(settings, messages)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(limited() for _ in range(args.streams)))
+    elapsed = time.perf_counter() - started
+
+    await openai_client.close_upstream_pool()
+    server.should_exit = True
+    await server_task
+
+    ttfts = sorted(ttft for ttft, _tokens, error in results if ttft is not None and error is None)
+    tokens = sum(count for _ttft, count, _error in results)
+    errors = [error for _ttft, _count, error in results if error is not None]
+    print(f"{args.streams} streams, concurrency {args.concurrency}, {elapsed:.2f} s")
+    if ttfts:
+        p95 = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))]
+        print(f"  first delta: p50 {statistics.median(ttfts) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+    print(f"  {tokens} deltas, {tokens / elapsed:.0f} deltas/s")
+    print(f"  errors: {len(errors)} {sorted(set(errors))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from shared.compression import SUPPORTED_ENCODINGS, DecompressionError, decompress
+
+
+class RequestDecompressionMiddleware:
+    # Runs inside the signature check, which hashes the encoded bytes, and
+    # hands the endpoint a plain body with Content-Encoding removed.
+    def __init__(self, app: ASGIApp, max_size: int) -> None:
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        headers = []
+        for name, value in scope["headers"]:
+            if name == b"content-encoding":
+                encoding = value.decode("latin-1").strip().lower()
+            else:
+                headers.append((name, value))
+        if not encoding or encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+        if encoding not in SUPPORTED_ENCODINGS:
+            response = JSONResponse(status_code=415, content={"detail": "unsupported content encoding"})
+            await response(scope, receive, send)
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        try:
+            body = decompress(b"".join(chunks), encoding, self.max_size)
+        except DecompressionError:
+            response = JSONResponse(status_code=400, content={"detail": "invalid encoded body"})
+            await response(scope, receive, send)
+            return
+
+        delivered = False
+
+        async def plain_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, str(len(body)).encode() if name == b"content-length" else value)
+            for name, value in headers
+        ]
+        await self.app(scope, plain_receive, send)
@@ -0,0 +1,204 @@
+"""OpenAI-compatible stand-in for load tests.
+
+Serves ``POST /v1/chat/completions`` in both streaming and non-streaming
+mode with configurable time to first token, token rate, jitter and injected
+failures, so the gateway's real upstream code path can run offline:
+
+    FAKE_LLM_TTFT_MS=300 FAKE_LLM_TOKENS_PER_SECOND=50 \\
+        uvicorn gateway_api.fake_llm:app --port 9000
+    OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=fake uvicorn gateway_api.main:app
+"""
+
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import Field, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit")
+
+
+class FakeLLMSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
+    ttft_ms: float = Field(default=200.0, validation_alias="FAKE_LLM_TTFT_MS")
+    tokens_per_second: float = Field(default=50.0, validation_alias="FAKE_LLM_TOKENS_PER_SECOND")
+    jitter_ms: float = Field(default=0.0, validation_alias="FAKE_LLM_JITTER_MS")
+    completion_tokens: int = Field(default=64, validation_alias="FAKE_LLM_COMPLETION_TOKENS")
+    error_rate: float = Field(default=0.0, validation_alias="FAKE_LLM_ERROR_RATE")
+    rate_limit_rate: float = Field(default=0.0, validation_alias="FAKE_LLM_RATE_LIMIT_RATE")
+    retry_after_seconds: int = Field(default=1, validation_alias="FAKE_LLM_RETRY_AFTER_SECONDS")
+    seed: int | None = Field(default=None, validation_alias="FAKE_LLM_SEED")
+
+    @field_validator("ttft_ms", "tokens_per_second", "jitter_ms")
+    @classmethod
+    def _non_negative(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("FAKE_LLM timings must be >= 0")
+        return value
+
+    @field_validator("completion_tokens")
+    @classmethod
+    def _completion_tokens_positive(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("FAKE_LLM_COMPLETION_TOKENS must be > 0")
+        return value
+
+    @field_validator("error_rate", "rate_limit_rate")
+    @classmethod
+    def _rate_is_probability(cls, value: float) -> float:
+        if not 0 <= value <= 1:
+            raise ValueError("FAKE_LLM error rates must be between 0 and 1")
+        return value
+
+    @field_validator("retry_after_seconds")
+    @classmethod
+    def _retry_after_non_negative(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("FAKE_LLM_RETRY_AFTER_SECONDS must be >= 0")
+        return value
+
+
+def _prompt_tokens(messages: list) -> int:
+    # Same rough four-characters-per-token rule the gateway uses.
+    chars = sum(len(str(message.get("content") or "")) for message in messages if isinstance(message, dict))
+    return chars // 4 + 1
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _error(status_code: int, message: str, err_type: str, code: str, headers: dict | None = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": err_type, "code": code}},
+        headers=headers,
+    )
+
+
+def create_app(settings: FakeLLMSettings) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    rng = random.Random(settings.seed)
+    stats = {"requests": 0, "streams": 0, "errors_injected": 0, "rate_limits_injected": 0, "tokens_sent": 0}
+
+    def delay(seconds: float) -> float:
+        if settings.jitter_ms:
+            seconds += rng.uniform(-settings.jitter_ms, settings.jitter_ms) / 1000
+        return max(seconds, 0.0)
+
+    def token_interval() -> float:
+        return 1 / settings.tokens_per_second if settings.tokens_per_second else 0.0
+
+    def completion(prompt_tokens: int) -> list[str]:
+        offset = prompt_tokens % len(WORDS)
+        return [WORDS[(offset + index) % len(WORDS)] + " " for index in range(settings.completion_tokens)]
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    def fake_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        stats["requests"] += 1
+        try:
+            body = await request.json()
+        except ValueError:
+            return _error(400, "invalid JSON body", "invalid_request_error", "invalid_json")
+        messages = body.get("messages") if isinstance(body, dict) else None
+        if not isinstance(messages, list) or not messages:
+            return _error(400, "messages must be a non-empty list", "invalid_request_error", "invalid_messages")
+
+        roll = rng.random()
+        if roll < settings.rate_limit_rate:
+            stats["rate_limits_injected"] += 1
+            return _error(
+                429,
+                "injected rate limit",
+                "rate_limit_error",
+                "rate_limit_exceeded",
+                headers={"Retry-After": str(settings.retry_after_seconds)},
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            stats["errors_injected"] += 1
+            return _error(500, "injected failure", "server_error", "fake_error")
+
+        model = body.get("model") or "fake"
+        prompt_tokens = _prompt_tokens(messages)
+        tokens = completion(prompt_tokens)
+        usage = _usage(prompt_tokens, len(tokens))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay(settings.ttft_ms / 1000 + len(tokens) * token_interval()))
+            stats["tokens_sent"] += len(tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        stats["streams"] += 1
+
+        def chunk(delta: dict, finish_reason: str | None = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await asyncio.sleep(delay(settings.ttft_ms / 1000))
+            yield chunk({"role": "assistant", "content": ""})
+            interval = token_interval()
+            for index, token in enumerate(tokens):
+                if index and interval:
+                    await asyncio.sleep(delay(interval))
+                stats["tokens_sent"] += 1
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            if include_usage:
+                usage_chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+app = create_app(FakeLLMSettings())
@@ -0,0 +1,49 @@
+import time
+import uuid
+from collections import OrderedDict
+
+from gateway_api.settings import Settings
+
+
+class FinalTextCache:
+    # Keeps the full text of recently finished digest-mode streams so product
+    # can fetch it when the text it assembled from deltas fails the digest.
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, str, dict | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            stream_id, (expires_at, _text, _usage) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self._max_entries:
+                break
+            del self._entries[stream_id]
+
+    def put(self, text: str, usage: dict | None, now: float | None = None) -> str:
+        now = time.time() if now is None else now
+        stream_id = uuid.uuid4().hex
+        self._entries[stream_id] = (now + self._ttl_seconds, text, usage)
+        self._expire(now)
+        return stream_id
+
+    def get(self, stream_id: str, now: float | None = None) -> tuple[str, dict | None] | None:
+        now = time.time() if now is None else now
+        self._expire(now)
+        entry = self._entries.get(stream_id)
+        if entry is None:
+            return None
+        return entry[1], entry[2]
+
+
+_cache: FinalTextCache | None = None
+
+
+def get_final_cache(settings: Settings) -> FinalTextCache:
+    global _cache
+    if _cache is None:
+        _cache = FinalTextCache(settings.final_cache_size, settings.final_cache_ttl_seconds)
+    return _cache
@@ -1,23 +1,49 @@
-import json
 import logging
+import math
 import uuid
 
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
 
+from gateway_api.compression import RequestDecompressionMiddleware
+from gateway_api.finals import get_final_cache
 from gateway_api.logging_config import configure_logging
-from gateway_api.openai_client import OpenAIError, create_chat_completion, stream_chat_completion
+from gateway_api.openai_client import (
+    OpenAIError,
+    close_upstream_pool,
+    create_chat_completion,
+    get_upstream_pool,
+    stream_chat_completion,
+)
 from gateway_api.request_id import REQUEST_ID_HEADER, set_request_id
 from gateway_api.security import verify_gateway_signature
 from gateway_api.settings import get_settings
+from gateway_api.upstreams import get_upstream_balancer
+from shared.compression import SUPPORTED_ENCODINGS
 from shared.constants import MODEL_GPT_5_2
 from shared.schemas import ChatRequest, ChatResponse
+from shared.sse import final_digest, format_sse
+from shared.streaming import coalesce_deltas, iterate_until_disconnect
 
 settings = get_settings()
 configure_logging(settings.log_level)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Gateway API")
+app.add_middleware(RequestDecompressionMiddleware, max_size=settings.max_decompressed_bytes)
+if settings.response_compression:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.compression_min_bytes)
+
+
+@app.on_event("startup")
+async def startup_event():
+    get_upstream_pool(settings)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_upstream_pool()
 
 
 @app.middleware("http")
@@ -49,45 +75,79 @@ def health():
 
 @app.post("/internal/ping")
 async def internal_ping():
-    return {"status": "ok"}
+    # Product compresses request bodies only for gateways that list the encoding here.
+    return {"status": "ok", "content_encodings": list(SUPPORTED_ENCODINGS)}
+
+
+@app.get("/internal/upstream-pool")
+async def upstream_pool_stats():
+    return get_upstream_pool(settings).stats()
+
+
+@app.get("/internal/upstreams")
+async def upstream_balancer_stats():
+    return get_upstream_balancer(settings).stats()
+
+
+@app.get("/v1/chat/finals/{stream_id}")
+async def chat_final_text(stream_id: str):
+    entry = get_final_cache(settings).get(stream_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="final text not found")
+    text, usage = entry
+    return ChatResponse(text=text, usage=usage)
 
 
 @app.post("/v1/chat")
-async def chat(payload: ChatRequest):
+async def chat(payload: ChatRequest, request: Request):
     if payload.model != MODEL_GPT_5_2:
         raise HTTPException(status_code=400, detail="unsupported model")
 
     logger.info(
-        "chat request metadata company_id=%s user_id=%s conversation_id=%s message_id=%s",
+        "chat request metadata company_id=%s user_id=%s conversation_id=%s message_id=%s "
+        "context_tokens=%s context_token_budget=%s",
         payload.metadata.company_id,
         payload.metadata.user_id,
         payload.metadata.conversation_id,
         payload.metadata.message_id,
+        payload.metadata.context_tokens,
+        payload.metadata.context_token_budget,
     )
 
-    def _format_sse(event: str, data: dict) -> str:
-        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
-
     if payload.stream:
+        async def upstream_events():
+            async for event in stream_chat_completion(
+                settings,
+                payload.model,
+                [msg.model_dump() for msg in payload.messages],
+                payload.timeout,
+            ):
+                if event.get("type") == "delta":
+                    yield "delta", {"text": event.get("text", "")}
+                elif event.get("type") == "final":
+                    text = event.get("text", "")
+                    usage = event.get("usage")
+                    if payload.final_mode == "digest":
+                        stream_id = get_final_cache(settings).put(text, usage)
+                        yield "final", {**final_digest(text, usage), "stream_id": stream_id}
+                    else:
+                        yield "final", {"text": text, "usage": usage}
+                    return
+
         async def event_stream():
+            events = coalesce_deltas(
+                upstream_events(),
+                settings.sse_coalesce_max_latency_ms / 1000,
+                settings.sse_coalesce_max_bytes,
+            )
             try:
-                async for event in stream_chat_completion(
-                    settings,
-                    payload.model,
-                    [msg.model_dump() for msg in payload.messages],
-                    payload.timeout,
-                ):
-                    if event.get("type") == "delta":
-                        yield _format_sse("delta", {"text": event.get("text", "")})
-                    elif event.get("type") == "final":
-                        yield _format_sse(
-                            "final",
-                            {"text": event.get("text", ""), "usage": event.get("usage")},
-                        )
+                async for event, data in iterate_until_disconnect(request.receive, events):
+                    yield format_sse(event, data)
+                    if event == "final":
                         return
             except OpenAIError as exc:
                 logger.warning("openai error code=%s status=%s", exc.code, exc.status_code)
-                yield _format_sse(
+                yield format_sse(
                     "error",
                     {
                         "type": exc.err_type,
@@ -109,8 +169,12 @@ async def chat(payload: ChatRequest):
         )
     except OpenAIError as exc:
         logger.warning("openai error code=%s status=%s", exc.code, exc.status_code)
+        headers = None
+        if exc.retry_after is not None:
+            headers = {"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
         return JSONResponse(
             status_code=exc.status_code,
+            headers=headers,
             content={
                 "error": {
                     "type": exc.err_type,
@@ -1,11 +1,19 @@
+import asyncio
 import json
 import logging
+from contextlib import aclosing
 
 import httpx
 
 from gateway_api.settings import Settings
-
-OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+from gateway_api.upstreams import (
+    Upstream,
+    UpstreamBalancer,
+    estimate_prompt_tokens,
+    get_upstream_balancer,
+    parse_retry_after,
+)
+from shared.sse import iter_sse
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +26,7 @@ class OpenAIError(Exception):
         code: str,
         retryable: bool,
         err_type: str,
+        retry_after: float | None = None,
     ) -> None:
         super().__init__(message)
         self.status_code = status_code
@@ -25,6 +34,107 @@ class OpenAIError(Exception):
         self.code = code
         self.retryable = retryable
         self.err_type = err_type
+        self.retry_after = retry_after
+
+
+class UpstreamHttpPool:
+    def __init__(
+        self,
+        settings: Settings,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        limits = httpx.Limits(
+            max_connections=settings.openai_pool_max_connections,
+            max_keepalive_connections=settings.openai_pool_max_keepalive_connections,
+            keepalive_expiry=settings.openai_pool_keepalive_expiry_seconds,
+        )
+        self._transport = transport or httpx.AsyncHTTPTransport(
+            http2=settings.openai_http2,
+            limits=limits,
+        )
+        self._client = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=settings.openai_timeout_seconds,
+        )
+        self._http2 = settings.openai_http2
+        self._max_connections = settings.openai_pool_max_connections
+        self._requests_total = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._streams_completed = 0
+        self._streams_cancelled = 0
+        self._avg_completion_tokens = 0.0
+        self._cancelled_tokens_streamed = 0
+        self._cancelled_tokens_saved = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
+
+    def request_started(self) -> None:
+        self._requests_total += 1
+        self._in_flight += 1
+        if self._in_flight > self._peak_in_flight:
+            self._peak_in_flight = self._in_flight
+
+    def request_finished(self) -> None:
+        self._in_flight = max(self._in_flight - 1, 0)
+
+    def stream_completed(self, completion_tokens: int) -> None:
+        self._streams_completed += 1
+        # Running mean of completed answers; used to estimate what a
+        # cancelled stream would still have generated.
+        self._avg_completion_tokens += (
+            completion_tokens - self._avg_completion_tokens
+        ) / self._streams_completed
+
+    def stream_cancelled(self, tokens_streamed: int) -> None:
+        self._streams_cancelled += 1
+        self._cancelled_tokens_streamed += tokens_streamed
+        self._cancelled_tokens_saved += max(self._avg_completion_tokens - tokens_streamed, 0.0)
+
+    def stats(self) -> dict[str, object]:
+        connections = list(getattr(getattr(self._transport, "_pool", None), "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "http2": self._http2,
+            "max_connections": self._max_connections,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "requests_total": self._requests_total,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "saturation": round(len(connections) / self._max_connections, 3),
+            "streams_completed": self._streams_completed,
+            "streams_cancelled": self._streams_cancelled,
+            "cancelled_tokens_streamed": self._cancelled_tokens_streamed,
+            "cancelled_tokens_saved_estimate": round(self._cancelled_tokens_saved),
+        }
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_pool: UpstreamHttpPool | None = None
+
+
+def get_upstream_pool(settings: Settings) -> UpstreamHttpPool:
+    global _pool
+    if _pool is None or _pool.is_closed:
+        _pool = UpstreamHttpPool(settings)
+    return _pool
+
+
+async def close_upstream_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
 
 
 def _retryable_for_status(status_code: int) -> bool:
@@ -41,13 +151,50 @@ def _extract_error(payload: dict) -> tuple[str, str]:
     return (str(err_type), str(err_code))
 
 
-async def create_chat_completion(
-    settings: Settings,
-    model: str,
-    messages: list[dict],
-    timeout_seconds: int | None = None,
-) -> tuple[str, dict | None]:
-    if not settings.openai_api_key:
+def _response_error(status_code: int, raw: bytes, retry_after: float | None) -> OpenAIError:
+    err_message = "upstream error"
+    err_type = "upstream_error"
+    err_code = "upstream_error"
+    try:
+        payload = json.loads(raw)
+        err_type, err_code = _extract_error(payload)
+        if isinstance(payload, dict) and isinstance(payload.get("error"), dict):
+            err_message = payload["error"].get("message") or err_message
+    except ValueError:
+        logger.warning("non-json upstream error: %s", raw)
+    return OpenAIError(
+        status_code=status_code,
+        message=err_message,
+        code=err_code or err_type,
+        retryable=_retryable_for_status(status_code),
+        err_type=err_type,
+        retry_after=retry_after,
+    )
+
+
+def _timeout_error() -> OpenAIError:
+    return OpenAIError(
+        status_code=502,
+        message="upstream timeout",
+        code="upstream_timeout",
+        retryable=True,
+        err_type="upstream_error",
+    )
+
+
+def _connection_error() -> OpenAIError:
+    return OpenAIError(
+        status_code=502,
+        message="upstream connection error",
+        code="upstream_unavailable",
+        retryable=True,
+        err_type="upstream_error",
+    )
+
+
+def _select_upstreams(settings: Settings, estimated_tokens: int) -> tuple[UpstreamBalancer, list[Upstream]]:
+    balancer = get_upstream_balancer(settings)
+    if not balancer.upstreams:
         raise OpenAIError(
             status_code=503,
             message="missing OpenAI API key",
@@ -55,55 +202,58 @@ async def create_chat_completion(
             retryable=False,
             err_type="gateway_error",
         )
+    candidates = balancer.candidates(estimated_tokens)
+    if not candidates:
+        raise OpenAIError(
+            status_code=429,
+            message="all upstreams are rate limited",
+            code="upstream_throttled",
+            retryable=True,
+            err_type="rate_limit_error",
+            retry_after=balancer.retry_after(),
+        )
+    return balancer, candidates
+
+
+def _can_fail_over(exc: OpenAIError) -> bool:
+    # Another key helps with throttling, outages and a key that was revoked;
+    # it does not help with a request the upstream considers invalid.
+    return exc.retryable or exc.status_code in (401, 403)
+
 
-    headers = {
-        "Authorization": f"Bearer {settings.openai_api_key}",
+def _headers(upstream: Upstream) -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {upstream.api_key}",
         "Content-Type": "application/json",
     }
-    payload = {
-        "model": model,
-        "messages": messages,
-    }
 
+
+async def _complete_once(
+    pool: UpstreamHttpPool,
+    balancer: UpstreamBalancer,
+    upstream: Upstream,
+    payload: dict,
+    timeout: int,
+    estimated_tokens: int,
+) -> tuple[str, dict | None]:
+    balancer.acquire(upstream, estimated_tokens)
+    pool.request_started()
     try:
-        timeout = timeout_seconds or settings.openai_timeout_seconds
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            resp = await client.post(OPENAI_CHAT_URL, json=payload, headers=headers)
+        resp = await pool.client.post(upstream.chat_url, json=payload, headers=_headers(upstream), timeout=timeout)
     except httpx.TimeoutException:
-        raise OpenAIError(
-            status_code=502,
-            message="upstream timeout",
-            code="upstream_timeout",
-            retryable=True,
-            err_type="upstream_error",
-        )
+        balancer.record_failure(upstream, None)
+        raise _timeout_error()
     except httpx.RequestError:
-        raise OpenAIError(
-            status_code=502,
-            message="upstream connection error",
-            code="upstream_unavailable",
-            retryable=True,
-            err_type="upstream_error",
-        )
+        balancer.record_failure(upstream, None)
+        raise _connection_error()
+    finally:
+        pool.request_finished()
+        balancer.release(upstream)
 
     if resp.status_code != 200:
-        err_message = "upstream error"
-        err_type = "upstream_error"
-        err_code = "upstream_error"
-        try:
-            payload = resp.json()
-            err_type, err_code = _extract_error(payload)
-            if isinstance(payload, dict) and isinstance(payload.get("error"), dict):
-                err_message = payload["error"].get("message") or err_message
-        except ValueError:
-            logger.warning("non-json upstream error: %s", resp.text)
-        raise OpenAIError(
-            status_code=resp.status_code,
-            message=err_message,
-            code=err_code or err_type,
-            retryable=_retryable_for_status(resp.status_code),
-            err_type=err_type,
-        )
+        retry_after = parse_retry_after(resp.headers)
+        balancer.record_failure(upstream, resp.status_code, retry_after)
+        raise _response_error(resp.status_code, resp.content, retry_after)
 
     data = resp.json()
     choices = data.get("choices") or []
@@ -126,110 +276,146 @@ async def create_chat_completion(
             err_type="upstream_error",
         )
     usage = data.get("usage")
+    balancer.record_usage(upstream, estimated_tokens, usage)
     return text, usage
 
 
-async def stream_chat_completion(
+async def create_chat_completion(
     settings: Settings,
     model: str,
     messages: list[dict],
     timeout_seconds: int | None = None,
-):
-    if not settings.openai_api_key:
-        raise OpenAIError(
-            status_code=503,
-            message="missing OpenAI API key",
-            code="missing_api_key",
-            retryable=False,
-            err_type="gateway_error",
-        )
-
-    headers = {
-        "Authorization": f"Bearer {settings.openai_api_key}",
-        "Content-Type": "application/json",
-    }
+) -> tuple[str, dict | None]:
+    estimated_tokens = estimate_prompt_tokens(messages)
+    balancer, candidates = _select_upstreams(settings, estimated_tokens)
     payload = {
         "model": model,
         "messages": messages,
-        "stream": True,
-        "stream_options": {"include_usage": True},
     }
     timeout = timeout_seconds or settings.openai_timeout_seconds
+    pool = get_upstream_pool(settings)
+    for index, upstream in enumerate(candidates):
+        try:
+            return await _complete_once(pool, balancer, upstream, payload, timeout, estimated_tokens)
+        except OpenAIError as exc:
+            if index + 1 == len(candidates) or not _can_fail_over(exc):
+                raise
+            balancer.record_failover(upstream)
+            logger.warning("upstream %s failed code=%s, failing over", upstream.name, exc.code)
+    raise AssertionError("unreachable")
+
 
+async def _stream_once(
+    pool: UpstreamHttpPool,
+    balancer: UpstreamBalancer,
+    upstream: Upstream,
+    payload: dict,
+    timeout: int,
+    estimated_tokens: int,
+):
+    balancer.acquire(upstream, estimated_tokens)
+    pool.request_started()
+    # OpenAI sends roughly one token per content chunk.
+    chunks_streamed = 0
+    finished = False
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            async with client.stream("POST", OPENAI_CHAT_URL, json=payload, headers=headers) as resp:
-                if resp.status_code != 200:
-                    err_message = "upstream error"
-                    err_type = "upstream_error"
-                    err_code = "upstream_error"
-                    raw = await resp.aread()
-                    try:
-                        payload = json.loads(raw)
-                        err_type, err_code = _extract_error(payload)
-                        if isinstance(payload, dict) and isinstance(payload.get("error"), dict):
-                            err_message = payload["error"].get("message") or err_message
-                    except json.JSONDecodeError:
-                        logger.warning("non-json upstream error: %s", raw)
+        async with pool.client.stream(
+            "POST",
+            upstream.chat_url,
+            json=payload,
+            headers=_headers(upstream),
+            timeout=timeout,
+        ) as resp:
+            if resp.status_code != 200:
+                raw = await resp.aread()
+                retry_after = parse_retry_after(resp.headers)
+                balancer.record_failure(upstream, resp.status_code, retry_after)
+                raise _response_error(resp.status_code, raw, retry_after)
+
+            text_chunks: list[str] = []
+            usage = None
+            async for event in iter_sse(resp.aiter_bytes()):
+                if event.data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(event.data)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(chunk, dict) and "error" in chunk:
+                    err_type, err_code = _extract_error(chunk)
+                    err_message = chunk.get("error", {}).get("message", "upstream error")
                     raise OpenAIError(
-                        status_code=resp.status_code,
+                        status_code=502,
                         message=err_message,
                         code=err_code or err_type,
-                        retryable=_retryable_for_status(resp.status_code),
+                        retryable=True,
                         err_type=err_type,
                     )
 
-                buffer_text = ""
-                usage = None
-                async for line in resp.aiter_lines():
-                    if not line:
-                        continue
-                    if not line.startswith("data: "):
-                        continue
-                    data = line[6:].strip()
-                    if data == "[DONE]":
-                        break
-                    try:
-                        chunk = json.loads(data)
-                    except json.JSONDecodeError:
-                        continue
-                    if isinstance(chunk, dict) and "error" in chunk:
-                        err_type, err_code = _extract_error(chunk)
-                        err_message = chunk.get("error", {}).get("message", "upstream error")
-                        raise OpenAIError(
-                            status_code=502,
-                            message=err_message,
-                            code=err_code or err_type,
-                            retryable=True,
-                            err_type=err_type,
-                        )
-
-                    if isinstance(chunk, dict) and chunk.get("usage"):
-                        usage = chunk["usage"]
-
-                    choices = chunk.get("choices") or []
-                    if not choices:
-                        continue
-                    delta = choices[0].get("delta") or {}
-                    delta_text = delta.get("content")
-                    if delta_text:
-                        buffer_text += delta_text
-                        yield {"type": "delta", "text": delta_text}
-
-                yield {"type": "final", "text": buffer_text, "usage": usage}
+                if isinstance(chunk, dict) and chunk.get("usage"):
+                    usage = chunk["usage"]
+
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta") or {}
+                delta_text = delta.get("content")
+                if delta_text:
+                    text_chunks.append(delta_text)
+                    chunks_streamed += 1
+                    yield {"type": "delta", "text": delta_text}
+
+            finished = True
+            completion_tokens = (usage or {}).get("completion_tokens") or chunks_streamed
+            pool.stream_completed(completion_tokens)
+            balancer.record_usage(upstream, estimated_tokens, usage)
+            yield {"type": "final", "text": "".join(text_chunks), "usage": usage}
     except httpx.TimeoutException:
-        raise OpenAIError(
-            status_code=502,
-            message="upstream timeout",
-            code="upstream_timeout",
-            retryable=True,
-            err_type="upstream_error",
-        )
+        balancer.record_failure(upstream, None)
+        raise _timeout_error()
     except httpx.RequestError:
-        raise OpenAIError(
-            status_code=502,
-            message="upstream connection error",
-            code="upstream_unavailable",
-            retryable=True,
-            err_type="upstream_error",
-        )
+        balancer.record_failure(upstream, None)
+        raise _connection_error()
+    except (asyncio.CancelledError, GeneratorExit):
+        # The caller went away; leaving the `async with` above closes the
+        # upstream response, which stops generation on the upstream's side.
+        if not finished:
+            pool.stream_cancelled(chunks_streamed)
+        raise
+    finally:
+        pool.request_finished()
+        balancer.release(upstream)
+
+
+async def stream_chat_completion(
+    settings: Settings,
+    model: str,
+    messages: list[dict],
+    timeout_seconds: int | None = None,
+):
+    estimated_tokens = estimate_prompt_tokens(messages)
+    balancer, candidates = _select_upstreams(settings, estimated_tokens)
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    timeout = timeout_seconds or settings.openai_timeout_seconds
+    pool = get_upstream_pool(settings)
+    for index, upstream in enumerate(candidates):
+        # Failover is only possible until the first event is passed on.
+        streaming = False
+        try:
+            async with aclosing(
+                _stream_once(pool, balancer, upstream, payload, timeout, estimated_tokens)
+            ) as events:
+                async for event in events:
+                    streaming = True
+                    yield event
+            return
+        except OpenAIError as exc:
+            if streaming or index + 1 == len(candidates) or not _can_fail_over(exc):
+                raise
+            balancer.record_failover(upstream)
+            logger.warning("upstream %s failed code=%s, failing over", upstream.name, exc.code)
@@ -1,11 +1,13 @@
 import hashlib
 import hmac
+import math
+import sqlite3
 import threading
 import time
 
 from fastapi import HTTPException, Request, status
 
-from gateway_api.settings import get_settings
+from gateway_api.settings import Settings, get_settings
 
 SIGNATURE_HEADER = "X-Signature"
 TIMESTAMP_HEADER = "X-Timestamp"
@@ -14,35 +16,142 @@ BODY_HASH_HEADER = "X-Body-SHA256"
 
 
 class NonceCache:
-    def __init__(self, ttl_seconds: int) -> None:
+    def __init__(self, ttl_seconds: int, bucket_seconds: float = 1.0) -> None:
         self._ttl_seconds = ttl_seconds
+        self._bucket_seconds = bucket_seconds
         self._lock = threading.Lock()
-        self._entries: dict[str, float] = {}
-
-    def _prune(self, now: float) -> None:
-        expired = [nonce for nonce, exp in self._entries.items() if exp <= now]
-        for nonce in expired:
-            del self._entries[nonce]
+        self._entries: dict[str, int] = {}
+        # Expiry wheel: nonces are filed under the bucket in which they expire, so
+        # each request only sweeps the buckets that elapsed since the previous one.
+        self._ring_size = math.ceil(ttl_seconds / bucket_seconds) + 2
+        self._ring: list[list[str]] = [[] for _ in range(self._ring_size)]
+        self._swept_until: int | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bucket_index(self, ts: float) -> int:
+        return math.floor(ts / self._bucket_seconds)
+
+    def _expire(self, current: int) -> None:
+        if self._swept_until is None:
+            self._swept_until = current
+            return
+        if current <= self._swept_until:
+            return
+        start = max(self._swept_until + 1, current - self._ring_size + 1)
+        for bucket in range(start, current + 1):
+            slot_index = bucket % self._ring_size
+            slot = self._ring[slot_index]
+            if not slot:
+                continue
+            survivors: list[str] = []
+            for nonce in slot:
+                expires_bucket = self._entries.get(nonce)
+                if expires_bucket is None:
+                    continue
+                if expires_bucket <= current:
+                    del self._entries[nonce]
+                elif expires_bucket % self._ring_size == slot_index:
+                    survivors.append(nonce)
+            self._ring[slot_index] = survivors
+        self._swept_until = current
 
     def check_and_store(self, nonce: str, now: float) -> bool:
         with self._lock:
-            self._prune(now)
+            self._expire(self._bucket_index(now))
             if nonce in self._entries:
                 return False
-            self._entries[nonce] = now + self._ttl_seconds
+            expires_bucket = self._bucket_index(now + self._ttl_seconds) + 1
+            self._entries[nonce] = expires_bucket
+            self._ring[expires_bucket % self._ring_size].append(nonce)
             return True
 
 
+class SqliteNonceStore:
+    def __init__(self, path: str, ttl_seconds: int, bucket_seconds: float = 1.0) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._bucket_seconds = bucket_seconds
+        self._lock = threading.Lock()
+        self._swept_until: int | None = None
+        self._conn = sqlite3.connect(
+            path,
+            timeout=5.0,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS gateway_nonces ("
+            "nonce TEXT PRIMARY KEY, expires_bucket INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_gateway_nonces_expires_bucket "
+            "ON gateway_nonces (expires_bucket)"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM gateway_nonces").fetchone()[0]
+
+    def _bucket_index(self, ts: float) -> int:
+        return math.floor(ts / self._bucket_seconds)
+
+    def check_and_store(self, nonce: str, now: float) -> bool:
+        current = self._bucket_index(now)
+        expires_bucket = self._bucket_index(now + self._ttl_seconds) + 1
+        with self._lock:
+            if self._swept_until is None or current > self._swept_until:
+                self._conn.execute(
+                    "DELETE FROM gateway_nonces WHERE expires_bucket <= ?",
+                    (current,),
+                )
+                self._swept_until = current
+            cursor = self._conn.execute(
+                "INSERT INTO gateway_nonces (nonce, expires_bucket) VALUES (?, ?) "
+                "ON CONFLICT(nonce) DO UPDATE SET expires_bucket = excluded.expires_bucket "
+                "WHERE gateway_nonces.expires_bucket <= ?",
+                (nonce, expires_bucket, current),
+            )
+            return cursor.rowcount == 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_nonce_store(settings: Settings) -> NonceCache | SqliteNonceStore:
+    if settings.gateway_nonce_backend == "sqlite":
+        return SqliteNonceStore(
+            settings.gateway_nonce_sqlite_path,
+            settings.gateway_nonce_ttl_seconds,
+        )
+    return NonceCache(settings.gateway_nonce_ttl_seconds)
+
+
 _settings = get_settings()
-_nonce_cache = NonceCache(_settings.gateway_nonce_ttl_seconds)
+_nonce_cache = build_nonce_store(_settings)
 
 
 def _body_sha256(body: bytes) -> str:
     return hashlib.sha256(body).hexdigest()
 
 
-def _canonical_string(method: str, path: str, timestamp: str, nonce: str, body_hash: str) -> str:
-    return "\n".join([method, path, timestamp, nonce, body_hash])
+def _canonical_string(
+    method: str,
+    path: str,
+    timestamp: str,
+    nonce: str,
+    body_hash: str,
+    content_encoding: str | None = None,
+) -> str:
+    # body_hash is over the bytes on the wire (compressed, if encoded), and the
+    # encoding itself is signed so it cannot be stripped or swapped in transit.
+    parts = [method, path, timestamp, nonce, body_hash]
+    if content_encoding:
+        parts.append(content_encoding)
+    return "\n".join(parts)
 
 
 def _path_with_query(request: Request) -> str:
@@ -80,6 +189,7 @@ async def verify_gateway_signature(request: Request) -> None:
         timestamp,
         nonce,
         body_hash,
+        request.headers.get("content-encoding"),
     )
     expected = hmac.new(
         _settings.gateway_shared_secret.encode("utf-8"),
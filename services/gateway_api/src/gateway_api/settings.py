@@ -1,8 +1,48 @@
 from functools import lru_cache
 
-from pydantic import Field, field_validator
+from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+class UpstreamConfig(BaseModel):
+    # One entry of OPENAI_UPSTREAMS: an OpenAI-compatible base URL and key.
+    name: str | None = None
+    base_url: str = DEFAULT_OPENAI_BASE_URL
+    api_key: str
+    weight: float = 1.0
+    rpm: int = 0
+    tpm: int = 0
+
+    @field_validator("base_url")
+    @classmethod
+    def _base_url_http(cls, value: str) -> str:
+        if not value.startswith(("http://", "https://")):
+            raise ValueError("OPENAI_UPSTREAMS base_url must be an http(s) URL")
+        return value.rstrip("/")
+
+    @field_validator("api_key")
+    @classmethod
+    def _api_key_not_empty(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("OPENAI_UPSTREAMS api_key must not be empty")
+        return value
+
+    @field_validator("weight")
+    @classmethod
+    def _weight_positive(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("OPENAI_UPSTREAMS weight must be > 0")
+        return value
+
+    @field_validator("rpm", "tpm")
+    @classmethod
+    def _limits_non_negative(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("OPENAI_UPSTREAMS rpm/tpm must be >= 0")
+        return value
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
@@ -11,13 +51,45 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     gateway_shared_secret: str = Field(..., validation_alias="GATEWAY_SHARED_SECRET")
     openai_api_key: str | None = Field(default=None, validation_alias="OPENAI_API_KEY")
+    openai_base_url: str = Field(default=DEFAULT_OPENAI_BASE_URL, validation_alias="OPENAI_BASE_URL")
+    openai_upstreams: list[UpstreamConfig] = Field(default=[], validation_alias="OPENAI_UPSTREAMS")
+    openai_upstream_cooldown_seconds: float = Field(
+        default=10.0, validation_alias="OPENAI_UPSTREAM_COOLDOWN_SECONDS"
+    )
     gateway_clock_skew_seconds: int = Field(
         default=60, validation_alias="GATEWAY_CLOCK_SKEW_SECONDS"
     )
     gateway_nonce_ttl_seconds: int = Field(
         default=300, validation_alias="GATEWAY_NONCE_TTL_SECONDS"
     )
+    gateway_nonce_backend: str = Field(default="memory", validation_alias="GATEWAY_NONCE_BACKEND")
+    gateway_nonce_sqlite_path: str = Field(
+        default="/tmp/gateway_nonces.sqlite3", validation_alias="GATEWAY_NONCE_SQLITE_PATH"
+    )
     openai_timeout_seconds: int = Field(default=30, validation_alias="OPENAI_TIMEOUT_SECONDS")
+    openai_http2: bool = Field(default=True, validation_alias="OPENAI_HTTP2")
+    openai_pool_max_connections: int = Field(
+        default=100, validation_alias="OPENAI_POOL_MAX_CONNECTIONS"
+    )
+    openai_pool_max_keepalive_connections: int = Field(
+        default=20, validation_alias="OPENAI_POOL_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    openai_pool_keepalive_expiry_seconds: float = Field(
+        default=60.0, validation_alias="OPENAI_POOL_KEEPALIVE_EXPIRY_SECONDS"
+    )
+    sse_coalesce_max_latency_ms: int = Field(
+        default=30, validation_alias="GATEWAY_SSE_COALESCE_MAX_LATENCY_MS"
+    )
+    sse_coalesce_max_bytes: int = Field(default=4096, validation_alias="GATEWAY_SSE_COALESCE_MAX_BYTES")
+    final_cache_size: int = Field(default=1000, validation_alias="GATEWAY_FINAL_CACHE_SIZE")
+    response_compression: bool = Field(default=True, validation_alias="GATEWAY_RESPONSE_COMPRESSION")
+    compression_min_bytes: int = Field(default=1024, validation_alias="GATEWAY_COMPRESSION_MIN_BYTES")
+    max_decompressed_bytes: int = Field(
+        default=10_000_000, validation_alias="GATEWAY_MAX_DECOMPRESSED_BYTES"
+    )
+    final_cache_ttl_seconds: float = Field(
+        default=300.0, validation_alias="GATEWAY_FINAL_CACHE_TTL_SECONDS"
+    )
 
     @field_validator("gateway_shared_secret")
     @classmethod
@@ -26,6 +98,91 @@ class Settings(BaseSettings):
             raise ValueError("GATEWAY_SHARED_SECRET must not be empty")
         return value
 
+    @field_validator("gateway_nonce_backend")
+    @classmethod
+    def _nonce_backend_supported(cls, value: str) -> str:
+        value = value.strip().lower()
+        if value not in {"memory", "sqlite"}:
+            raise ValueError("GATEWAY_NONCE_BACKEND must be one of: memory, sqlite")
+        return value
+
+    @field_validator("openai_pool_max_connections")
+    @classmethod
+    def _pool_max_connections_positive(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("OPENAI_POOL_MAX_CONNECTIONS must be > 0")
+        return value
+
+    @field_validator("openai_pool_max_keepalive_connections")
+    @classmethod
+    def _pool_max_keepalive_non_negative(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("OPENAI_POOL_MAX_KEEPALIVE_CONNECTIONS must be >= 0")
+        return value
+
+    @field_validator("openai_pool_keepalive_expiry_seconds")
+    @classmethod
+    def _pool_keepalive_expiry_positive(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("OPENAI_POOL_KEEPALIVE_EXPIRY_SECONDS must be > 0")
+        return value
+
+    @field_validator("openai_base_url")
+    @classmethod
+    def _openai_base_url_http(cls, value: str) -> str:
+        if not value.startswith(("http://", "https://")):
+            raise ValueError("OPENAI_BASE_URL must be an http(s) URL")
+        return value.rstrip("/")
+
+    @field_validator("openai_upstream_cooldown_seconds")
+    @classmethod
+    def _upstream_cooldown_non_negative(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("OPENAI_UPSTREAM_COOLDOWN_SECONDS must be >= 0")
+        return value
+
+    @field_validator("sse_coalesce_max_latency_ms")
+    @classmethod
+    def _sse_coalesce_max_latency_non_negative(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("GATEWAY_SSE_COALESCE_MAX_LATENCY_MS must be >= 0")
+        return value
+
+    @field_validator("sse_coalesce_max_bytes")
+    @classmethod
+    def _sse_coalesce_max_bytes_positive(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("GATEWAY_SSE_COALESCE_MAX_BYTES must be > 0")
+        return value
+
+    @field_validator("final_cache_size")
+    @classmethod
+    def _final_cache_size_positive(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("GATEWAY_FINAL_CACHE_SIZE must be > 0")
+        return value
+
+    @field_validator("final_cache_ttl_seconds")
+    @classmethod
+    def _final_cache_ttl_positive(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("GATEWAY_FINAL_CACHE_TTL_SECONDS must be > 0")
+        return value
+
+    @field_validator("compression_min_bytes")
+    @classmethod
+    def _compression_min_bytes_non_negative(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("GATEWAY_COMPRESSION_MIN_BYTES must be >= 0")
+        return value
+
+    @field_validator("max_decompressed_bytes")
+    @classmethod
+    def _max_decompressed_bytes_positive(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("GATEWAY_MAX_DECOMPRESSED_BYTES must be > 0")
+        return value
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -0,0 +1,213 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from gateway_api.settings import Settings, UpstreamConfig
+
+
+class TokenBucket:
+    # Refills continuously at rate_per_minute / 60 per second up to one
+    # minute's worth. A rate of 0 means unlimited. The level may go negative
+    # when actual usage turns out larger than the estimate that was taken.
+    def __init__(self, rate_per_minute: int, now: float) -> None:
+        self.capacity = float(rate_per_minute)
+        self.level = float(rate_per_minute)
+        self._updated = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self._updated, 0.0)
+        self.level = min(self.capacity, self.level + elapsed * self.capacity / 60)
+        self._updated = now
+
+    def can_take(self, amount: float, now: float) -> bool:
+        if self.unlimited:
+            return True
+        self._refill(now)
+        # A request larger than the whole bucket still goes through once full.
+        return self.level >= min(amount, self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.unlimited:
+            return
+        self._refill(now)
+        self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class Upstream:
+    def __init__(self, index: int, config: UpstreamConfig, now: float) -> None:
+        self.name = config.name or f"upstream-{index}"
+        self.base_url = config.base_url.rstrip("/")
+        self.chat_url = f"{self.base_url}/chat/completions"
+        self.api_key = config.api_key
+        self.weight = config.weight
+        self.requests = TokenBucket(config.rpm, now)
+        self.tokens = TokenBucket(config.tpm, now)
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.requests_total = 0
+        self.failures = 0
+        self.failovers = 0
+        self.rate_limited = 0
+        self.tokens_used = 0
+
+    def stats(self, now: float) -> dict[str, object]:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "weight": self.weight,
+            "in_flight": self.in_flight,
+            "requests_total": self.requests_total,
+            "failures": self.failures,
+            "failovers": self.failovers,
+            "rate_limited": self.rate_limited,
+            "tokens_used": self.tokens_used,
+            "cooldown_seconds": round(max(self.cooldown_until - now, 0.0), 1),
+            "request_budget": None if self.requests.unlimited else round(self.requests.level, 1),
+            "token_budget": None if self.tokens.unlimited else round(self.tokens.level),
+        }
+
+
+class UpstreamBalancer:
+    def __init__(
+        self,
+        configs: list[UpstreamConfig],
+        cooldown_seconds: float,
+        rng: random.Random | None = None,
+    ) -> None:
+        now = time.monotonic()
+        self.configs = configs
+        self._upstreams = [Upstream(index, config, now) for index, config in enumerate(configs)]
+        self._cooldown_seconds = cooldown_seconds
+        self._rng = rng or random.Random()
+
+    @property
+    def upstreams(self) -> list[Upstream]:
+        return list(self._upstreams)
+
+    def candidates(self, estimated_tokens: int, now: float | None = None) -> list[Upstream]:
+        # Upstreams that are not cooling down and have budget left, in a
+        # weighted random order (Efraimidis-Spirakis keys), so traffic splits
+        # by weight and the rest of the order is the failover sequence.
+        now = time.monotonic() if now is None else now
+        ready = [
+            upstream
+            for upstream in self._upstreams
+            if upstream.cooldown_until <= now
+            and upstream.requests.can_take(1, now)
+            and upstream.tokens.can_take(estimated_tokens, now)
+        ]
+        return sorted(ready, key=lambda upstream: -(self._rng.random() ** (1 / upstream.weight)))
+
+    def retry_after(self, now: float | None = None) -> float:
+        # Rough time until some upstream can take a request again.
+        now = time.monotonic() if now is None else now
+        waits = []
+        for upstream in self._upstreams:
+            wait = max(upstream.cooldown_until - now, 0.0)
+            if not upstream.requests.unlimited and upstream.requests.level < 1:
+                wait = max(wait, (1 - upstream.requests.level) * 60 / upstream.requests.capacity)
+            waits.append(wait)
+        return min(waits, default=0.0)
+
+    def acquire(self, upstream: Upstream, estimated_tokens: int, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        upstream.requests.take(1, now)
+        upstream.tokens.take(estimated_tokens, now)
+        upstream.requests_total += 1
+        upstream.in_flight += 1
+
+    def release(self, upstream: Upstream) -> None:
+        upstream.in_flight = max(upstream.in_flight - 1, 0)
+
+    def record_usage(self, upstream: Upstream, estimated_tokens: int, usage: dict | None) -> None:
+        total = (usage or {}).get("total_tokens")
+        if not isinstance(total, int):
+            return
+        upstream.tokens_used += total
+        if total < estimated_tokens:
+            upstream.tokens.refund(estimated_tokens - total)
+        else:
+            upstream.tokens.take(total - estimated_tokens, time.monotonic())
+
+    def record_failure(
+        self,
+        upstream: Upstream,
+        status_code: int | None,
+        retry_after: float | None = None,
+        now: float | None = None,
+    ) -> None:
+        now = time.monotonic() if now is None else now
+        upstream.failures += 1
+        if status_code == 429:
+            upstream.rate_limited += 1
+            seconds = retry_after if retry_after is not None else self._cooldown_seconds
+            upstream.cooldown_until = max(upstream.cooldown_until, now + seconds)
+        elif status_code in (401, 403):
+            # A revoked or misconfigured key will not recover on its own soon.
+            upstream.cooldown_until = max(upstream.cooldown_until, now + self._cooldown_seconds)
+
+    def record_failover(self, upstream: Upstream) -> None:
+        upstream.failovers += 1
+
+    def stats(self, now: float | None = None) -> dict[str, object]:
+        now = time.monotonic() if now is None else now
+        return {"upstreams": [upstream.stats(now) for upstream in self._upstreams]}
+
+
+def upstream_configs(settings: Settings) -> list[UpstreamConfig]:
+    if settings.openai_upstreams:
+        return settings.openai_upstreams
+    if not settings.openai_api_key:
+        return []
+    return [UpstreamConfig(name="openai", base_url=settings.openai_base_url, api_key=settings.openai_api_key)]
+
+
+def parse_retry_after(headers: httpx.Headers) -> float | None:
+    raw_ms = headers.get("retry-after-ms")
+    if raw_ms:
+        try:
+            return max(float(raw_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(float(raw), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(raw).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_prompt_tokens(messages: list[dict]) -> int:
+    # About four characters per token; reconciled with the reported usage.
+    return sum(len(str(message.get("content") or "")) for message in messages) // 4 + 1
+
+
+_balancer: UpstreamBalancer | None = None
+
+
+def get_upstream_balancer(settings: Settings) -> UpstreamBalancer:
+    global _balancer
+    configs = upstream_configs(settings)
+    if _balancer is None or _balancer.configs != configs:
+        _balancer = UpstreamBalancer(configs, settings.openai_upstream_cooldown_seconds)
+    return _balancer
+
+
+def reset_upstream_balancer() -> None:
+    global _balancer
+    _balancer = None
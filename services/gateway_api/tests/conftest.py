@@ -23,6 +23,14 @@ from gateway_api import settings as settings_module
 settings_module.get_settings.cache_clear()
 
 from gateway_api.main import app
+from gateway_api.upstreams import reset_upstream_balancer
+
+
+@pytest.fixture(autouse=True)
+def _reset_upstream_balancer():
+    reset_upstream_balancer()
+    yield
+    reset_upstream_balancer()
 
 
 @pytest.fixture()
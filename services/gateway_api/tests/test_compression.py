@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+
+import gateway_api.main as gateway_main
+from shared.compression import DecompressionError, decompress, encode_body
+
+from .utils import sign_headers
+
+
+def _chat_body(content: str) -> bytes:
+    body = {
+        "messages": [{"role": "user", "content": content}],
+        "model": "gpt-5.2",
+        "stream": False,
+        "metadata": {"company_id": 1, "user_id": 1, "conversation_id": 1, "message_id": 1},
+    }
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+
+def test_encode_body_keeps_small_bodies_plain():
+    assert encode_body(b"x" * 10, "gzip", 1024) == (b"x" * 10, None)
+    assert encode_body(b"x" * 2048, "none", 1024) == (b"x" * 2048, None)
+
+    encoded, encoding = encode_body("привет ".encode() * 500, "gzip", 1024)
+    assert encoding == "gzip"
+    assert len(encoded) < 200
+    assert decompress(encoded, "gzip", 10_000) == "привет ".encode() * 500
+
+
+def test_decompress_rejects_oversized_and_broken_bodies():
+    bomb = gzip.compress(b"\0" * 100_000)
+    with pytest.raises(DecompressionError, match="too large"):
+        decompress(bomb, "gzip", 10_000)
+    with pytest.raises(DecompressionError):
+        decompress(b"not gzip", "gzip", 10_000)
+    with pytest.raises(DecompressionError):
+        decompress(gzip.compress(b"abc")[:-4], "gzip", 10_000)
+
+
+def test_gzip_request_is_verified_then_decompressed(client, monkeypatch):
+    seen = []
+
+    async def fake_create_chat(_settings, _model, messages, _timeout):
+        seen.append(messages)
+        return ("ok " * 1000, None)
+
+    monkeypatch.setattr(gateway_main, "create_chat_completion", fake_create_chat)
+    raw = gzip.compress(_chat_body("контекст " * 300))
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", raw, "gzip")
+    headers["Content-Type"] = "application/json"
+
+    resp = client.post("/v1/chat", headers=headers, content=raw)
+
+    assert resp.status_code == 200
+    assert seen[0][0]["content"] == "контекст " * 300
+    # Large JSON responses come back gzip-encoded (httpx decodes them).
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.json()["text"] == "ok " * 1000
+
+
+def test_content_encoding_is_covered_by_signature(client):
+    raw = gzip.compress(_chat_body("hi"))
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", raw)
+    headers["Content-Type"] = "application/json"
+    headers["Content-Encoding"] = "gzip"
+
+    resp = client.post("/v1/chat", headers=headers, content=raw)
+
+    assert resp.status_code == 401
+    assert resp.json()["detail"] == "invalid signature"
+
+
+def test_unsupported_content_encoding_is_rejected(client):
+    raw = b"\x00\x01"
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", raw, "br")
+    headers["Content-Type"] = "application/json"
+
+    resp = client.post("/v1/chat", headers=headers, content=raw)
+
+    assert resp.status_code == 415
@@ -1,3 +1,4 @@
+import hashlib
 import json
 
 import gateway_api.main as gateway_main
@@ -61,3 +62,82 @@ def test_contract_error_normalization(client, monkeypatch):
     assert payload["error"]["code"] == "rate_limit"
     assert payload["error"]["type"] == "rate_limit_error"
     assert payload["error"]["retryable"] is True
+
+
+def test_contract_stream_coalesces_deltas(client, monkeypatch):
+    async def fake_stream_chat(_settings, _model, _messages, _timeout):
+        for piece in ("Hel", "lo", " world"):
+            yield {"type": "delta", "text": piece}
+        yield {"type": "final", "text": "Hello world", "usage": {"total_tokens": 3}}
+
+    monkeypatch.setattr(gateway_main, "stream_chat_completion", fake_stream_chat)
+
+    body = _chat_body()
+    body["stream"] = True
+    raw = json.dumps(body, separators=(",", ":")).encode()
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", raw)
+    headers["Content-Type"] = "application/json"
+
+    resp = client.post("/v1/chat", headers=headers, data=raw)
+    assert resp.status_code == 200
+    assert resp.text == (
+        'event: delta\ndata: {"text": "Hello world"}\n\n'
+        'event: final\ndata: {"text": "Hello world", "usage": {"total_tokens": 3}}\n\n'
+    )
+
+
+def test_contract_stream_error_after_deltas(client, monkeypatch):
+    async def fake_stream_chat(_settings, _model, _messages, _timeout):
+        yield {"type": "delta", "text": "par"}
+        raise OpenAIError(
+            status_code=502,
+            message="upstream timeout",
+            code="upstream_timeout",
+            retryable=True,
+            err_type="upstream_error",
+        )
+
+    monkeypatch.setattr(gateway_main, "stream_chat_completion", fake_stream_chat)
+
+    body = _chat_body()
+    body["stream"] = True
+    raw = json.dumps(body, separators=(",", ":")).encode()
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", raw)
+    headers["Content-Type"] = "application/json"
+
+    resp = client.post("/v1/chat", headers=headers, data=raw)
+    assert resp.text.startswith('event: delta\ndata: {"text": "par"}\n\nevent: error\n')
+    assert '"code": "upstream_timeout"' in resp.text
+
+
+def test_contract_stream_digest_final(client, monkeypatch):
+    async def fake_stream_chat(_settings, _model, _messages, _timeout):
+        yield {"type": "delta", "text": "Привет"}
+        yield {"type": "final", "text": "Привет", "usage": {"total_tokens": 2}}
+
+    monkeypatch.setattr(gateway_main, "stream_chat_completion", fake_stream_chat)
+
+    body = _chat_body()
+    body["stream"] = True
+    body["final_mode"] = "digest"
+    raw = json.dumps(body, separators=(",", ":")).encode()
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", raw)
+    headers["Content-Type"] = "application/json"
+
+    resp = client.post("/v1/chat", headers=headers, data=raw)
+    final_frame = resp.text.split("\n\n")[1]
+    assert final_frame.startswith("event: final\ndata: ")
+    final = json.loads(final_frame.split("data: ", 1)[1])
+    assert "text" not in final
+    assert final["length"] == 6
+    assert final["sha256"] == hashlib.sha256("Привет".encode()).hexdigest()
+    assert final["usage"] == {"total_tokens": 2}
+
+    path = f"/v1/chat/finals/{final['stream_id']}"
+    fetched = client.get(path, headers=sign_headers("test-shared-secret", "GET", path, b""))
+    assert fetched.status_code == 200
+    assert fetched.json()["text"] == "Привет"
+
+    missing = "/v1/chat/finals/unknown"
+    resp = client.get(missing, headers=sign_headers("test-shared-secret", "GET", missing, b""))
+    assert resp.status_code == 404
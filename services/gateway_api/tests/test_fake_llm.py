@@ -0,0 +1,85 @@
+import httpx
+import pytest
+
+from gateway_api import openai_client
+from gateway_api.fake_llm import FakeLLMSettings, create_app
+from gateway_api.settings import get_settings
+
+MESSAGES = [{"role": "user", "content": "hello there"}]
+
+
+def _fake_settings(**overrides) -> FakeLLMSettings:
+    values = {"ttft_ms": 0, "tokens_per_second": 0, "completion_tokens": 5, "seed": 1}
+    values.update(overrides)
+    return FakeLLMSettings.model_validate({f"FAKE_LLM_{key.upper()}": value for key, value in values.items()})
+
+
+@pytest.fixture()
+async def fake_upstream(monkeypatch):
+    pools: list[openai_client.UpstreamHttpPool] = []
+
+    def _install(**overrides):
+        settings = get_settings().model_copy(
+            update={"openai_api_key": "sk-fake", "openai_base_url": "http://fake-llm/v1"}
+        )
+        transport = httpx.ASGITransport(app=create_app(_fake_settings(**overrides)))
+        pool = openai_client.UpstreamHttpPool(settings, transport=transport)
+        monkeypatch.setattr(openai_client, "_pool", pool)
+        pools.append(pool)
+        return settings
+
+    yield _install
+    for pool in pools:
+        await pool.aclose()
+
+
+async def test_stream_chat_completion_against_fake_upstream(fake_upstream):
+    settings = fake_upstream()
+
+    events = [
+        event async for event in openai_client.stream_chat_completion(settings, "gpt-5.2", MESSAGES)
+    ]
+
+    deltas = [event["text"] for event in events if event["type"] == "delta"]
+    assert len(deltas) == 5
+    assert events[-1] == {
+        "type": "final",
+        "text": "".join(deltas),
+        "usage": {"prompt_tokens": 3, "completion_tokens": 5, "total_tokens": 8},
+    }
+
+
+async def test_create_chat_completion_against_fake_upstream(fake_upstream):
+    settings = fake_upstream(completion_tokens=3)
+
+    text, usage = await openai_client.create_chat_completion(settings, "gpt-5.2", MESSAGES)
+
+    assert len(text.split()) == 3
+    assert usage["completion_tokens"] == 3
+
+
+async def test_fake_upstream_injects_rate_limits(fake_upstream):
+    settings = fake_upstream(rate_limit_rate=1, retry_after_seconds=7)
+
+    with pytest.raises(openai_client.OpenAIError) as exc_info:
+        await openai_client.create_chat_completion(settings, "gpt-5.2", MESSAGES)
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after == 7
+
+
+async def test_fake_upstream_injects_errors_into_streams(fake_upstream):
+    settings = fake_upstream(error_rate=1)
+
+    with pytest.raises(openai_client.OpenAIError) as exc_info:
+        async for _event in openai_client.stream_chat_completion(settings, "gpt-5.2", MESSAGES):
+            pass
+
+    assert exc_info.value.status_code == 500
+    assert exc_info.value.code == "fake_error"
+    assert exc_info.value.retryable is True
+
+
+def test_fake_llm_settings_validation():
+    with pytest.raises(ValueError, match="FAKE_LLM error rates must be between 0 and 1"):
+        _fake_settings(error_rate=2)
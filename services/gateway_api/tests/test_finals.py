@@ -0,0 +1,29 @@
+from gateway_api.finals import FinalTextCache
+from shared.sse import final_digest, matches_final_digest
+
+
+def test_final_cache_expires_entries_after_ttl():
+    cache = FinalTextCache(max_entries=10, ttl_seconds=5)
+    stream_id = cache.put("hello", None, now=1000.0)
+
+    assert cache.get(stream_id, now=1004.0) == ("hello", None)
+    assert cache.get(stream_id, now=1006.0) is None
+    assert len(cache) == 0
+
+
+def test_final_cache_is_bounded():
+    cache = FinalTextCache(max_entries=2, ttl_seconds=60)
+    first = cache.put("a", None, now=1000.0)
+    cache.put("b", None, now=1000.0)
+    cache.put("c", None, now=1000.0)
+
+    assert len(cache) == 2
+    assert cache.get(first, now=1000.0) is None
+
+
+def test_final_digest_roundtrip():
+    digest = final_digest("Привет", {"total_tokens": 1})
+
+    assert matches_final_digest("Привет", digest) is True
+    assert matches_final_digest("Привет!", digest) is False
+    assert matches_final_digest("Привед", digest) is False
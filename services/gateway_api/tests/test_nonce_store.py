@@ -0,0 +1,89 @@
+import pytest
+from pydantic import ValidationError
+
+from gateway_api.security import NonceCache, SqliteNonceStore, build_nonce_store
+from gateway_api.settings import Settings, get_settings
+
+
+def test_nonce_cache_rejects_replay_within_ttl():
+    cache = NonceCache(ttl_seconds=10)
+
+    assert cache.check_and_store("a", 1000.0) is True
+    assert cache.check_and_store("a", 1005.0) is False
+    assert cache.check_and_store("a", 1010.0) is False
+
+
+def test_nonce_cache_expires_entries_after_ttl():
+    cache = NonceCache(ttl_seconds=10)
+
+    assert cache.check_and_store("a", 1000.0) is True
+    assert cache.check_and_store("b", 1004.0) is True
+    assert len(cache) == 2
+
+    assert cache.check_and_store("c", 1012.0) is True
+    assert len(cache) == 2
+    assert cache.check_and_store("a", 1012.5) is True
+    assert cache.check_and_store("b", 1013.0) is False
+
+
+def test_nonce_cache_sweeps_everything_after_long_idle_gap():
+    cache = NonceCache(ttl_seconds=5)
+    for idx in range(100):
+        assert cache.check_and_store(f"n{idx}", 1000.0 + idx * 0.05) is True
+    assert len(cache) == 100
+
+    assert cache.check_and_store("late", 1_000_000.0) is True
+    assert len(cache) == 1
+    assert cache.check_and_store("n1", 1_000_000.5) is True
+
+
+def test_nonce_cache_memory_stays_bounded_under_steady_load():
+    cache = NonceCache(ttl_seconds=3)
+    now = 0.0
+    for idx in range(5000):
+        now += 0.01
+        assert cache.check_and_store(f"n{idx}", now) is True
+    # ~3s TTL (+ one bucket of slack) at 100 rps.
+    assert len(cache) <= 500
+
+
+def test_sqlite_nonce_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "nonces.sqlite3")
+    worker_a = SqliteNonceStore(path, ttl_seconds=10)
+    worker_b = SqliteNonceStore(path, ttl_seconds=10)
+    try:
+        assert worker_a.check_and_store("shared", 1000.0) is True
+        assert worker_b.check_and_store("shared", 1001.0) is False
+        assert worker_b.check_and_store("other", 1001.0) is True
+        assert worker_a.check_and_store("other", 1002.0) is False
+
+        assert worker_b.check_and_store("shared", 1012.0) is True
+        assert worker_a.check_and_store("fresh", 1030.0) is True
+        assert len(worker_a) == 1
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_build_nonce_store_selects_backend(tmp_path):
+    memory = build_nonce_store(get_settings().model_copy(update={"gateway_nonce_backend": "memory"}))
+    assert isinstance(memory, NonceCache)
+
+    sqlite_store = build_nonce_store(
+        get_settings().model_copy(
+            update={
+                "gateway_nonce_backend": "sqlite",
+                "gateway_nonce_sqlite_path": str(tmp_path / "n.sqlite3"),
+            }
+        )
+    )
+    try:
+        assert isinstance(sqlite_store, SqliteNonceStore)
+    finally:
+        sqlite_store.close()
+
+
+def test_nonce_backend_setting_is_validated(monkeypatch):
+    monkeypatch.setenv("GATEWAY_NONCE_BACKEND", "redis")
+    with pytest.raises(ValidationError, match="GATEWAY_NONCE_BACKEND must be one of"):
+        Settings()
@@ -0,0 +1,187 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from gateway_api import openai_client
+from gateway_api.settings import get_settings
+from shared.streaming import iterate_until_disconnect
+
+from .utils import sign_headers
+
+
+def _settings(**overrides):
+    update = {"openai_api_key": "sk-test"}
+    update.update(overrides)
+    return get_settings().model_copy(update=update)
+
+
+@pytest.fixture()
+async def install_pool(monkeypatch):
+    pools: list[openai_client.UpstreamHttpPool] = []
+
+    def _install(settings, handler) -> openai_client.UpstreamHttpPool:
+        pool = openai_client.UpstreamHttpPool(settings, transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(openai_client, "_pool", pool)
+        pools.append(pool)
+        return pool
+
+    yield _install
+    for pool in pools:
+        await pool.aclose()
+
+
+async def test_create_chat_completion_reuses_pool(install_pool):
+    settings = _settings()
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(
+            200,
+            json={"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 2}},
+        )
+
+    pool = install_pool(settings, handler)
+
+    for _ in range(3):
+        text, usage = await openai_client.create_chat_completion(
+            settings, "gpt-5.2", [{"role": "user", "content": "hi"}]
+        )
+        assert text == "ok"
+        assert usage == {"total_tokens": 2}
+
+    assert openai_client.get_upstream_pool(settings) is pool
+    assert len(calls) == 3
+    assert calls[0].headers["Authorization"] == "Bearer sk-test"
+    stats = pool.stats()
+    assert stats["requests_total"] == 3
+    assert stats["in_flight"] == 0
+    assert stats["saturation"] == 0
+
+
+async def test_stream_chat_completion_releases_in_flight_on_error(install_pool):
+    settings = _settings()
+
+    def handler(_request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, json={"error": {"message": "slow down", "type": "rate_limit_error"}})
+
+    pool = install_pool(settings, handler)
+
+    with pytest.raises(openai_client.OpenAIError) as exc_info:
+        async for _event in openai_client.stream_chat_completion(
+            settings, "gpt-5.2", [{"role": "user", "content": "hi"}]
+        ):
+            pass
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retryable is True
+    assert pool.stats()["in_flight"] == 0
+    assert pool.stats()["requests_total"] == 1
+
+
+async def test_stream_chat_completion_yields_deltas_and_final(install_pool):
+    settings = _settings()
+    chunks = [
+        {"choices": [{"delta": {"content": "Hel"}}]},
+        {"choices": [{"delta": {"content": "lo"}}]},
+        {"choices": [], "usage": {"total_tokens": 5}},
+    ]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+    def handler(_request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body.encode("utf-8"))
+
+    install_pool(settings, handler)
+
+    events = [
+        event
+        async for event in openai_client.stream_chat_completion(
+            settings, "gpt-5.2", [{"role": "user", "content": "hi"}]
+        )
+    ]
+
+    assert events == [
+        {"type": "delta", "text": "Hel"},
+        {"type": "delta", "text": "lo"},
+        {"type": "final", "text": "Hello", "usage": {"total_tokens": 5}},
+    ]
+
+
+async def test_disconnect_closes_upstream_stream_and_counts_saved_tokens(install_pool):
+    settings = _settings()
+    upstream_closed = asyncio.Event()
+    disconnect = asyncio.Event()
+
+    async def finished_body():
+        chunks = [
+            {"choices": [{"delta": {"content": "a"}}]},
+            {"choices": [{"delta": {"content": "b"}}]},
+            {"choices": [{"delta": {"content": "c"}}]},
+            {"choices": [], "usage": {"completion_tokens": 10}},
+        ]
+        for chunk in chunks:
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    async def endless_body():
+        try:
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': 'x'}}]})}\n\n".encode()
+            await asyncio.Event().wait()
+        finally:
+            upstream_closed.set()
+
+    bodies = [finished_body(), endless_body()]
+
+    def handler(_request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=bodies.pop(0))
+
+    pool = install_pool(settings, handler)
+    messages = [{"role": "user", "content": "hi"}]
+
+    async for _event in openai_client.stream_chat_completion(settings, "gpt-5.2", messages):
+        pass
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    received = []
+    upstream = openai_client.stream_chat_completion(settings, "gpt-5.2", messages)
+    async for event in iterate_until_disconnect(receive, upstream):
+        received.append(event)
+        disconnect.set()
+
+    await asyncio.wait_for(upstream_closed.wait(), timeout=1)
+    assert received == [{"type": "delta", "text": "x"}]
+    stats = pool.stats()
+    assert stats["in_flight"] == 0
+    assert stats["streams_completed"] == 1
+    assert stats["streams_cancelled"] == 1
+    assert stats["cancelled_tokens_streamed"] == 1
+    assert stats["cancelled_tokens_saved_estimate"] == 9
+
+
+async def test_close_upstream_pool_recreates_on_next_use(monkeypatch):
+    settings = _settings(openai_http2=False)
+    monkeypatch.setattr(openai_client, "_pool", None)
+
+    first = openai_client.get_upstream_pool(settings)
+    assert openai_client.get_upstream_pool(settings) is first
+
+    await openai_client.close_upstream_pool()
+    assert first.is_closed is True
+    second = openai_client.get_upstream_pool(settings)
+    assert second is not first
+    await openai_client.close_upstream_pool()
+
+
+def test_upstream_pool_stats_endpoint_requires_signature(client):
+    unsigned = client.get("/internal/upstream-pool")
+    assert unsigned.status_code == 401
+
+    headers = sign_headers("test-shared-secret", "GET", "/internal/upstream-pool", b"")
+    resp = client.get("/internal/upstream-pool", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["max_connections"] == 100
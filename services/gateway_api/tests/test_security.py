@@ -21,3 +21,12 @@ def test_hmac_invalid_signature(client):
 
     resp = client.post("/internal/ping", headers=headers, data=body)
     assert resp.status_code == 401
+
+
+def test_ping_advertises_request_encodings(client):
+    headers = sign_headers("test-shared-secret", "POST", "/internal/ping", b"")
+
+    resp = client.post("/internal/ping", headers=headers, data=b"")
+
+    assert resp.status_code == 200
+    assert "gzip" in resp.json()["content_encodings"]
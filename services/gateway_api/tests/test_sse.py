@@ -0,0 +1,68 @@
+from shared.sse import SSEDecoder, SSEEvent, format_sse, iter_sse, parse_json_events
+
+
+def test_decoder_handles_frames_split_at_any_byte():
+    payload = (
+        format_sse("delta", {"text": "При"}, event_id=1)
+        + format_sse("delta", {"text": "вет"}, event_id=2)
+        + format_sse("final", {"text": "Привет", "usage": None}, event_id=3)
+    ).encode("utf-8")
+
+    for size in (1, 2, 3, 7, len(payload)):
+        decoder = SSEDecoder()
+        events = []
+        for offset in range(0, len(payload), size):
+            events.extend(decoder.feed(payload[offset : offset + size]))
+        events.extend(decoder.flush())
+
+        assert [(event.event, event.json(), event.id) for event in events] == [
+            ("delta", {"text": "При"}, "1"),
+            ("delta", {"text": "вет"}, "2"),
+            ("final", {"text": "Привет", "usage": None}, "3"),
+        ]
+
+
+def test_decoder_normalizes_crlf_and_skips_comments():
+    decoder = SSEDecoder()
+    events = decoder.feed(b": keepalive\r\n\r\ndata: one\r")
+    events += decoder.feed(b"\ndata: two\r\n\r\n")
+
+    assert events == [SSEEvent(event="message", data="one\ntwo")]
+
+
+def test_decoder_flush_returns_unterminated_frame():
+    decoder = SSEDecoder()
+    assert decoder.feed(b'event: final\ndata: {"text": "x"}') == []
+
+    assert decoder.flush() == [SSEEvent(event="final", data='{"text": "x"}')]
+    assert decoder.flush() == []
+
+
+def test_non_json_data_is_exposed_raw():
+    assert SSEEvent(event="message", data="[DONE]").json() == {"raw": "[DONE]"}
+
+
+async def test_iter_sse_reads_async_byte_chunks():
+    async def chunks():
+        yield b"event: delta\ndata: {\"te"
+        yield b"xt\": \"a\"}\n"
+        yield b"\nevent: final\ndata: {}\n\n"
+
+    events = [event async for event in iter_sse(chunks())]
+
+    assert [(event.event, event.json()) for event in events] == [
+        ("delta", {"text": "a"}),
+        ("final", {}),
+    ]
+
+
+def test_parse_json_events_batches_and_falls_back_per_frame():
+    good = [SSEEvent("delta", '{"text": "a"}'), SSEEvent("final", '{"text": "a"}')]
+    assert parse_json_events(good) == [("delta", {"text": "a"}), ("final", {"text": "a"})]
+
+    mixed = [SSEEvent("delta", '{"text": "a"}'), SSEEvent("message", "[DONE]")]
+    assert parse_json_events(mixed) == [("delta", {"text": "a"}), ("message", {"raw": "[DONE]"})]
+
+    # Frames that only look right inside the synthetic array are not trusted.
+    sneaky = [SSEEvent("delta", "1, 2")]
+    assert parse_json_events(sneaky) == [("delta", {"raw": "1, 2"})]
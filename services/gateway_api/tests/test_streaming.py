@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from shared.streaming import coalesce_deltas
+
+
+async def _source(events, gaps=None):
+    for index, item in enumerate(events):
+        if gaps and gaps.get(index):
+            await asyncio.sleep(gaps[index])
+        yield item
+
+
+async def _collect(items):
+    return [item async for item in items]
+
+
+async def test_coalesce_merges_bursts_and_flushes_before_final():
+    events = [
+        ("delta", {"text": "a"}),
+        ("delta", {"text": "b"}),
+        ("delta", {"text": "c"}),
+        ("final", {"text": "abc", "usage": None}),
+    ]
+
+    assert await _collect(coalesce_deltas(_source(events), 0.05, 4096)) == [
+        ("delta", {"text": "abc"}),
+        ("final", {"text": "abc", "usage": None}),
+    ]
+
+
+async def test_coalesce_flushes_on_latency_when_source_stalls():
+    events = [
+        ("delta", {"text": "a"}),
+        ("delta", {"text": "b"}),
+        ("delta", {"text": "c"}),
+        ("final", {"text": "abc", "usage": None}),
+    ]
+
+    result = await _collect(coalesce_deltas(_source(events, gaps={2: 0.1}), 0.01, 4096))
+
+    assert result == [
+        ("delta", {"text": "ab"}),
+        ("delta", {"text": "c"}),
+        ("final", {"text": "abc", "usage": None}),
+    ]
+
+
+async def test_coalesce_flushes_on_max_bytes():
+    events = [("delta", {"text": "ж"}) for _ in range(5)]
+
+    result = await _collect(coalesce_deltas(_source(events), 10.0, 4))
+
+    assert result == [
+        ("delta", {"text": "жж"}),
+        ("delta", {"text": "жж"}),
+        ("delta", {"text": "ж"}),
+    ]
+
+
+async def test_coalesce_flushes_buffer_then_raises_source_error():
+    async def failing():
+        yield "delta", {"text": "x"}
+        raise ValueError("boom")
+
+    received = []
+    with pytest.raises(ValueError, match="boom"):
+        async for item in coalesce_deltas(failing(), 0.05, 4096):
+            received.append(item)
+
+    assert received == [("delta", {"text": "x"})]
+
+
+async def test_coalesce_disabled_passes_events_through():
+    events = [("delta", {"text": "a"}), ("delta", {"text": "b"})]
+
+    assert await _collect(coalesce_deltas(_source(events), 0, 4096)) == events
+
+
+async def test_closing_coalescer_closes_source():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            yield "delta", {"text": "x"}
+            await asyncio.Event().wait()
+        finally:
+            closed.set()
+
+    items = coalesce_deltas(endless(), 0.01, 4096)
+    assert await items.__anext__() == ("delta", {"text": "x"})
+    await items.aclose()
+
+    assert closed.is_set()
+
+
+async def test_closing_coalescer_closes_source_blocked_on_full_buffer():
+    closed = asyncio.Event()
+
+    async def flood():
+        try:
+            while True:
+                yield "status", {}
+        finally:
+            closed.set()
+
+    items = coalesce_deltas(flood(), 0.01, 4096)
+    assert await items.__anext__() == ("status", {})
+    await items.aclose()
+
+    assert closed.is_set()
@@ -0,0 +1,230 @@
+import itertools
+import json
+import random
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+from gateway_api import openai_client
+from gateway_api.settings import Settings, UpstreamConfig, get_settings
+from gateway_api.upstreams import TokenBucket, UpstreamBalancer, get_upstream_balancer, parse_retry_after
+
+from .utils import sign_headers
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _config(name: str, **overrides) -> UpstreamConfig:
+    return UpstreamConfig(name=name, base_url=f"http://{name}/v1", api_key=f"sk-{name}", **overrides)
+
+
+def _settings(*configs: UpstreamConfig, **overrides):
+    update = {"openai_upstreams": list(configs), "openai_upstream_cooldown_seconds": 10.0}
+    update.update(overrides)
+    return get_settings().model_copy(update=update)
+
+
+@pytest.fixture()
+async def install_pool(monkeypatch):
+    pools: list[openai_client.UpstreamHttpPool] = []
+
+    def _install(settings, handler) -> openai_client.UpstreamHttpPool:
+        pool = openai_client.UpstreamHttpPool(settings, transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(openai_client, "_pool", pool)
+        pools.append(pool)
+        return pool
+
+    yield _install
+    for pool in pools:
+        await pool.aclose()
+
+
+class _AlternatingRandom:
+    # With two ready upstreams of equal weight, the first one always wins.
+    def __init__(self) -> None:
+        self._values = itertools.cycle([0.9, 0.1])
+
+    def random(self) -> float:
+        return next(self._values)
+
+
+def _pin_order(settings) -> None:
+    get_upstream_balancer(settings)._rng = _AlternatingRandom()
+
+
+def test_token_bucket_refills_per_minute():
+    bucket = TokenBucket(60, now=0.0)
+    bucket.take(60, now=0.0)
+    assert bucket.can_take(1, now=0.5) is False
+    assert bucket.can_take(1, now=1.0) is True
+    # Oversized requests wait for a full bucket instead of never fitting.
+    assert bucket.can_take(500, now=60.0) is True
+    assert TokenBucket(0, now=0.0).can_take(10**9, now=0.0) is True
+
+
+def test_weighted_order_follows_weights():
+    balancer = UpstreamBalancer(
+        [_config("a", weight=3), _config("b", weight=1)], cooldown_seconds=10, rng=random.Random(7)
+    )
+    firsts = [balancer.candidates(1, now=0.0)[0].name for _ in range(4000)]
+    share = firsts.count("a") / len(firsts)
+    assert 0.70 < share < 0.80
+
+
+def test_rate_limited_upstream_cools_down_for_retry_after():
+    balancer = UpstreamBalancer([_config("a"), _config("b")], cooldown_seconds=10)
+    a, b = balancer.upstreams
+    balancer.record_failure(a, 429, retry_after=2.0, now=100.0)
+
+    assert balancer.candidates(1, now=101.0) == [b]
+    assert {upstream.name for upstream in balancer.candidates(1, now=102.5)} == {"a", "b"}
+
+    balancer.record_failure(b, 429, now=100.0)
+    assert balancer.candidates(1, now=101.0) == []
+    assert balancer.retry_after(now=101.0) == pytest.approx(1.0)
+
+
+def test_request_budget_excludes_exhausted_keys():
+    balancer = UpstreamBalancer([_config("a", rpm=1), _config("b", tpm=100)], cooldown_seconds=10)
+    a, b = balancer.upstreams
+    balancer.acquire(a, 10, now=0.0)
+    balancer.acquire(b, 90, now=0.0)
+
+    assert balancer.candidates(10, now=0.0) == [b]
+    assert balancer.candidates(20, now=0.0) == []
+    balancer.record_usage(b, 90, {"total_tokens": 40})
+    assert b.tokens_used == 40
+    assert balancer.candidates(20, now=0.0) == [b]
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after(httpx.Headers({"retry-after": "3"})) == 3.0
+    assert parse_retry_after(httpx.Headers({"retry-after-ms": "250", "retry-after": "3"})) == 0.25
+    assert parse_retry_after(httpx.Headers({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert parse_retry_after(httpx.Headers({"retry-after": "soon"})) is None
+    assert parse_retry_after(httpx.Headers()) is None
+
+
+def test_openai_api_key_is_the_default_upstream():
+    settings = get_settings().model_copy(update={"openai_api_key": "sk-test"})
+    (upstream,) = get_upstream_balancer(settings).upstreams
+    assert upstream.chat_url == "https://api.openai.com/v1/chat/completions"
+    assert upstream.api_key == "sk-test"
+
+
+def test_upstreams_are_parsed_from_json_env(monkeypatch):
+    monkeypatch.setenv(
+        "OPENAI_UPSTREAMS",
+        json.dumps([{"base_url": "http://local:9000/v1/", "api_key": "k", "weight": 2, "rpm": 60}]),
+    )
+    (config,) = Settings().openai_upstreams
+    assert config.base_url == "http://local:9000/v1"
+    assert config.weight == 2
+
+    monkeypatch.setenv("OPENAI_UPSTREAMS", json.dumps([{"api_key": "k", "weight": 0}]))
+    with pytest.raises(ValidationError, match="OPENAI_UPSTREAMS weight must be > 0"):
+        Settings()
+
+
+async def test_completion_fails_over_on_429_and_cools_the_key(install_pool):
+    settings = _settings(_config("a"), _config("b"))
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["Authorization"])
+        if request.url.host == "a":
+            return httpx.Response(429, headers={"Retry-After": "30"}, json={"error": {"message": "slow down"}})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 4}})
+
+    install_pool(settings, handler)
+    _pin_order(settings)
+
+    text, _usage = await openai_client.create_chat_completion(settings, "gpt-5.2", MESSAGES)
+
+    assert text == "ok"
+    assert seen == ["Bearer sk-a", "Bearer sk-b"]
+    a, b = get_upstream_balancer(settings).stats()["upstreams"]
+    assert a["rate_limited"] == 1
+    assert a["failovers"] == 1
+    assert a["cooldown_seconds"] > 29
+    assert b["tokens_used"] == 4
+
+
+async def test_completion_does_not_fail_over_on_bad_request(install_pool):
+    settings = _settings(_config("a"), _config("b"))
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.host)
+        return httpx.Response(400, json={"error": {"message": "bad", "type": "invalid_request_error"}})
+
+    install_pool(settings, handler)
+    _pin_order(settings)
+
+    with pytest.raises(openai_client.OpenAIError) as exc_info:
+        await openai_client.create_chat_completion(settings, "gpt-5.2", MESSAGES)
+
+    assert exc_info.value.status_code == 400
+    assert seen == ["a"]
+
+
+async def test_stream_fails_over_only_before_first_delta(install_pool):
+    settings = _settings(_config("a"), _config("b"))
+    seen: list[str] = []
+    ok_body = (
+        f"data: {json.dumps({'choices': [{'delta': {'content': 'hi'}}]})}\n\n" "data: [DONE]\n\n"
+    ).encode()
+    broken_body = (
+        f"data: {json.dumps({'choices': [{'delta': {'content': 'x'}}]})}\n\n"
+        f"data: {json.dumps({'error': {'message': 'boom', 'type': 'server_error'}})}\n\n"
+    ).encode()
+    responses = {"a": [httpx.Response(503, json={})], "b": [httpx.Response(200, content=ok_body)]}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.host)
+        return responses[request.url.host].pop(0)
+
+    pool = install_pool(settings, handler)
+    _pin_order(settings)
+
+    events = [event async for event in openai_client.stream_chat_completion(settings, "gpt-5.2", MESSAGES)]
+    assert events[-1] == {"type": "final", "text": "hi", "usage": None}
+    assert seen == ["a", "b"]
+
+    responses["a"].append(httpx.Response(200, content=broken_body))
+    received = []
+    with pytest.raises(openai_client.OpenAIError, match="boom"):
+        async for event in openai_client.stream_chat_completion(settings, "gpt-5.2", MESSAGES):
+            received.append(event)
+    assert received == [{"type": "delta", "text": "x"}]
+    assert seen == ["a", "b", "a"]
+    assert pool.stats()["in_flight"] == 0
+    assert all(item["in_flight"] == 0 for item in get_upstream_balancer(settings).stats()["upstreams"])
+
+
+async def test_all_upstreams_throttled_returns_429_with_retry_after(client, monkeypatch):
+    settings = _settings(_config("a"))
+    monkeypatch.setattr("gateway_api.main.settings", settings)
+    balancer = get_upstream_balancer(settings)
+    balancer.record_failure(balancer.upstreams[0], 429, retry_after=5.0)
+
+    body = json.dumps(
+        {
+            "messages": MESSAGES,
+            "model": "gpt-5.2",
+            "stream": False,
+            "metadata": {"company_id": 1, "user_id": 1, "conversation_id": 1, "message_id": 1},
+        }
+    ).encode()
+    headers = sign_headers("test-shared-secret", "POST", "/v1/chat", body)
+    headers["Content-Type"] = "application/json"
+    resp = client.post("/v1/chat", headers=headers, content=body)
+
+    assert resp.status_code == 429
+    assert resp.json()["error"]["code"] == "upstream_throttled"
+    assert resp.headers["Retry-After"] == "5"
+
+    stats_headers = sign_headers("test-shared-secret", "GET", "/internal/upstreams", b"")
+    stats = client.get("/internal/upstreams", headers=stats_headers).json()
+    assert stats["upstreams"][0]["rate_limited"] == 1
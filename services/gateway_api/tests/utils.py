@@ -4,15 +4,21 @@ import time
 import uuid
 
 
-def sign_headers(secret: str, method: str, path: str, body: bytes):
+def sign_headers(secret: str, method: str, path: str, body: bytes, content_encoding: str | None = None):
     timestamp = str(int(time.time()))
     nonce = uuid.uuid4().hex
     body_hash = hashlib.sha256(body).hexdigest()
-    canonical = "\n".join([method.upper(), path, timestamp, nonce, body_hash])
+    parts = [method.upper(), path, timestamp, nonce, body_hash]
+    if content_encoding:
+        parts.append(content_encoding)
+    canonical = "\n".join(parts)
     signature = hmac.new(secret.encode("utf-8"), canonical.encode("utf-8"), hashlib.sha256).hexdigest()
-    return {
+    headers = {
         "X-Timestamp": timestamp,
         "X-Nonce": nonce,
         "X-Body-SHA256": body_hash,
         "X-Signature": signature,
     }
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return headers
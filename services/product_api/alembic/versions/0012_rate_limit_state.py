@@ -0,0 +1,30 @@
+"""add shared rate limit state
+
+Revision ID: 0012_rate_limit_state
+Revises: 0011_claims_preview_header_json
+Create Date: 2026-10-17 00:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_rate_limit_state"
+down_revision = "0011_claims_preview_header_json"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rate_limit_state",
+        sa.Column("key", sa.String(length=255), primary_key=True),
+        sa.Column("tat", sa.Float(precision=53), nullable=False),
+    )
+    op.create_index("ix_rate_limit_state_tat", "rate_limit_state", ["tat"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_rate_limit_state_tat", table_name="rate_limit_state")
+    op.drop_table("rate_limit_state")
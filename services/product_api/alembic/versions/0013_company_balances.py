@@ -0,0 +1,72 @@
+"""materialized company pool balance
+
+Revision ID: 0013_company_balances
+Revises: 0012_rate_limit_state
+Create Date: 2026-10-17 00:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0013_company_balances"
+down_revision = "0012_rate_limit_state"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "company_balances",
+        sa.Column(
+            "company_id",
+            sa.Integer(),
+            sa.ForeignKey("companies.id"),
+            primary_key=True,
+        ),
+        sa.Column("balance", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.execute(
+        """
+        INSERT INTO company_balances (company_id, balance)
+        SELECT company_id, COALESCE(SUM(delta), 0)
+        FROM ledger
+        GROUP BY company_id
+        """
+    )
+    # Every ledger insert moves the balance in the same transaction, whichever
+    # code path (ORM, raw SQL, migrations) wrote the row.
+    op.execute(
+        """
+        CREATE FUNCTION ledger_apply_company_balance() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO company_balances (company_id, balance, updated_at)
+            VALUES (NEW.company_id, NEW.delta, now())
+            ON CONFLICT (company_id) DO UPDATE
+            SET balance = company_balances.balance + EXCLUDED.balance,
+                updated_at = EXCLUDED.updated_at;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ledger_apply_company_balance
+        AFTER INSERT ON ledger
+        FOR EACH ROW EXECUTE FUNCTION ledger_apply_company_balance()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS ledger_apply_company_balance ON ledger")
+    op.execute("DROP FUNCTION IF EXISTS ledger_apply_company_balance()")
+    op.drop_table("company_balances")
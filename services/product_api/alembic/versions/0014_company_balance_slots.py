@@ -0,0 +1,85 @@
+"""stripe company balances across slots
+
+Revision ID: 0014_company_balance_slots
+Revises: 0013_company_balances
+Create Date: 2026-10-17 00:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0014_company_balance_slots"
+down_revision = "0013_company_balances"
+branch_labels = None
+depends_on = None
+
+BALANCE_SLOTS = 16
+
+
+def upgrade() -> None:
+    op.add_column(
+        "company_balances",
+        sa.Column("slot", sa.SmallInteger(), server_default=sa.text("0"), nullable=False),
+    )
+    op.drop_constraint("pk_company_balances", "company_balances", type_="primary")
+    op.create_primary_key("pk_company_balances", "company_balances", ["company_id", "slot"])
+    # Concurrent ledger inserts of one company land on different rows instead
+    # of queueing on a single balance row until commit.
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION ledger_apply_company_balance() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO company_balances (company_id, slot, balance, updated_at)
+            VALUES (NEW.company_id, NEW.id % {BALANCE_SLOTS}, NEW.delta, now())
+            ON CONFLICT (company_id, slot) DO UPDATE
+            SET balance = company_balances.balance + EXCLUDED.balance,
+                updated_at = EXCLUDED.updated_at;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        UPDATE company_balances AS b
+        SET balance = totals.balance
+        FROM (
+            SELECT company_id, SUM(balance) AS balance
+            FROM company_balances
+            GROUP BY company_id
+        ) AS totals
+        WHERE b.company_id = totals.company_id AND b.slot = 0
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO company_balances (company_id, slot, balance)
+        SELECT company_id, 0, SUM(balance)
+        FROM company_balances
+        GROUP BY company_id
+        HAVING bool_and(slot <> 0)
+        """
+    )
+    op.execute("DELETE FROM company_balances WHERE slot <> 0")
+    op.drop_constraint("pk_company_balances", "company_balances", type_="primary")
+    op.create_primary_key("pk_company_balances", "company_balances", ["company_id"])
+    op.drop_column("company_balances", "slot")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION ledger_apply_company_balance() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO company_balances (company_id, balance, updated_at)
+            VALUES (NEW.company_id, NEW.delta, now())
+            ON CONFLICT (company_id) DO UPDATE
+            SET balance = company_balances.balance + EXCLUDED.balance,
+                updated_at = EXCLUDED.updated_at;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
@@ -0,0 +1,25 @@
+"""per-message token count
+
+Revision ID: 0015_message_token_count
+Revises: 0014_company_balance_slots
+Create Date: 2026-10-17 00:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0015_message_token_count"
+down_revision = "0014_company_balance_slots"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows stay NULL and are estimated when they are loaded.
+    op.add_column("messages", sa.Column("token_count", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "token_count")
@@ -0,0 +1,27 @@
+"""assistant message generation lease
+
+Revision ID: 0016_message_inflight_lease
+Revises: 0015_message_token_count
+Create Date: 2026-10-17 00:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0016_message_inflight_lease"
+down_revision = "0015_message_token_count"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "messages",
+        sa.Column("inflight_until", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "inflight_until")
@@ -0,0 +1,31 @@
+"""persistent DataNewton counterparty store
+
+Revision ID: 0017_counterparties
+Revises: 0016_message_inflight_lease
+Create Date: 2026-10-17 00:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0017_counterparties"
+down_revision = "0016_message_inflight_lease"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "counterparties",
+        sa.Column("inn", sa.String(length=16), primary_key=True),
+        sa.Column("payload_json", sa.JSON(), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_counterparties_fetched_at", "counterparties", ["fetched_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_counterparties_fetched_at", table_name="counterparties")
+    op.drop_table("counterparties")
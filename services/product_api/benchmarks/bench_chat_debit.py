@@ -0,0 +1,143 @@
+"""Chat credit debit throughput vs. users per company.
+
+Seeds one company with N users (each with its own credit limit) and runs
+concurrent debits through ``reserve_chat_credits`` and, for comparison, the
+previous FOR UPDATE based variant. Needs an empty, migrated database:
+
+    DATABASE_URL=postgresql+asyncpg://... python benchmarks/bench_chat_debit.py
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from product_api.models import Company, Conversation, Ledger, Message, User, UserCreditLimit
+from product_api.repositories import get_company_pool_balance, reserve_chat_credits
+
+
+async def reserve_chat_credits_locked(
+    session: AsyncSession,
+    company_id: int,
+    user_id: int,
+    message_id: int,
+    units: int = 1,
+) -> int:
+    await session.execute(select(Company).where(Company.id == company_id).with_for_update())
+    await session.execute(select(User).where(User.id == user_id).with_for_update())
+    limit = (
+        await session.execute(
+            select(UserCreditLimit)
+            .where(UserCreditLimit.user_id == user_id, UserCreditLimit.company_id == company_id)
+            .with_for_update()
+        )
+    ).scalar_one()
+    pool = (
+        await session.execute(
+            select(func.coalesce(func.sum(Ledger.delta), 0)).where(Ledger.company_id == company_id)
+        )
+    ).scalar_one()
+    if limit.remaining_credits < units or pool < units:
+        raise RuntimeError("insufficient credits")
+    limit.remaining_credits -= units
+    entry = Ledger(
+        company_id=company_id,
+        user_id=user_id,
+        message_id=message_id,
+        delta=-units,
+        reason="chat_message",
+        idempotency_key=f"msg:{message_id}",
+    )
+    session.add(entry)
+    await session.flush()
+    return entry.id
+
+
+async def _seed(session_maker, users: int, per_user: int, history: int) -> tuple[int, list]:
+    async with session_maker() as session:
+        company = Company(name=f"bench-{users}-{time.time_ns()}")
+        session.add(company)
+        await session.flush()
+        session.add_all(
+            Ledger(
+                company_id=company.id,
+                delta=users * per_user if idx == 0 else 0,
+                reason="bench_seed",
+                idempotency_key=f"bench:{company.id}:{idx}",
+            )
+            for idx in range(max(history, 1))
+        )
+        plan = []
+        for idx in range(users):
+            user = User(email=f"u{idx}-{company.id}@bench.test", role="member", company_id=company.id)
+            session.add(user)
+            await session.flush()
+            session.add(
+                UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=per_user)
+            )
+            convo = Conversation(company_id=company.id, user_id=user.id)
+            session.add(convo)
+            await session.flush()
+            messages = [
+                Message(conversation_id=convo.id, role="user", status="completed", content="x")
+                for _ in range(per_user)
+            ]
+            session.add_all(messages)
+            await session.flush()
+            plan.append((user.id, [message.id for message in messages]))
+        await session.commit()
+        return company.id, plan
+
+
+async def _run(session_maker, debit, company_id: int, plan: list) -> float:
+    async def _user_loop(user_id: int, message_ids: list[int]) -> None:
+        for message_id in message_ids:
+            async with session_maker() as session:
+                await debit(session, company_id, user_id, message_id)
+                await session.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_user_loop(user_id, ids) for user_id, ids in plan))
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--messages-per-user", type=int, default=20)
+    parser.add_argument("--ledger-history", type=int, default=20_000)
+    parser.add_argument("--pool-size", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        os.environ["DATABASE_URL"], pool_size=args.pool_size, max_overflow=0
+    )
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    print(f"{'mode':<8} {'users':>6} {'debits':>7} {'seconds':>8} {'debits/s':>9}")
+    try:
+        for users in args.users:
+            for mode, debit in (("locked", reserve_chat_credits_locked), ("atomic", reserve_chat_credits)):
+                company_id, plan = await _seed(
+                    session_maker, users, args.messages_per_user, args.ledger_history
+                )
+                elapsed = await _run(session_maker, debit, company_id, plan)
+                total = users * args.messages_per_user
+                async with session_maker() as session:
+                    assert await get_company_pool_balance(session, company_id) == 0
+                print(f"{mode:<8} {users:>6} {total:>7} {elapsed:>8.2f} {total / elapsed:>9.0f}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "TRUNCATE ledger, messages, conversations, user_credit_limits, "
+                    "company_balances, users, companies RESTART IDENTITY CASCADE"
+                )
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""DataNewton counterparty parsing cost on large responses.
+
+Builds counterparty payloads with N founders, branches and history records
+around the manager block and parses them with ``_PayloadIndex`` (one walk,
+then indexed lookups) and with the previous per-lookup recursive walks,
+checking both give the same result. No services or database needed:
+
+    python benchmarks/bench_datanewton_parse.py --records 2000
+"""
+
+import argparse
+import os
+import time
+
+# The claims package imports the models, which build the engine at import.
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://bench@localhost/bench")
+
+from product_api.claims import datanewton_client  # noqa: E402
+from product_api.claims.datanewton_client import _normalize_text, parse_datanewton_counterparty_payload  # noqa: E402
+
+
+class RecursiveIndex:
+    # The previous implementation: every lookup walks the block again.
+    def __init__(self, root):
+        pass
+
+    def first_dict(self, payload, candidate_keys):
+        if isinstance(payload, dict):
+            for key, value in payload.items():
+                if key in candidate_keys and isinstance(value, dict):
+                    return value
+                nested = self.first_dict(value, candidate_keys)
+                if nested is not None:
+                    return nested
+            return None
+        if isinstance(payload, list):
+            for item in payload:
+                nested = self.first_dict(item, candidate_keys)
+                if nested is not None:
+                    return nested
+        return None
+
+    def first_text(self, payload, candidate_keys):
+        if isinstance(payload, dict):
+            for key, value in payload.items():
+                if key in candidate_keys:
+                    normalized = _normalize_text(value)
+                    if normalized:
+                        return normalized
+                nested = self.first_text(value, candidate_keys)
+                if nested:
+                    return nested
+            return None
+        if isinstance(payload, list):
+            for item in payload:
+                nested = self.first_text(item, candidate_keys)
+                if nested:
+                    return nested
+        return None
+
+    def text_values(self, payload, candidate_keys):
+        values = []
+        if isinstance(payload, dict):
+            for key, value in payload.items():
+                if key in candidate_keys:
+                    normalized = _normalize_text(value)
+                    if normalized:
+                        values.append(normalized)
+                values.extend(self.text_values(value, candidate_keys))
+        elif isinstance(payload, list):
+            for item in payload:
+                values.extend(self.text_values(item, candidate_keys))
+        return values
+
+    def bool_values(self, payload, candidate_keys):
+        values = []
+        if isinstance(payload, dict):
+            for key, value in payload.items():
+                if key in candidate_keys and isinstance(value, bool):
+                    values.append(value)
+                values.extend(self.bool_values(value, candidate_keys))
+        elif isinstance(payload, list):
+            for item in payload:
+                values.extend(self.bool_values(item, candidate_keys))
+        return values
+
+
+def build_payload(records: int, managers_shape: bool) -> dict:
+    def person(index: int) -> dict:
+        return {
+            "inn": f"77{index:010d}",
+            "fio_parts": {"last": f"Фамилия{index}", "first": "Имя", "middle": "Отчество"},
+            "share": {"percent": 1.5, "sum": 10_000 + index},
+            "dates": {"from": "2020-01-01", "history": [{"date": "2021-02-03", "event": "изменение"}]},
+        }
+
+    company: dict = {
+        "ogrn": "1027700132195",
+        "founders": [person(index) for index in range(records)],
+        "branches": [
+            {"kpp": f"77{index:07d}", "location": {"region": "Москва", "street": f"ул. {index}"}}
+            for index in range(records)
+        ],
+        "history": [{"date": "2022-01-01", "changes": [{"field": "okved", "old": "1", "new": "2"}]}] * records,
+        "company_names": {"full_name": "Общество с ограниченной ответственностью «Вектор»"},
+    }
+    if managers_shape:
+        company["managers"] = [{"fio": "Иванов Иван Иванович", "position": "генеральный директор"}]
+        company["address"] = {"line_address": "г. Москва, ул. Ленина, д. 5"}
+        return {"data": {"company": company}}
+    # Flat shape: everything is found by searching the whole record.
+    company["manager"] = {"fio": "Иванов Иван Иванович", "position": "директор"}
+    return {"data": {"company": company, "subject_type": "ЮЛ", "registration_address": "г. Москва"}}
+
+
+def bench(name: str, payload: dict, repeat: int) -> dict | None:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = parse_datanewton_counterparty_payload(payload, fallback_inn="7701234567")
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:>10}: {best * 1000:8.2f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    indexed_class = datanewton_client._PayloadIndex
+    for shape, managers_shape in (("company.managers", True), ("flat record", False)):
+        payload = build_payload(args.records, managers_shape)
+        print(f"{shape}, {args.records} founders/branches/history records")
+        datanewton_client._PayloadIndex = RecursiveIndex
+        recursive = bench("recursive", payload, args.repeat)
+        datanewton_client._PayloadIndex = indexed_class
+        indexed = bench("indexed", payload, args.repeat)
+        assert recursive == indexed, (recursive, indexed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""SSE decode cost for long streamed answers.
+
+Replays a gateway stream of N delta frames (one token each, as the gateway
+emits them with coalescing off) through the previous line-based parser of
+``gateway_client.stream_chat`` and through ``shared.sse.SSEDecoder``, and
+compares growing the answer with ``+=`` against collecting chunks. No
+services or database needed:
+
+    python benchmarks/bench_sse_decode.py --tokens 50000
+"""
+
+import argparse
+import json
+import time
+
+from httpx._decoders import LineDecoder, TextDecoder
+
+from shared.sse import SSEDecoder, format_sse, parse_json_events
+
+CHUNK_BYTES = 4096
+
+
+def build_stream(tokens: int) -> list[bytes]:
+    frames = [format_sse("delta", {"text": f"слово{i % 10} "}) for i in range(tokens)]
+    frames.append(format_sse("final", {"text": "", "usage": None}))
+    payload = "".join(frames).encode("utf-8")
+    return [payload[i : i + CHUNK_BYTES] for i in range(0, len(payload), CHUNK_BYTES)]
+
+
+def iter_lines(chunks: list[bytes]):
+    # What httpx's aiter_lines() does per chunk.
+    text_decoder = TextDecoder("utf-8")
+    line_decoder = LineDecoder()
+    for chunk in chunks:
+        yield from line_decoder.decode(text_decoder.decode(chunk))
+    yield from line_decoder.decode(text_decoder.flush())
+    yield from line_decoder.flush()
+
+
+def decode_line_based(chunks: list[bytes]) -> str:
+    buffer_text = ""
+    event_name = None
+    data_lines: list[str] = []
+    for line in iter_lines(chunks):
+        if line.startswith("event:"):
+            event_name = line.split(":", 1)[1].strip()
+            continue
+        if line.startswith("data:"):
+            data_lines.append(line.split(":", 1)[1].strip())
+            continue
+        if line == "":
+            if event_name and data_lines:
+                data = json.loads("\n".join(data_lines))
+                if event_name == "delta":
+                    buffer_text += data["text"]
+            event_name = None
+            data_lines = []
+    return buffer_text
+
+
+def decode_incremental(chunks: list[bytes]) -> str:
+    decoder = SSEDecoder()
+    text_chunks: list[str] = []
+    for chunk in chunks:
+        for event, data in parse_json_events(decoder.feed(chunk)):
+            if event == "delta":
+                text_chunks.append(data["text"])
+    decoder.flush()
+    return "".join(text_chunks)
+
+
+def bench(name: str, func, chunks: list[bytes], repeat: int) -> str:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(chunks)
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:>12}: {best * 1000:8.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = build_stream(args.tokens)
+    print(f"{args.tokens} delta frames, {sum(len(c) for c in chunks)} bytes in {len(chunks)} chunks")
+    legacy = bench("line-based", decode_line_based, chunks, args.repeat)
+    incremental = bench("incremental", decode_incremental, chunks, args.repeat)
+    assert legacy == incremental
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from product_api.auth import utcnow
+from product_api.models import Counterparty
+
+
+@dataclass(frozen=True, slots=True)
+class StoredCounterparty:
+    payload: dict[str, Any]
+    fetched_at: datetime
+
+    def age_seconds(self, now: datetime | None = None) -> float:
+        return ((now or utcnow()) - self.fetched_at).total_seconds()
+
+
+class CounterpartyStore:
+    # Parsed DataNewton counterparties keyed by normalized INN, shared by every
+    # worker and kept across restarts. Only found counterparties are stored;
+    # "not found" stays in the in-memory cache so new companies show up soon.
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]) -> None:
+        self._session_maker = session_maker
+
+    async def get(self, inn: str) -> StoredCounterparty | None:
+        return (await self.get_many([inn])).get(inn)
+
+    async def get_many(self, inns: Iterable[str]) -> dict[str, StoredCounterparty]:
+        keys = sorted(set(inns))
+        if not keys:
+            return {}
+        async with self._session_maker() as session:
+            result = await session.execute(
+                select(Counterparty.inn, Counterparty.payload_json, Counterparty.fetched_at).where(
+                    Counterparty.inn.in_(keys)
+                )
+            )
+            return {
+                inn: StoredCounterparty(payload=payload, fetched_at=fetched_at)
+                for inn, payload, fetched_at in result.all()
+            }
+
+    async def put(self, inn: str, payload: dict[str, Any], fetched_at: datetime | None = None) -> None:
+        fetched_at = fetched_at or utcnow()
+        statement = insert(Counterparty).values(inn=inn, payload_json=payload, fetched_at=fetched_at)
+        # A slower writer must not replace a newer row with an older result.
+        statement = statement.on_conflict_do_update(
+            index_elements=[Counterparty.inn],
+            set_={"payload_json": statement.excluded.payload_json, "fetched_at": statement.excluded.fetched_at},
+            where=Counterparty.fetched_at <= statement.excluded.fetched_at,
+        )
+        async with self._session_maker() as session:
+            await session.execute(statement)
+            await session.commit()
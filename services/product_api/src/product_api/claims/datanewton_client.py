@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
-from collections.abc import Iterable
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
 from typing import Any
 
 import httpx
+from sqlalchemy.exc import SQLAlchemyError
 
 from product_api.settings import Settings
 
+from .counterparty_store import CounterpartyStore, StoredCounterparty
 from .normalization import normalize_inn
 from .preview_header_formatter import infer_kind_from_inn
 
@@ -19,10 +24,51 @@ class DataNewtonError(Exception):
     pass
 
 
+_MISS = object()
+
+
 class DataNewtonClient:
-    def __init__(self, settings: Settings) -> None:
+    def __init__(self, settings: Settings, store: CounterpartyStore | None = None) -> None:
         self._settings = settings
-        self._cache: dict[str, tuple[float, dict[str, Any] | None]] = {}
+        self._store = store
+        self._http: httpx.AsyncClient | None = None
+        # LRU order; entries are (expires_at, payload) and payload may be None.
+        self._cache: OrderedDict[str, tuple[float, dict[str, Any] | None]] = OrderedDict()
+        self._next_sweep_at = 0.0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        # base_url -> (path that answered, when it was discovered)
+        self._known_paths: dict[str, tuple[str, float]] = {}
+        self._path_misses = 0
+        self._path_discoveries = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._requests = 0
+        self._failures = 0
+        self._evictions = 0
+        self._expired = 0
+        self._store_hits = 0
+        self._store_misses = 0
+        self._store_errors = 0
+        self._refreshes = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=max(self._settings.datanewton_timeout_seconds, 1),
+                limits=httpx.Limits(max_connections=self._settings.datanewton_pool_max_connections),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        refreshing = list(self._refreshing.values())
+        for task in refreshing:
+            task.cancel()
+        await asyncio.gather(*refreshing, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     async def fetch_party_by_inn(self, inn: str) -> dict[str, Any] | None:
         normalized_inn = normalize_inn(inn, field_name="inn", strict=False)
@@ -30,8 +76,10 @@ class DataNewtonClient:
             return None
 
         cached = self._read_cache(normalized_inn)
-        if cached is not None:
+        if cached is not _MISS:
+            self._hits += 1
             return cached
+        self._misses += 1
 
         if not self._settings.datanewton_enabled:
             result = None
@@ -44,10 +92,86 @@ class DataNewtonClient:
             self._write_cache(normalized_inn, result)
             return result
 
-        result = await self._request_counterparty(normalized_inn)
-        self._write_cache(normalized_inn, result)
+        # Concurrent lookups of one INN share a single request. The request
+        # runs in its own task so a cancelled caller does not cancel it for
+        # the others.
+        task = self._inflight.get(normalized_inn)
+        if task is None:
+            task = asyncio.create_task(self._lookup(normalized_inn))
+            self._inflight[normalized_inn] = task
+            task.add_done_callback(lambda _task: self._inflight.pop(normalized_inn, None))
+        else:
+            self._coalesced += 1
+        try:
+            return await asyncio.shield(task)
+        except DataNewtonError:
+            return None
+
+    async def _lookup(self, inn: str) -> dict[str, Any] | None:
+        stored = await self._read_store(inn)
+        if stored is not None:
+            self._write_cache(inn, stored.payload)
+            return stored.payload
+        return await self.refresh_party(inn)
+
+    async def refresh_party(self, inn: str) -> dict[str, Any] | None:
+        # Always asks DataNewton, then updates the memory cache and the store.
+        # Raises DataNewtonError when the request fails.
+        self._requests += 1
+        result = await self._request_counterparty(inn)
+        self._write_cache(inn, result)
+        if result is not None:
+            await self._write_store(inn, result)
         return result
 
+    async def _read_store(self, inn: str) -> StoredCounterparty | None:
+        # Rows younger than DATANEWTON_STORE_REFRESH_SECONDS are served as is,
+        # older ones are served while a background request refreshes them, and
+        # rows past DATANEWTON_STORE_MAX_AGE_SECONDS are not served at all.
+        if self._store is None:
+            return None
+        try:
+            stored = await self._store.get(inn)
+        except (SQLAlchemyError, OSError) as exc:
+            self._store_errors += 1
+            logger.warning("datanewton_store_read_failed inn=%s err=%s", inn, str(exc))
+            return None
+        if stored is None:
+            self._store_misses += 1
+            return None
+        age_seconds = stored.age_seconds()
+        if age_seconds >= self._settings.datanewton_store_max_age_seconds:
+            self._store_misses += 1
+            return None
+        self._store_hits += 1
+        if age_seconds >= self._settings.datanewton_store_refresh_seconds:
+            self._schedule_refresh(inn)
+        return stored
+
+    async def _write_store(self, inn: str, payload: dict[str, Any]) -> None:
+        if self._store is None:
+            return
+        try:
+            await self._store.put(inn, payload)
+        except (SQLAlchemyError, OSError) as exc:
+            self._store_errors += 1
+            logger.warning("datanewton_store_write_failed inn=%s err=%s", inn, str(exc))
+
+    def _schedule_refresh(self, inn: str) -> None:
+        if inn in self._refreshing:
+            return
+        self._refreshes += 1
+        task = asyncio.create_task(self._refresh_in_background(inn))
+        self._refreshing[inn] = task
+        task.add_done_callback(lambda _task: self._refreshing.pop(inn, None))
+
+    async def _refresh_in_background(self, inn: str) -> None:
+        try:
+            await self.refresh_party(inn)
+        except DataNewtonError:
+            # The stale row keeps being served until the next attempt.
+            pass
+
     async def _request_counterparty(self, inn: str) -> dict[str, Any] | None:
         retry_count = max(self._settings.datanewton_retry_count, 0)
         last_error: Exception | None = None
@@ -66,12 +190,12 @@ class DataNewtonClient:
                 last_error = exc
                 if attempt >= retry_count:
                     break
-        if last_error is not None:
-            logger.warning("datanewton_request_failed inn=%s err=%s", inn, str(last_error))
-        return None
+        logger.warning("datanewton_request_failed inn=%s err=%s", inn, str(last_error))
+        # Failures are not cached, so the next preview tries again.
+        self._failures += 1
+        raise DataNewtonError(str(last_error))
 
     async def _request_counterparty_once(self, inn: str) -> dict[str, Any] | None:
-        timeout_seconds = max(self._settings.datanewton_timeout_seconds, 1)
         params = {
             "key": self._settings.datanewton_api_key or "",
             "inn": inn,
@@ -79,12 +203,16 @@ class DataNewtonClient:
         filters_value = _build_filters_param_value(self._settings.datanewton_counterparty_filters)
         if filters_value:
             params["filters"] = filters_value
-        for path in _candidate_paths():
-            url = _build_url(self._settings.datanewton_base_url, path)
-            async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-                response = await client.get(url, params=params)
+        client = self._client()
+        base_url = self._settings.datanewton_base_url
+        for path in self._paths_to_try(base_url):
+            url = _build_url(base_url, path)
+            response = await client.get(url, params=params)
             if response.status_code in {404, 405}:
+                self._path_misses += 1
                 continue
+            if response.status_code < 500:
+                self._remember_path(base_url, path)
             if response.status_code == 429:
                 raise DataNewtonError("rate_limited")
             if response.status_code >= 500:
@@ -114,24 +242,89 @@ class DataNewtonClient:
             return parsed
         return None
 
-    def _read_cache(self, inn: str) -> dict[str, Any] | None | None:
+    def _paths_to_try(self, base_url: str) -> tuple[str, ...]:
+        # The path that last answered goes first. Once it is older than
+        # DATANEWTON_PATH_REVALIDATE_SECONDS the full candidate order is walked
+        # again, so a preferred path that starts working is picked back up.
+        candidates = _candidate_paths()
+        known = self._known_paths.get(base_url)
+        if known is None:
+            return candidates
+        path, discovered_at = known
+        if time.monotonic() - discovered_at >= self._settings.datanewton_path_revalidate_seconds:
+            del self._known_paths[base_url]
+            return candidates
+        return (path, *(candidate for candidate in candidates if candidate != path))
+
+    def _remember_path(self, base_url: str, path: str) -> None:
+        known = self._known_paths.get(base_url)
+        if known is not None and known[0] == path:
+            return
+        self._known_paths[base_url] = (path, time.monotonic())
+        self._path_discoveries += 1
+
+    def _sweep(self, now: float) -> None:
+        # Drops every expired entry at most twice per TTL, so entries that are
+        # never read again do not sit in memory until LRU eviction.
+        if now < self._next_sweep_at:
+            return
+        self._next_sweep_at = now + self._settings.datanewton_cache_ttl_seconds / 2
+        expired = [inn for inn, (expires_at, _payload) in self._cache.items() if expires_at <= now]
+        for inn in expired:
+            del self._cache[inn]
+        self._expired += len(expired)
+
+    def _read_cache(self, inn: str) -> Any:
         ttl_seconds = self._settings.datanewton_cache_ttl_seconds
         if ttl_seconds <= 0:
-            return None
+            return _MISS
+        now = time.time()
+        self._sweep(now)
         cached = self._cache.get(inn)
-        if not cached:
-            return None
+        if cached is None:
+            return _MISS
         expires_at, payload = cached
-        if expires_at <= time.time():
-            self._cache.pop(inn, None)
-            return None
+        if expires_at <= now:
+            del self._cache[inn]
+            self._expired += 1
+            return _MISS
+        self._cache.move_to_end(inn)
         return payload
 
     def _write_cache(self, inn: str, payload: dict[str, Any] | None) -> None:
         ttl_seconds = self._settings.datanewton_cache_ttl_seconds
         if ttl_seconds <= 0:
             return
-        self._cache[inn] = (time.time() + ttl_seconds, payload)
+        now = time.time()
+        self._sweep(now)
+        self._cache[inn] = (now + ttl_seconds, payload)
+        self._cache.move_to_end(inn)
+        while len(self._cache) > self._settings.datanewton_cache_max_entries:
+            self._cache.popitem(last=False)
+            self._evictions += 1
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "cache_size": len(self._cache),
+            "cache_max_entries": self._settings.datanewton_cache_max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "requests": self._requests,
+            "failures": self._failures,
+            "evictions": self._evictions,
+            "expired": self._expired,
+            "in_flight": len(self._inflight),
+            "store_enabled": self._store is not None,
+            "store_hits": self._store_hits,
+            "store_misses": self._store_misses,
+            "store_errors": self._store_errors,
+            "refreshes": self._refreshes,
+            "refreshing": len(self._refreshing),
+            "path_misses": self._path_misses,
+            "path_discoveries": self._path_discoveries,
+            "known_paths": {base_url: path for base_url, (path, _at) in self._known_paths.items()},
+        }
 
 
 _client_singleton: DataNewtonClient | None = None
@@ -140,10 +333,22 @@ _client_singleton: DataNewtonClient | None = None
 def get_datanewton_client(settings: Settings) -> DataNewtonClient:
     global _client_singleton
     if _client_singleton is None:
-        _client_singleton = DataNewtonClient(settings)
+        store = None
+        if settings.datanewton_store_enabled:
+            from product_api.db.session import AsyncSessionMaker
+
+            store = CounterpartyStore(AsyncSessionMaker)
+        _client_singleton = DataNewtonClient(settings, store=store)
     return _client_singleton
 
 
+async def close_datanewton_client() -> None:
+    global _client_singleton
+    if _client_singleton is not None:
+        await _client_singleton.aclose()
+        _client_singleton = None
+
+
 async def fetch_datanewton_party_by_inn(settings: Settings, inn: str) -> dict[str, Any] | None:
     client = get_datanewton_client(settings)
     return await client.fetch_party_by_inn(inn)
@@ -158,20 +363,23 @@ def parse_datanewton_counterparty_payload(
     if not isinstance(record, dict):
         return None
 
-    subject_kind = _extract_subject_kind(record, fallback_inn=fallback_inn)
-    company_name = _extract_company_name(record)
-    manager_block = _extract_manager_block(record)
-    individual_block = _extract_individual_block(record)
+    index = _PayloadIndex(record)
+    subject_kind = _extract_subject_kind(record, index, fallback_inn=fallback_inn)
+    company_name = _extract_company_name(record, index)
+    manager_block = _extract_manager_block(record, index)
+    individual_block = _extract_individual_block(record, index)
     person_name = _extract_person_name(
         manager_block=manager_block,
         individual_block=individual_block,
         record=record,
+        index=index,
     )
     position_raw = _extract_position_raw(
         manager_block=manager_block,
         record=record,
+        index=index,
     )
-    address = _extract_address(record)
+    address = _extract_address(record, index)
 
     return {
         "kind": subject_kind,
@@ -231,20 +439,20 @@ def _first_dict(values: Iterable[Any]) -> dict[str, Any] | None:
     return None
 
 
-def _extract_subject_kind(record: dict[str, Any], *, fallback_inn: str | None) -> str:
-    if _is_individual_entrepreneur(record):
+def _extract_subject_kind(record: dict[str, Any], index: _PayloadIndex, *, fallback_inn: str | None) -> str:
+    if _is_individual_entrepreneur(record, index):
         return "individual_entrepreneur"
-    if _is_legal_entity(record):
+    if _is_legal_entity(record, index):
         return "legal_entity"
     fallback = infer_kind_from_inn(fallback_inn)
     return fallback
 
 
-def _is_individual_entrepreneur(record: dict[str, Any]) -> bool:
-    individual_block = _extract_individual_block(record)
+def _is_individual_entrepreneur(record: dict[str, Any], index: _PayloadIndex) -> bool:
+    individual_block = _extract_individual_block(record, index)
     if isinstance(individual_block, dict):
         return True
-    kind_values = _collect_text_values(
+    kind_values = index.text_values(
         record,
         {
             "type",
@@ -259,7 +467,7 @@ def _is_individual_entrepreneur(record: dict[str, Any]) -> bool:
         lowered = value.lower()
         if "ип" in lowered or "индивидуал" in lowered:
             return True
-    bool_flags = _collect_bool_values(
+    bool_flags = index.bool_values(
         record,
         {
             "is_ip",
@@ -271,8 +479,8 @@ def _is_individual_entrepreneur(record: dict[str, Any]) -> bool:
     return any(bool_flags)
 
 
-def _is_legal_entity(record: dict[str, Any]) -> bool:
-    kind_values = _collect_text_values(
+def _is_legal_entity(record: dict[str, Any], index: _PayloadIndex) -> bool:
+    kind_values = index.text_values(
         record,
         {
             "type",
@@ -287,7 +495,7 @@ def _is_legal_entity(record: dict[str, Any]) -> bool:
         lowered = value.lower()
         if "юл" in lowered or "юр" in lowered or "legal" in lowered:
             return True
-    bool_flags = _collect_bool_values(
+    bool_flags = index.bool_values(
         record,
         {
             "is_organization",
@@ -299,7 +507,7 @@ def _is_legal_entity(record: dict[str, Any]) -> bool:
     return any(bool_flags)
 
 
-def _extract_company_name(record: dict[str, Any]) -> str | None:
+def _extract_company_name(record: dict[str, Any], index: _PayloadIndex) -> str | None:
     company_names_name = _extract_company_name_from_company_names(record)
     if company_names_name:
         return company_names_name
@@ -338,7 +546,7 @@ def _extract_company_name(record: dict[str, Any]) -> str | None:
         if block_name_value:
             return block_name_value
 
-    return _find_first_text(
+    return index.first_text(
         record,
         {
             "short_name",
@@ -382,12 +590,12 @@ def _extract_company_primary_manager(record: dict[str, Any]) -> dict[str, Any] |
     return _first_dict(managers)
 
 
-def _extract_manager_block(record: dict[str, Any]) -> dict[str, Any] | None:
+def _extract_manager_block(record: dict[str, Any], index: _PayloadIndex) -> dict[str, Any] | None:
     company_primary_manager = _extract_company_primary_manager(record)
     if company_primary_manager:
         return company_primary_manager
 
-    return _find_first_dict(
+    return index.first_dict(
         record,
         {
             "manager",
@@ -400,8 +608,8 @@ def _extract_manager_block(record: dict[str, Any]) -> dict[str, Any] | None:
     )
 
 
-def _extract_individual_block(record: dict[str, Any]) -> dict[str, Any] | None:
-    return _find_first_dict(
+def _extract_individual_block(record: dict[str, Any], index: _PayloadIndex) -> dict[str, Any] | None:
+    return index.first_dict(
         record,
         {
             "individual",
@@ -418,6 +626,7 @@ def _extract_person_name(
     manager_block: dict[str, Any] | None,
     individual_block: dict[str, Any] | None,
     record: dict[str, Any],
+    index: _PayloadIndex,
 ) -> str | None:
     company_primary_manager = _extract_company_primary_manager(record)
     if company_primary_manager:
@@ -426,7 +635,7 @@ def _extract_person_name(
             return company_manager_fio
 
     if manager_block:
-        name = _find_first_text(
+        name = index.first_text(
             manager_block,
             {
                 "fio",
@@ -442,7 +651,7 @@ def _extract_person_name(
         if name:
             return name
     if individual_block:
-        name = _find_first_text(
+        name = index.first_text(
             individual_block,
             {
                 "fio",
@@ -455,7 +664,7 @@ def _extract_person_name(
         )
         if name:
             return name
-    return _find_first_text(
+    return index.first_text(
         record,
         {
             "manager_fio",
@@ -476,6 +685,7 @@ def _extract_position_raw(
     *,
     manager_block: dict[str, Any] | None,
     record: dict[str, Any],
+    index: _PayloadIndex,
 ) -> str | None:
     company_primary_manager = _extract_company_primary_manager(record)
     if company_primary_manager:
@@ -484,7 +694,7 @@ def _extract_position_raw(
             return company_manager_position
 
     if manager_block:
-        position = _find_first_text(
+        position = index.first_text(
             manager_block,
             {
                 "position",
@@ -498,7 +708,7 @@ def _extract_position_raw(
         )
         if position:
             return position
-    return _find_first_text(
+    return index.first_text(
         record,
         {
             "manager_position",
@@ -509,7 +719,7 @@ def _extract_position_raw(
     )
 
 
-def _extract_address(record: dict[str, Any]) -> str | None:
+def _extract_address(record: dict[str, Any], index: _PayloadIndex) -> str | None:
     company_block = _extract_company_block(record)
     if company_block:
         company_address = company_block.get("address")
@@ -559,7 +769,7 @@ def _extract_address(record: dict[str, Any]) -> str | None:
         if nested_address:
             return nested_address
 
-    return _find_first_text(
+    return index.first_text(
         record,
         {
             "address",
@@ -583,68 +793,108 @@ def _find_direct_text(payload: dict[str, Any], candidate_keys: Iterable[str]) ->
     return None
 
 
-def _find_first_dict(payload: Any, candidate_keys: set[str]) -> dict[str, Any] | None:
-    if isinstance(payload, dict):
-        for key, value in payload.items():
-            if key in candidate_keys and isinstance(value, dict):
-                return value
-            nested = _find_first_dict(value, candidate_keys)
-            if nested is not None:
-                return nested
-        return None
-    if isinstance(payload, list):
-        for item in payload:
-            nested = _find_first_dict(item, candidate_keys)
-            if nested is not None:
-                return nested
-    return None
+class _PayloadIndex:
+    # One pre-order walk over the record. Every key/value pair of every nested
+    # dict gets a position in document order, kept in per-key lists, and every
+    # dict or list gets the [start, end) range of the positions below it. A
+    # "first match under this block" lookup is then a bisect into a few short
+    # lists instead of another recursive walk of the whole payload.
+    def __init__(self, root: Any) -> None:
+        self._positions: dict[Any, list[int]] = {}
+        self._values: dict[Any, list[Any]] = {}
+        self._ranges: dict[int, tuple[int, int]] = {}
+        positions = self._positions
+        values = self._values
+        ranges = self._ranges
+        size = 0
+
+        def walk(node: Any) -> None:
+            nonlocal size
+            start = size
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    key_positions = positions.get(key)
+                    if key_positions is None:
+                        positions[key] = [size]
+                        values[key] = [value]
+                    else:
+                        key_positions.append(size)
+                        values[key].append(value)
+                    size += 1
+                    if isinstance(value, (dict, list)):
+                        walk(value)
+            else:
+                for item in node:
+                    if isinstance(item, (dict, list)):
+                        walk(item)
+            ranges.setdefault(id(node), (start, size))
+
+        if isinstance(root, (dict, list)):
+            walk(root)
+
+    def _spans(self, node: Any, candidate_keys: set[str]) -> list[tuple[list[int], list[Any], int, int]]:
+        # For each candidate key: its positions and values, and the slice of
+        # them that lies under node.
+        bounds = self._ranges.get(id(node))
+        if bounds is None:
+            if isinstance(node, (dict, list)):
+                return _PayloadIndex(node)._spans(node, candidate_keys)
+            return []
+        start, end = bounds
+        spans = []
+        for key in candidate_keys:
+            positions = self._positions.get(key)
+            if not positions:
+                continue
+            low = bisect_left(positions, start)
+            high = bisect_left(positions, end, low)
+            if low < high:
+                spans.append((positions, self._values[key], low, high))
+        return spans
+
+    def _first(self, node: Any, candidate_keys: set[str], convert: Callable[[Any], Any]) -> Any:
+        best_position = None
+        best = None
+        for positions, values, low, high in self._spans(node, candidate_keys):
+            for offset in range(low, high):
+                if best_position is not None and positions[offset] >= best_position:
+                    break
+                converted = convert(values[offset])
+                if converted is not None:
+                    best_position = positions[offset]
+                    best = converted
+                    break
+        return best
 
+    def _all(self, node: Any, candidate_keys: set[str], convert: Callable[[Any], Any]) -> list[Any]:
+        matches = []
+        for positions, values, low, high in self._spans(node, candidate_keys):
+            for offset in range(low, high):
+                converted = convert(values[offset])
+                if converted is not None:
+                    matches.append((positions[offset], converted))
+        matches.sort(key=lambda match: match[0])
+        return [converted for _position, converted in matches]
 
-def _find_first_text(payload: Any, candidate_keys: set[str]) -> str | None:
-    if isinstance(payload, dict):
-        for key, value in payload.items():
-            if key in candidate_keys:
-                normalized = _normalize_text(value)
-                if normalized:
-                    return normalized
-            nested = _find_first_text(value, candidate_keys)
-            if nested:
-                return nested
-        return None
-    if isinstance(payload, list):
-        for item in payload:
-            nested = _find_first_text(item, candidate_keys)
-            if nested:
-                return nested
-    return None
+    def first_dict(self, node: Any, candidate_keys: set[str]) -> dict[str, Any] | None:
+        return self._first(node, candidate_keys, _as_dict)
 
+    def first_text(self, node: Any, candidate_keys: set[str]) -> str | None:
+        return self._first(node, candidate_keys, _normalize_text)
 
-def _collect_text_values(payload: Any, candidate_keys: set[str]) -> list[str]:
-    values: list[str] = []
-    if isinstance(payload, dict):
-        for key, value in payload.items():
-            if key in candidate_keys:
-                normalized = _normalize_text(value)
-                if normalized:
-                    values.append(normalized)
-            values.extend(_collect_text_values(value, candidate_keys))
-    elif isinstance(payload, list):
-        for item in payload:
-            values.extend(_collect_text_values(item, candidate_keys))
-    return values
-
-
-def _collect_bool_values(payload: Any, candidate_keys: set[str]) -> list[bool]:
-    values: list[bool] = []
-    if isinstance(payload, dict):
-        for key, value in payload.items():
-            if key in candidate_keys and isinstance(value, bool):
-                values.append(value)
-            values.extend(_collect_bool_values(value, candidate_keys))
-    elif isinstance(payload, list):
-        for item in payload:
-            values.extend(_collect_bool_values(item, candidate_keys))
-    return values
+    def text_values(self, node: Any, candidate_keys: set[str]) -> list[str]:
+        return self._all(node, candidate_keys, _normalize_text)
+
+    def bool_values(self, node: Any, candidate_keys: set[str]) -> list[bool]:
+        return self._all(node, candidate_keys, _as_bool)
+
+
+def _as_dict(value: Any) -> dict[str, Any] | None:
+    return value if isinstance(value, dict) else None
+
+
+def _as_bool(value: Any) -> bool | None:
+    return value if isinstance(value, bool) else None
 
 
 def _normalize_text(value: Any) -> str | None:
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
 from typing import Any
@@ -10,7 +11,7 @@ from product_api.settings import Settings
 from .datanewton_client import fetch_datanewton_party_by_inn
 from .normalization import normalize_inn
 from .person_name_ai_service import transform_person_name_with_ai
-from .preview_header_formatter import build_preview_header, infer_kind_from_inn
+from .preview_header_formatter import build_preview_header, build_preview_header_party, infer_kind_from_inn
 
 logger = logging.getLogger(__name__)
 PREVIEW_HEADER_FORMAT_VERSION = 2
@@ -40,6 +41,12 @@ def build_preview_header_from_normalized_data(
     return build_preview_header(from_party=from_party, to_party=to_party)
 
 
+def preview_header_needs_rebuild(preview_header: Any) -> bool:
+    # A header cut short by the deadline is stored for the response but is
+    # rebuilt on the next read instead of being kept for good.
+    return not isinstance(preview_header, dict) or bool(preview_header.get("partial"))
+
+
 async def rebuild_claim_preview_header(
     settings: Settings,
     claim: Claim,
@@ -62,41 +69,90 @@ async def rebuild_claim_preview_header(
         strict=False,
     )
 
-    if settings.datanewton_enabled:
-        if creditor_inn:
-            creditor_party = await _safe_fetch_party(settings, creditor_inn)
-            if creditor_party:
-                from_party = _merge_party(from_party, creditor_party)
-        if debtor_inn:
-            debtor_party = await _safe_fetch_party(settings, debtor_inn)
-            if debtor_party:
-                to_party = _merge_party(to_party, debtor_party)
-
-    rebuilt_header = build_preview_header(from_party=from_party, to_party=to_party)
-    await _apply_fio_ai_for_legal_entities(settings, rebuilt_header)
-    await _apply_fio_ai_for_individual_entrepreneurs(settings, rebuilt_header)
-    claim.preview_header_json = _as_preview_header_v2(rebuilt_header)
+    # The two sides are independent: each one looks up its party and then
+    # runs its FIO transform, concurrently with the other side. Whatever a
+    # side has finished by the deadline is used; the rest keeps the
+    # formatter output.
+    results: dict[str, dict[str, Any]] = {
+        "from_party": build_preview_header_party(from_party, side="from"),
+        "to_party": build_preview_header_party(to_party, side="to"),
+    }
+    tasks = {
+        "from_party": asyncio.create_task(
+            _rebuild_party_header(
+                settings,
+                results,
+                party_key="from_party",
+                party=from_party,
+                inn=creditor_inn,
+                side="from",
+                target_case="genitive",
+            )
+        ),
+        "to_party": asyncio.create_task(
+            _rebuild_party_header(
+                settings,
+                results,
+                party_key="to_party",
+                party=to_party,
+                inn=debtor_inn,
+                side="to",
+                target_case="dative",
+            )
+        ),
+    }
+    try:
+        done, pending = await asyncio.wait(
+            tasks.values(),
+            timeout=settings.claims_preview_header_deadline_seconds,
+        )
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning(
+            "preview_header_deadline_exceeded claim_id=%s pending=%s",
+            claim.id,
+            ",".join(party_key for party_key, task in tasks.items() if task in pending),
+        )
+    for task in done:
+        task.result()
+
+    claim.preview_header_json = _as_preview_header_v2(results, partial=bool(pending))
     return claim.preview_header_json
 
 
-async def _apply_fio_ai_for_legal_entities(
+async def _rebuild_party_header(
     settings: Settings,
-    header: dict[str, Any],
+    results: dict[str, dict[str, Any]],
+    *,
+    party_key: str,
+    party: dict[str, Any],
+    inn: str | None,
+    side: str,
+    target_case: str,
 ) -> None:
+    # results[party_key] is only replaced or mutated after each await
+    # completes, so a side cancelled at the deadline leaves its last
+    # complete state behind.
+    if settings.datanewton_enabled and inn:
+        fetched_party = await _safe_fetch_party(settings, inn)
+        if fetched_party:
+            results[party_key] = build_preview_header_party(_merge_party(party, fetched_party), side=side)
     if not settings.claims_fio_ai_enabled:
         return
-
     await _apply_fio_ai_to_party_line3(
         settings,
-        header=header,
-        party_key="from_party",
-        target_case="genitive",
+        header=results,
+        party_key=party_key,
+        target_case=target_case,
     )
-    await _apply_fio_ai_to_party_line3(
+    await _apply_fio_ai_to_ip_party_line2(
         settings,
-        header=header,
-        party_key="to_party",
-        target_case="dative",
+        header=results,
+        party_key=party_key,
+        target_case=target_case,
     )
 
 
@@ -138,27 +194,6 @@ async def _apply_fio_ai_to_party_line3(
     rendered["line3"] = _normalize_all_caps_cyrillic_fio_display_value(final_line3)
 
 
-async def _apply_fio_ai_for_individual_entrepreneurs(
-    settings: Settings,
-    header: dict[str, Any],
-) -> None:
-    if not settings.claims_fio_ai_enabled:
-        return
-
-    await _apply_fio_ai_to_ip_party_line2(
-        settings,
-        header=header,
-        party_key="from_party",
-        target_case="genitive",
-    )
-    await _apply_fio_ai_to_ip_party_line2(
-        settings,
-        header=header,
-        party_key="to_party",
-        target_case="dative",
-    )
-
-
 async def _apply_fio_ai_to_ip_party_line2(
     settings: Settings,
     *,
@@ -258,7 +293,7 @@ async def _safe_fetch_party(settings: Settings, inn: str) -> dict[str, Any] | No
         return None
 
 
-def _as_preview_header_v2(payload: dict[str, Any]) -> dict[str, Any]:
+def _as_preview_header_v2(payload: dict[str, Any], *, partial: bool = False) -> dict[str, Any]:
     source = payload if isinstance(payload, dict) else {}
     from_party = dict(source.get("from_party") or {})
     to_party = dict(source.get("to_party") or {})
@@ -271,8 +306,11 @@ def _as_preview_header_v2(payload: dict[str, Any]) -> dict[str, Any]:
     if isinstance(to_rendered, dict):
         to_party["rendered"] = dict(to_rendered)
 
-    return {
+    header = {
         "format_version": PREVIEW_HEADER_FORMAT_VERSION,
         "from_party": from_party,
         "to_party": to_party,
     }
+    if partial:
+        header["partial"] = True
+    return header
@@ -0,0 +1,168 @@
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from product_api.settings import Settings
+from product_api.tokens import ContextMessage
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "chat_context"
+
+
+@dataclass(slots=True)
+class _ContextWindow:
+    limit: int
+    messages: list[ContextMessage]
+    last_message_id: int | None
+
+
+class ConversationContextCache:
+    def __init__(self, max_conversations: int) -> None:
+        self._max_conversations = max_conversations
+        self._windows: OrderedDict[int, _ContextWindow] = OrderedDict()
+        self.enabled = max_conversations > 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def get(self, conversation_id: int, limit: int) -> list[ContextMessage] | None:
+        window = self._windows.get(conversation_id) if self.enabled else None
+        # A window loaded for a smaller limit cannot answer a larger one.
+        if window is None or window.limit != limit:
+            self.misses += 1
+            return None
+        self._windows.move_to_end(conversation_id)
+        self.hits += 1
+        return list(window.messages)
+
+    def store(
+        self,
+        conversation_id: int,
+        limit: int,
+        messages: list[ContextMessage],
+        last_message_id: int | None,
+    ) -> None:
+        if not self.enabled:
+            return
+        self._windows[conversation_id] = _ContextWindow(
+            limit=limit,
+            messages=list(messages[-limit:]) if limit > 0 else [],
+            last_message_id=last_message_id,
+        )
+        self._windows.move_to_end(conversation_id)
+        while len(self._windows) > self._max_conversations:
+            self._windows.popitem(last=False)
+
+    def append(
+        self,
+        conversation_id: int,
+        message: ContextMessage,
+        message_id: int,
+        after_message_id: int | None = None,
+    ) -> None:
+        window = self._windows.get(conversation_id)
+        if window is None:
+            return
+        # Appending is only safe when nothing else landed in the conversation
+        # since the message this one follows; otherwise reload from the DB.
+        if after_message_id is not None and window.last_message_id != after_message_id:
+            self.invalidate(conversation_id)
+            return
+        window.messages.append(message)
+        if len(window.messages) > window.limit:
+            del window.messages[: len(window.messages) - window.limit]
+        window.last_message_id = message_id
+
+    def invalidate(self, conversation_id: int) -> None:
+        self._windows.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        self._windows.clear()
+
+    def stats(self) -> dict[str, int | bool]:
+        return {
+            "enabled": self.enabled,
+            "conversations": len(self._windows),
+            "max_conversations": self._max_conversations,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ContextInvalidationListener:
+    def __init__(self, cache: ConversationContextCache) -> None:
+        self._cache = cache
+        self._connection: AsyncConnection | None = None
+        self._driver_connection = None
+        self.worker_id = uuid.uuid4().hex
+
+    def notify_payload(self, conversation_id: int) -> str:
+        return f"{self.worker_id}:{conversation_id}"
+
+    def _on_notify(self, _connection, _pid, _channel, payload: str) -> None:
+        worker_id, _, conversation_id = payload.partition(":")
+        if worker_id == self.worker_id or not conversation_id.isdigit():
+            return
+        self._cache.invalidate(int(conversation_id))
+
+    def _on_terminate(self, _connection) -> None:
+        # Without the channel other workers' writes go unnoticed; stop serving
+        # from the cache rather than risk stale context.
+        logger.warning("chat context listener connection lost; cache disabled")
+        self._cache.clear()
+        self._cache.enabled = False
+
+    async def start(self, engine: AsyncEngine) -> None:
+        self._connection = await engine.connect()
+        raw = await self._connection.get_raw_connection()
+        self._driver_connection = raw.driver_connection
+        await self._driver_connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        self._driver_connection.add_termination_listener(self._on_terminate)
+
+    async def stop(self) -> None:
+        if self._connection is None:
+            return
+        # The connection goes back to the pool; detach our callbacks first.
+        self._driver_connection.remove_termination_listener(self._on_terminate)
+        await self._driver_connection.remove_listener(NOTIFY_CHANNEL, self._on_notify)
+        await self._connection.close()
+        self._connection = None
+        self._driver_connection = None
+
+
+_cache: ConversationContextCache | None = None
+_listener: ContextInvalidationListener | None = None
+
+
+def get_context_cache(settings: Settings) -> ConversationContextCache:
+    global _cache
+    if _cache is None:
+        _cache = ConversationContextCache(settings.chat_context_cache_size)
+    return _cache
+
+
+def get_context_listener() -> ContextInvalidationListener | None:
+    return _listener
+
+
+async def start_context_listener(settings: Settings, engine: AsyncEngine) -> None:
+    global _listener
+    cache = get_context_cache(settings)
+    if not settings.chat_context_cache_notify or not cache.enabled:
+        return
+    listener = ContextInvalidationListener(cache)
+    await listener.start(engine)
+    _listener = listener
+
+
+async def stop_context_listener() -> None:
+    global _listener
+    if _listener is not None:
+        await _listener.stop()
+        _listener = None
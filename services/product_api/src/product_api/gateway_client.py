@@ -1,62 +1,290 @@
+import asyncio
 import hashlib
 import hmac
 import json
+import logging
 import time
 import uuid
+from collections.abc import Awaitable, Callable
 
 import httpx
 
+from product_api.gateway_router import GatewayEndpoint, get_gateway_router
 from product_api.request_id import get_request_id_header
 from product_api.settings import Settings
+from shared.compression import encode_body
 from shared.schemas import ChatRequest, ChatResponse
+from shared.sse import iter_sse_json
 
 SIGNATURE_HEADER = "X-Signature"
 TIMESTAMP_HEADER = "X-Timestamp"
 NONCE_HEADER = "X-Nonce"
 BODY_HASH_HEADER = "X-Body-SHA256"
 
+logger = logging.getLogger(__name__)
+
 
 class GatewayError(Exception):
     pass
 
 
+class GatewayPoolExhaustedError(GatewayError):
+    # No local connection became free in time: this process is overloaded,
+    # the gateways themselves did not fail.
+    pass
+
+
+class GatewayHttpPool:
+    def __init__(
+        self,
+        settings: Settings,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        limits = httpx.Limits(
+            max_connections=settings.gateway_pool_max_connections,
+            max_keepalive_connections=settings.gateway_pool_max_keepalive_connections,
+            keepalive_expiry=settings.gateway_pool_keepalive_expiry_seconds,
+        )
+        self._transport = transport or httpx.AsyncHTTPTransport(
+            http2=settings.gateway_http2,
+            limits=limits,
+        )
+        self._client = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=settings.gateway_timeout_seconds,
+        )
+        self._http2 = settings.gateway_http2
+        self._max_connections = settings.gateway_pool_max_connections
+        self._requests_total = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._pool_timeouts = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
+
+    def request_started(self) -> None:
+        self._requests_total += 1
+        self._in_flight += 1
+        if self._in_flight > self._peak_in_flight:
+            self._peak_in_flight = self._in_flight
+
+    def request_finished(self) -> None:
+        self._in_flight = max(self._in_flight - 1, 0)
+
+    def pool_exhausted(self, exc: httpx.PoolTimeout) -> GatewayPoolExhaustedError:
+        self._pool_timeouts += 1
+        return GatewayPoolExhaustedError(f"gateway connection pool exhausted: {_describe_error(exc)}")
+
+    def stats(self) -> dict[str, object]:
+        connections = list(getattr(getattr(self._transport, "_pool", None), "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "http2": self._http2,
+            "max_connections": self._max_connections,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "requests_total": self._requests_total,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "pool_timeouts": self._pool_timeouts,
+        }
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_pool: GatewayHttpPool | None = None
+
+
+def get_gateway_pool(settings: Settings) -> GatewayHttpPool:
+    global _pool
+    if _pool is None or _pool.is_closed:
+        _pool = GatewayHttpPool(settings)
+    return _pool
+
+
+async def close_gateway_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
+
+
 def _body_sha256(body: bytes) -> str:
     return hashlib.sha256(body).hexdigest()
 
 
-def _canonical_string(method: str, path: str, timestamp: str, nonce: str, body_hash: str) -> str:
-    return "\n".join([method, path, timestamp, nonce, body_hash])
+def _canonical_string(
+    method: str,
+    path: str,
+    timestamp: str,
+    nonce: str,
+    body_hash: str,
+    content_encoding: str | None = None,
+) -> str:
+    # Must match gateway_api.security: the hash covers the bytes on the wire
+    # and the content encoding, when present, is signed as a sixth line.
+    parts = [method, path, timestamp, nonce, body_hash]
+    if content_encoding:
+        parts.append(content_encoding)
+    return "\n".join(parts)
 
 
-def _sign_headers(secret: str, method: str, path: str, body: bytes) -> dict[str, str]:
+def _sign_headers(
+    secret: str,
+    method: str,
+    path: str,
+    body: bytes,
+    content_encoding: str | None = None,
+) -> dict[str, str]:
     timestamp = str(int(time.time()))
     nonce = uuid.uuid4().hex
     body_hash = _body_sha256(body)
-    canonical = _canonical_string(method.upper(), path, timestamp, nonce, body_hash)
+    canonical = _canonical_string(
+        method.upper(), path, timestamp, nonce, body_hash, content_encoding
+    )
     signature = hmac.new(
         secret.encode("utf-8"),
         canonical.encode("utf-8"),
         hashlib.sha256,
     ).hexdigest()
-    return {
+    headers = {
         SIGNATURE_HEADER: signature,
         TIMESTAMP_HEADER: timestamp,
         NONCE_HEADER: nonce,
         BODY_HASH_HEADER: body_hash,
     }
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return headers
 
 
-async def send_chat(settings: Settings, payload: ChatRequest) -> ChatResponse:
-    path = "/v1/chat"
-    url = f"{settings.gateway_url}{path}"
-    body = json.dumps(payload.model_dump(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
-    headers = _sign_headers(settings.gateway_shared_secret, "POST", path, body)
+def _encode_chat_body(payload: ChatRequest) -> bytes:
+    return json.dumps(payload.model_dump(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _wire_body(settings: Settings, endpoint: GatewayEndpoint, body: bytes) -> tuple[bytes, str | None]:
+    # Only gateways that advertised the encoding on /internal/ping get a
+    # compressed body; one not probed yet, or not upgraded, gets plain JSON.
+    encoding = settings.gateway_request_compression
+    if encoding not in endpoint.content_encodings:
+        encoding = None
+    return encode_body(body, encoding, settings.gateway_compression_min_bytes)
+
+
+def _chat_headers(settings: Settings, path: str, body: bytes, encoding: str | None) -> dict[str, str]:
+    # Signed per attempt: a failover must not reuse the nonce.
+    headers = _sign_headers(settings.gateway_shared_secret, "POST", path, body, encoding)
     headers.update(get_request_id_header())
     headers["Content-Type"] = "application/json"
+    return headers
+
+
+def _describe_error(exc: Exception) -> str:
+    return f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+
+
+# Errors raised before the request reaches a gateway worker, so sending it
+# to another gateway cannot start a second generation. PoolTimeout is not one
+# of them: every endpoint draws from the same local pool.
+_FAILOVER_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+# Statuses a proxy in front of the gateway answers with when no worker took
+# the request.
+_FAILOVER_STATUSES = (502, 503, 504)
+
+
+def _gateway_unavailable(status_code: int, body: bytes) -> bool:
+    # The gateway itself reports upstream LLM failures as {"error": {...}}
+    # with the upstream status. Those requests were already processed, and
+    # the gateway does not deduplicate by message_id, so they are not re-sent.
+    if status_code not in _FAILOVER_STATUSES:
+        return False
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return True
+    return not (isinstance(data, dict) and "error" in data)
 
-    async with httpx.AsyncClient(timeout=settings.gateway_timeout_seconds) as client:
-        resp = await client.post(url, content=body, headers=headers)
 
+async def _request_with_failover(
+    settings: Settings,
+    path: str,
+    send: Callable[[httpx.AsyncClient, GatewayEndpoint], Awaitable[httpx.Response]],
+    try_next_on: tuple[int, ...] = (),
+) -> httpx.Response:
+    # Walks the endpoints best-first and moves on only when the gateway never
+    # got the request: connect errors and proxy 502/503/504. Read
+    # timeouts and the gateway's own error responses go back to the caller.
+    router = get_gateway_router(settings)
+    pool = get_gateway_pool(settings)
+    endpoints = router.ranked()
+    for index, endpoint in enumerate(endpoints):
+        has_next = index + 1 < len(endpoints)
+        started = time.monotonic()
+        pool.request_started()
+        try:
+            resp = await send(pool.client, endpoint)
+        except httpx.PoolTimeout as exc:
+            raise pool.pool_exhausted(exc) from exc
+        except _FAILOVER_ERRORS as exc:
+            router.observe_failure(endpoint, _describe_error(exc))
+            if not has_next:
+                raise
+            router.observe_failover(endpoint)
+            continue
+        finally:
+            pool.request_finished()
+        if _gateway_unavailable(resp.status_code, resp.content):
+            router.observe_failure(endpoint, f"status {resp.status_code}")
+            if not has_next:
+                return resp
+            router.observe_failover(endpoint)
+            continue
+        router.observe_success(endpoint, time.monotonic() - started)
+        if resp.status_code in try_next_on and has_next:
+            continue
+        return resp
+    raise GatewayError("no gateway endpoints configured")
+
+
+async def send_chat(settings: Settings, payload: ChatRequest) -> ChatResponse:
+    path = "/v1/chat"
+    raw_body = _encode_chat_body(payload)
+
+    async def send(client: httpx.AsyncClient, endpoint: GatewayEndpoint) -> httpx.Response:
+        body, encoding = _wire_body(settings, endpoint, raw_body)
+        return await client.post(
+            f"{endpoint.url}{path}",
+            content=body,
+            headers=_chat_headers(settings, path, body, encoding),
+            timeout=settings.gateway_timeout_seconds,
+        )
+
+    resp = await _request_with_failover(settings, path, send)
+    if resp.status_code != 200:
+        raise GatewayError(f"gateway status {resp.status_code}")
+
+    return ChatResponse.model_validate(resp.json())
+
+
+async def fetch_final_text(settings: Settings, stream_id: str) -> ChatResponse:
+    path = f"/v1/chat/finals/{stream_id}"
+
+    async def send(client: httpx.AsyncClient, endpoint: GatewayEndpoint) -> httpx.Response:
+        headers = _sign_headers(settings.gateway_shared_secret, "GET", path, b"")
+        headers.update(get_request_id_header())
+        return await client.get(f"{endpoint.url}{path}", headers=headers, timeout=settings.gateway_timeout_seconds)
+
+    # The text lives only on the gateway that streamed it, so a 404 means
+    # "ask the next one" rather than a failure.
+    resp = await _request_with_failover(settings, path, send, try_next_on=(404,))
     if resp.status_code != 200:
         raise GatewayError(f"gateway status {resp.status_code}")
 
@@ -65,41 +293,119 @@ async def send_chat(settings: Settings, payload: ChatRequest) -> ChatResponse:
 
 async def stream_chat(settings: Settings, payload: ChatRequest):
     path = "/v1/chat"
-    url = f"{settings.gateway_url}{path}"
-    body = json.dumps(payload.model_dump(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
-    headers = _sign_headers(settings.gateway_shared_secret, "POST", path, body)
-    headers.update(get_request_id_header())
-    headers["Content-Type"] = "application/json"
+    raw_body = _encode_chat_body(payload)
 
-    async with httpx.AsyncClient(timeout=settings.gateway_timeout_seconds) as client:
-        async with client.stream("POST", url, content=body, headers=headers) as resp:
-            if resp.status_code != 200:
-                text = await resp.aread()
-                raise GatewayError(f"gateway status {resp.status_code}: {text.decode('utf-8', 'ignore')}")
-
-            event_name = None
-            data_lines: list[str] = []
-            async for line in resp.aiter_lines():
-                if line.startswith("event:"):
-                    event_name = line.split(":", 1)[1].strip()
+    router = get_gateway_router(settings)
+    pool = get_gateway_pool(settings)
+    endpoints = router.ranked()
+    for index, endpoint in enumerate(endpoints):
+        # Failover is only possible until the first event reaches the caller.
+        can_fail_over = index + 1 < len(endpoints)
+        body, encoding = _wire_body(settings, endpoint, raw_body)
+        started = time.monotonic()
+        pool.request_started()
+        try:
+            async with pool.client.stream(
+                "POST",
+                f"{endpoint.url}{path}",
+                content=body,
+                headers=_chat_headers(settings, path, body, encoding),
+                timeout=settings.gateway_timeout_seconds,
+            ) as resp:
+                if resp.status_code != 200:
+                    text = await resp.aread()
+                    error = GatewayError(
+                        f"gateway status {resp.status_code}: {text.decode('utf-8', 'ignore')}"
+                    )
+                    if not _gateway_unavailable(resp.status_code, text):
+                        raise error
+                    router.observe_failure(endpoint, f"status {resp.status_code}")
+                    if not can_fail_over:
+                        raise error
+                    router.observe_failover(endpoint)
                     continue
-                if line.startswith("data:"):
-                    data_lines.append(line.split(":", 1)[1].strip())
-                    continue
-                if line == "":
-                    if event_name and data_lines:
-                        data_str = "\n".join(data_lines)
-                        try:
-                            data = json.loads(data_str)
-                        except json.JSONDecodeError:
-                            data = {"raw": data_str}
-                        yield event_name, data
-                    event_name = None
-                    data_lines = []
-            if event_name and data_lines:
-                data_str = "\n".join(data_lines)
-                try:
-                    data = json.loads(data_str)
-                except json.JSONDecodeError:
-                    data = {"raw": data_str}
-                yield event_name, data
+                router.observe_success(endpoint, time.monotonic() - started)
+                async for item in iter_sse_json(resp.aiter_bytes()):
+                    can_fail_over = False
+                    yield item
+                return
+        except httpx.PoolTimeout as exc:
+            raise pool.pool_exhausted(exc) from exc
+        except _FAILOVER_ERRORS as exc:
+            router.observe_failure(endpoint, _describe_error(exc))
+            if not can_fail_over:
+                raise
+            router.observe_failover(endpoint)
+        finally:
+            pool.request_finished()
+
+
+async def probe_gateways(settings: Settings) -> None:
+    router = get_gateway_router(settings)
+    client = get_gateway_pool(settings).client
+    path = "/internal/ping"
+
+    async def probe(endpoint: GatewayEndpoint) -> None:
+        headers = _sign_headers(settings.gateway_shared_secret, "POST", path, b"")
+        started = time.monotonic()
+        try:
+            resp = await client.post(
+                f"{endpoint.url}{path}",
+                content=b"",
+                headers=headers,
+                timeout=settings.gateway_probe_timeout_seconds,
+            )
+        except httpx.HTTPError as exc:
+            router.observe_probe(endpoint, None, _describe_error(exc))
+            return
+        if resp.status_code != 200:
+            router.observe_probe(endpoint, None, f"status {resp.status_code}")
+            return
+        router.observe_probe(endpoint, time.monotonic() - started)
+        endpoint.content_encodings = _advertised_encodings(resp)
+
+    await asyncio.gather(*(probe(endpoint) for endpoint in router.endpoints))
+
+
+def _advertised_encodings(resp: httpx.Response) -> tuple[str, ...]:
+    # Gateways that predate request compression answer without the field.
+    try:
+        data = resp.json()
+    except ValueError:
+        return ()
+    values = data.get("content_encodings") if isinstance(data, dict) else None
+    if not isinstance(values, list):
+        return ()
+    return tuple(value for value in values if isinstance(value, str))
+
+
+_prober: asyncio.Task | None = None
+
+
+async def _run_probes(settings: Settings) -> None:
+    while True:
+        try:
+            await probe_gateways(settings)
+        except Exception:
+            logger.exception("gateway probe round failed")
+        await asyncio.sleep(settings.gateway_probe_interval_seconds)
+
+
+def start_gateway_probes(settings: Settings) -> None:
+    # A single endpoint has nowhere to fail over to, so it is only probed
+    # when request compression needs to learn which encodings it accepts.
+    global _prober
+    if _prober is not None or settings.gateway_probe_interval_seconds <= 0:
+        return
+    compression_enabled = settings.gateway_request_compression != "none"
+    if len(get_gateway_router(settings).endpoints) < 2 and not compression_enabled:
+        return
+    _prober = asyncio.create_task(_run_probes(settings))
+
+
+async def stop_gateway_probes() -> None:
+    global _prober
+    if _prober is not None:
+        _prober.cancel()
+        await asyncio.gather(_prober, return_exceptions=True)
+        _prober = None
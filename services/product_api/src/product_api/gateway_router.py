@@ -0,0 +1,153 @@
+import time
+
+from product_api.settings import Settings
+
+
+class GatewayEndpoint:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.rtt_ewma: float | None = None
+        self.latency_ewma: float | None = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.failovers = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.last_error: str | None = None
+        # Request encodings the gateway advertised on its last successful probe.
+        self.content_encodings: tuple[str, ...] = ()
+
+    def stats(self, now: float) -> dict[str, object]:
+        return {
+            "url": self.url,
+            "healthy": self.ejected_until <= now,
+            "rtt_ewma_ms": None if self.rtt_ewma is None else round(self.rtt_ewma * 1000, 1),
+            "latency_ewma_ms": None if self.latency_ewma is None else round(self.latency_ewma * 1000, 1),
+            "error_rate": round(self.error_ewma, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_for_seconds": round(max(self.ejected_until - now, 0.0), 1),
+            "requests": self.requests,
+            "failures": self.failures,
+            "failovers": self.failovers,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "last_error": self.last_error,
+            "content_encodings": list(self.content_encodings),
+        }
+
+
+class GatewayRouter:
+    # Ranks gateway endpoints by expected cost: the latency EWMA plus the error
+    # EWMA weighted by the request timeout, since a failed call costs roughly
+    # that much before failover. Probe round-trips are preferred over request
+    # latency for ranking because the latter is dominated by generation time,
+    # which is the same behind every gateway. Endpoints that fail
+    # eject_after_failures times in a row sit out eject_seconds, and are only
+    # tried after every healthy one.
+    def __init__(
+        self,
+        urls: list[str],
+        alpha: float,
+        eject_after_failures: int,
+        eject_seconds: float,
+        error_cost_seconds: float,
+    ) -> None:
+        self._endpoints = [GatewayEndpoint(url.rstrip("/")) for url in urls]
+        self._alpha = alpha
+        self._eject_after_failures = eject_after_failures
+        self._eject_seconds = eject_seconds
+        self._error_cost_seconds = error_cost_seconds
+
+    @property
+    def endpoints(self) -> list[GatewayEndpoint]:
+        return list(self._endpoints)
+
+    def _score(self, endpoint: GatewayEndpoint) -> float:
+        latency = endpoint.rtt_ewma if endpoint.rtt_ewma is not None else endpoint.latency_ewma
+        return (latency or 0.0) + endpoint.error_ewma * self._error_cost_seconds
+
+    def ranked(self, now: float | None = None) -> list[GatewayEndpoint]:
+        now = time.monotonic() if now is None else now
+        healthy = [endpoint for endpoint in self._endpoints if endpoint.ejected_until <= now]
+        ejected = [endpoint for endpoint in self._endpoints if endpoint.ejected_until > now]
+        # sorted() is stable, so ties keep the configured order.
+        healthy.sort(key=self._score)
+        ejected.sort(key=lambda endpoint: endpoint.ejected_until)
+        return healthy + ejected
+
+    def _ewma(self, current: float | None, sample: float) -> float:
+        if current is None:
+            return sample
+        return self._alpha * sample + (1 - self._alpha) * current
+
+    def _succeeded(self, endpoint: GatewayEndpoint) -> None:
+        endpoint.error_ewma = self._ewma(endpoint.error_ewma, 0.0)
+        endpoint.consecutive_failures = 0
+        endpoint.ejected_until = 0.0
+
+    def _failed(self, endpoint: GatewayEndpoint, error: str, now: float) -> None:
+        endpoint.error_ewma = self._ewma(endpoint.error_ewma, 1.0)
+        endpoint.consecutive_failures += 1
+        endpoint.last_error = error
+        if endpoint.consecutive_failures >= self._eject_after_failures:
+            endpoint.ejected_until = now + self._eject_seconds
+
+    def observe_success(self, endpoint: GatewayEndpoint, latency: float) -> None:
+        endpoint.requests += 1
+        endpoint.latency_ewma = self._ewma(endpoint.latency_ewma, latency)
+        self._succeeded(endpoint)
+
+    def observe_failure(self, endpoint: GatewayEndpoint, error: str, now: float | None = None) -> None:
+        endpoint.requests += 1
+        endpoint.failures += 1
+        self._failed(endpoint, error, time.monotonic() if now is None else now)
+
+    def observe_failover(self, endpoint: GatewayEndpoint) -> None:
+        endpoint.failovers += 1
+
+    def observe_probe(
+        self,
+        endpoint: GatewayEndpoint,
+        rtt: float | None,
+        error: str | None = None,
+        now: float | None = None,
+    ) -> None:
+        endpoint.probes += 1
+        if error is None and rtt is not None:
+            endpoint.rtt_ewma = self._ewma(endpoint.rtt_ewma, rtt)
+            self._succeeded(endpoint)
+            return
+        endpoint.probe_failures += 1
+        self._failed(endpoint, error or "probe failed", time.monotonic() if now is None else now)
+
+    def stats(self, now: float | None = None) -> dict[str, object]:
+        now = time.monotonic() if now is None else now
+        ranked = self.ranked(now)
+        return {
+            "preferred": ranked[0].url if ranked else None,
+            "endpoints": [endpoint.stats(now) for endpoint in self._endpoints],
+        }
+
+
+_router: GatewayRouter | None = None
+
+
+def get_gateway_router(settings: Settings) -> GatewayRouter:
+    global _router
+    if _router is None:
+        _router = GatewayRouter(
+            settings.gateway_urls or [settings.gateway_url],
+            alpha=settings.gateway_ewma_alpha,
+            eject_after_failures=settings.gateway_eject_after_failures,
+            eject_seconds=settings.gateway_eject_seconds,
+            error_cost_seconds=settings.gateway_timeout_seconds,
+        )
+    return _router
+
+
+def reset_gateway_router() -> None:
+    global _router
+    _router = None
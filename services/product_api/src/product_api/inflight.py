@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from product_api.settings import Settings
+from product_api.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = frozenset({"final", "error"})
+
+
+class InflightStream:
+    def __init__(self, message_id: int, detach_grace_seconds: float, replay_events: int) -> None:
+        self.message_id = message_id
+        self._detach_grace_seconds = detach_grace_seconds
+        # Events are numbered from 1; only the newest replay_events are kept,
+        # older deltas are served from the accumulated text instead.
+        self._events: deque[tuple[int, str, dict]] = deque(maxlen=replay_events)
+        self._last_event_id = 0
+        self._text_chunks: list[str] = []
+        self._text_length = 0
+        self._text_ends: list[int] = []
+        self._changed = asyncio.Condition()
+        self._done = False
+        self._subscribers = 0
+        self._task: asyncio.Task | None = None
+        self._orphan_timer: asyncio.TimerHandle | None = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    @property
+    def text(self) -> str:
+        if len(self._text_chunks) > 1:
+            self._text_chunks = ["".join(self._text_chunks)]
+        return self._text_chunks[0] if self._text_chunks else ""
+
+    def start(self, producer: Callable[["InflightStream"], Awaitable[None]]) -> None:
+        self._task = asyncio.create_task(producer(self))
+
+    async def publish(self, event: str, data: dict) -> None:
+        async with self._changed:
+            if event == "delta":
+                delta_text = data.get("text", "")
+                if delta_text:
+                    self._text_chunks.append(delta_text)
+                    self._text_length += len(delta_text)
+            self._text_ends.append(self._text_length)
+            self._last_event_id += 1
+            self._events.append((self._last_event_id, event, data))
+            self._changed.notify_all()
+
+    async def close(self) -> None:
+        async with self._changed:
+            self._done = True
+            self._changed.notify_all()
+        self._cancel_orphan_timer()
+
+    async def subscribe(self, after_event_id: int = 0) -> AsyncIterator[tuple[int, str, dict]]:
+        # Replays everything after after_event_id, then follows live events.
+        self._subscribers += 1
+        self._cancel_orphan_timer()
+        position = max(after_event_id, 0)
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: position < self._last_event_id or self._done
+                    )
+                    pending = self._pending_after(position)
+                    finished = self._done
+                for item in pending:
+                    position = item[0]
+                    yield item
+                if finished and position >= self._last_event_id:
+                    return
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self._done:
+                self._schedule_orphan_cancel()
+
+    def _pending_after(self, position: int) -> list[tuple[int, str, dict]]:
+        pending: list[tuple[int, str, dict]] = []
+        first_kept = self._events[0][0] if self._events else self._last_event_id + 1
+        if position < first_kept - 1:
+            # Only deltas can fall out of the window (terminal events are last),
+            # so the gap collapses into a single catch-up delta.
+            start = self._text_ends[position - 1] if position > 0 else 0
+            end = self._text_ends[first_kept - 2]
+            pending.append((first_kept - 1, "delta", {"text": self.text[start:end]}))
+            position = first_kept - 1
+        pending.extend(item for item in self._events if item[0] > position)
+        return pending
+
+    async def wait_result(self) -> tuple[str, dict] | None:
+        result = None
+        async for _event_id, event, data in self.subscribe():
+            if event in TERMINAL_EVENTS:
+                result = (event, data)
+        return result
+
+    def _schedule_orphan_cancel(self) -> None:
+        # Give a retrying client a moment to re-attach before the upstream
+        # call is abandoned.
+        loop = asyncio.get_running_loop()
+        self._orphan_timer = loop.call_later(self._detach_grace_seconds, self._cancel_if_orphaned)
+
+    def _cancel_orphan_timer(self) -> None:
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+            self._orphan_timer = None
+
+    def _cancel_if_orphaned(self) -> None:
+        self._orphan_timer = None
+        if self._subscribers == 0 and not self._done and self._task is not None:
+            logger.info("inflight stream orphaned message_id=%s; cancelling", self.message_id)
+            self._task.cancel()
+
+
+class InflightRegistry:
+    def __init__(self, detach_grace_seconds: float, replay_events: int = 1000) -> None:
+        self._detach_grace_seconds = detach_grace_seconds
+        self._replay_events = replay_events
+        self._streams: dict[int, InflightStream] = {}
+        self._cancelled = 0
+        self._cancelled_tokens_streamed = 0
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def clear(self) -> None:
+        self._streams.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._streams),
+            "subscribers": sum(stream.subscribers for stream in self._streams.values()),
+            "cancelled": self._cancelled,
+            "cancelled_tokens_streamed": self._cancelled_tokens_streamed,
+        }
+
+    def get(self, message_id: int) -> InflightStream | None:
+        stream = self._streams.get(message_id)
+        if stream is not None and stream.done:
+            return None
+        return stream
+
+    def open(
+        self,
+        message_id: int,
+        producer: Callable[[InflightStream], Awaitable[None]],
+    ) -> InflightStream:
+        stream = InflightStream(message_id, self._detach_grace_seconds, self._replay_events)
+        self._streams[message_id] = stream
+
+        async def _run(current: InflightStream) -> None:
+            try:
+                await producer(current)
+            except asyncio.CancelledError:
+                self._cancelled += 1
+                self._cancelled_tokens_streamed += estimate_tokens(current.text)
+                raise
+            finally:
+                await current.close()
+                if self._streams.get(message_id) is current:
+                    del self._streams[message_id]
+
+        stream.start(_run)
+        return stream
+
+
+_registry: InflightRegistry | None = None
+
+
+def get_inflight_registry(settings: Settings) -> InflightRegistry:
+    global _registry
+    if _registry is None:
+        _registry = InflightRegistry(
+            settings.chat_inflight_detach_grace_seconds,
+            settings.chat_stream_replay_events,
+        )
+    return _registry
@@ -1,21 +1,50 @@
+import asyncio
+import contextlib
 import json
 import logging
+import math
 import uuid
+from collections.abc import AsyncIterator
+from typing import Literal
 
 from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
 from fastapi.responses import StreamingResponse
 
 from pydantic import BaseModel, EmailStr
 from sqlalchemy import text
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 from product_api.auth import build_expiry, generate_raw_token, hmac_sha256, utcnow
 from product_api.bootstrap import ensure_superadmin
+from product_api.claims.datanewton_client import close_datanewton_client, get_datanewton_client
+from product_api.context_cache import (
+    NOTIFY_CHANNEL as CONTEXT_NOTIFY_CHANNEL,
+    get_context_cache,
+    get_context_listener,
+    start_context_listener,
+    stop_context_listener,
+)
+from product_api.db.engine import engine
 from product_api.db.session import get_session
 from product_api.emailer import send_magic_link
-from product_api.gateway_client import GatewayError, send_chat, stream_chat
+from product_api.gateway_client import (
+    GatewayError,
+    close_gateway_pool,
+    fetch_final_text,
+    get_gateway_pool,
+    send_chat,
+    start_gateway_probes,
+    stop_gateway_probes,
+    stream_chat,
+)
+from product_api.gateway_router import get_gateway_router
+from product_api.inflight import (
+    TERMINAL_EVENTS as INFLIGHT_TERMINAL_EVENTS,
+    InflightStream,
+    get_inflight_registry,
+)
 from product_api.logging_config import configure_logging
 from product_api.models import AuthToken, Conversation, Invite, Message, User
 from product_api.request_id import REQUEST_ID_HEADER, set_request_id
@@ -31,11 +60,10 @@ from product_api.rbac import (
 )
 from product_api.repositories import (
     add_ledger_entry,
+    admit_chat_message,
     apply_user_limit_delta,
-    ChatCreditsCompanyInsufficientError,
-    ChatCreditsUserInsufficientError,
+    claim_assistant_generation,
     create_company,
-    create_conversation,
     create_invite,
     detach_company_user,
     DetachUserForbiddenError,
@@ -48,14 +76,16 @@ from product_api.repositories import (
     get_user_by_email,
     get_whoami_header_profile,
     list_company_users_with_stats,
-    reserve_chat_credits,
+    reconcile_company_pool_balances,
+    renew_assistant_generation,
     UserLimitExceedsPoolError,
     UserLimitNegativeError,
     UserLimitUserNotFoundError,
     write_audit_log,
 )
-from product_api.rate_limit import RateLimitConfig, RateLimiter
+from product_api.rate_limit import RateLimitConfig, RateLimitDecision, build_rate_limiter
 from product_api.settings import get_settings
+from product_api.tokens import ContextMessage, context_message, estimate_tokens, select_context
 from product_api.routers.auth import router as auth_router
 from product_api.routers.admin_claims_auth import router as admin_claims_auth_router
 from product_api.routers.admin_claims import router as admin_claims_router
@@ -63,21 +93,26 @@ from product_api.routers.invites import router as invites_router
 from product_api.routers.public_claims import router as public_claims_router
 from shared.constants import MODEL_GPT_5_2
 from shared.schemas import ChatMessage, ChatMetadata, ChatRequest
+from shared.sse import final_digest, format_sse, matches_final_digest
+from shared.streaming import coalesce_deltas, iterate_until_disconnect
 
 settings = get_settings()
 configure_logging(settings.log_level)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Product API")
-rate_limiter = RateLimiter(RateLimitConfig())
-chat_company_limiter = RateLimiter(
-    RateLimitConfig(max_requests=settings.rate_limit_company_rpm, window_seconds=60)
+rate_limiter = build_rate_limiter(RateLimitConfig(), settings.rate_limit_backend)
+chat_company_limiter = build_rate_limiter(
+    RateLimitConfig(max_requests=settings.rate_limit_company_rpm, window_seconds=60),
+    settings.rate_limit_backend,
 )
-chat_user_limiter = RateLimiter(
-    RateLimitConfig(max_requests=settings.rate_limit_user_rpm, window_seconds=60)
+chat_user_limiter = build_rate_limiter(
+    RateLimitConfig(max_requests=settings.rate_limit_user_rpm, window_seconds=60),
+    settings.rate_limit_backend,
 )
-chat_ip_limiter = RateLimiter(
-    RateLimitConfig(max_requests=settings.rate_limit_ip_rpm, window_seconds=60)
+chat_ip_limiter = build_rate_limiter(
+    RateLimitConfig(max_requests=settings.rate_limit_ip_rpm, window_seconds=60),
+    settings.rate_limit_backend,
 )
 app.include_router(auth_router)
 app.include_router(admin_claims_auth_router)
@@ -100,9 +135,20 @@ async def request_id_middleware(request: Request, call_next):
 
 @app.on_event("startup")
 async def startup_event():
+    get_gateway_pool(settings)
+    start_gateway_probes(settings)
+    await start_context_listener(settings, engine)
     await ensure_superadmin()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_gateway_probes()
+    await close_gateway_pool()
+    await close_datanewton_client()
+    await stop_context_listener()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -120,6 +166,50 @@ async def db_ping(
     return {"status": "ok"}
 
 
+@app.get("/internal/chat-context-cache")
+async def chat_context_cache_stats(
+    _current_user: User = Depends(require_superadmin()),
+):
+    return get_context_cache(settings).stats()
+
+
+@app.get("/internal/chat-inflight")
+async def chat_inflight_stats(
+    _current_user: User = Depends(require_superadmin()),
+):
+    return get_inflight_registry(settings).stats()
+
+
+@app.get("/internal/gateway-pool")
+async def gateway_pool_stats(
+    _current_user: User = Depends(require_superadmin()),
+):
+    return get_gateway_pool(settings).stats()
+
+
+@app.get("/internal/datanewton-client")
+async def datanewton_client_stats(
+    _current_user: User = Depends(require_superadmin()),
+):
+    return get_datanewton_client(settings).stats()
+
+
+@app.get("/internal/gateway-endpoints")
+async def gateway_endpoints_stats(
+    _current_user: User = Depends(require_superadmin()),
+):
+    return get_gateway_router(settings).stats()
+
+
+def _rate_limited_error(decision: RateLimitDecision) -> HTTPException:
+    retry_after = max(1, math.ceil(decision.retry_after_seconds))
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={"code": "rate_limited", "message": "rate limit"},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 class RequestLinkIn(BaseModel):
     email: EmailStr
 
@@ -132,11 +222,9 @@ async def request_link(
 ):
     ip = request.client.host if request.client else "unknown"
     key = f"{payload.email.lower()}:{ip}"
-    if not rate_limiter.allow(key):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail={"code": "rate_limited", "message": "rate limit"},
-        )
+    decision = await rate_limiter.acquire(key)
+    if not decision.allowed:
+        raise _rate_limited_error(decision)
 
     email = payload.email.lower()
     raw_token = generate_raw_token()
@@ -365,6 +453,29 @@ async def admin_add_credits(
     return {"status": "ok", "id": entry.id}
 
 
+@app.post("/admin/ledger/reconcile")
+async def admin_reconcile_balances(
+    request: Request,
+    repair: bool = False,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(require_superadmin()),
+):
+    mismatches = await reconcile_company_pool_balances(session, repair=repair)
+    if repair and mismatches:
+        await write_audit_log(
+            session=session,
+            actor_user_id=current_user.id,
+            company_id=None,
+            action="ledger.reconcile",
+            target_type="company_balances",
+            target_id=None,
+            payload_json=json.dumps({"mismatches": mismatches}),
+            ip=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent"),
+        )
+    return {"status": "ok", "repaired": repair, "mismatches": mismatches}
+
+
 @app.get("/admin/companies/{company_id}")
 async def admin_get_company(
     company_id: int,
@@ -378,11 +489,7 @@ async def admin_get_company(
         raise HTTPException(status_code=404, detail="company not found")
     company = {"id": row[0], "name": row[1]}
 
-    balance_result = await session.execute(
-        text("SELECT COALESCE(SUM(delta),0) FROM ledger WHERE company_id = :id"),
-        {"id": company_id},
-    )
-    balance = balance_result.scalar_one()
+    balance = await get_company_pool_balance(session, company_id)
 
     last_result = await session.execute(
         text(
@@ -577,6 +684,7 @@ class ChatIn(BaseModel):
     client_message_id: str
     content: str
     stream: bool = False
+    final_mode: Literal["full", "digest"] = "full"
 
 
 def _normalize_person_name(value: str | None, field_name: str) -> str | None:
@@ -660,22 +768,304 @@ async def _get_or_create_assistant_stub(
 
 async def _load_chat_context(
     session: AsyncSession, conversation_id: int, limit: int
-) -> list[ChatMessage]:
+) -> list[ContextMessage]:
     result = await session.execute(
         text(
-            "SELECT role, content FROM messages "
+            "SELECT role, content, token_count FROM messages "
             "WHERE conversation_id = :cid AND status = 'completed' "
             "ORDER BY created_at DESC LIMIT :limit"
         ),
         {"cid": conversation_id, "limit": limit},
     )
     rows = list(result.fetchall())
-    messages = [ChatMessage(role=row[0], content=row[1]) for row in reversed(rows)]
+    messages = [context_message(row[0], row[1], row[2]) for row in reversed(rows)]
     return messages
 
 
-def _format_sse(event: str, data: dict) -> str:
-    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+async def _finish_assistant_message(db_bind: AsyncEngine, message_id: int, **values) -> None:
+    async with AsyncSession(bind=db_bind, expire_on_commit=False) as write_session:
+        await write_session.execute(
+            update(Message).where(Message.id == message_id).values(**values)
+        )
+        await write_session.commit()
+
+
+async def _complete_assistant_message(
+    db_bind: AsyncEngine,
+    conversation_id: int,
+    user_message_id: int,
+    assistant_message_id: int,
+    content: str,
+    model: str,
+    usage_json: dict | None = None,
+) -> None:
+    context_cache = get_context_cache(settings)
+    context_listener = get_context_listener()
+    token_count = estimate_tokens(content)
+    try:
+        async with AsyncSession(bind=db_bind, expire_on_commit=False) as write_session:
+            await write_session.execute(
+                update(Message)
+                .where(Message.id == assistant_message_id)
+                .values(
+                    status="completed",
+                    content=content,
+                    model=model,
+                    usage_json=usage_json,
+                    token_count=token_count,
+                    inflight_until=None,
+                )
+            )
+            if context_listener is not None:
+                await write_session.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {
+                        "channel": CONTEXT_NOTIFY_CHANNEL,
+                        "payload": context_listener.notify_payload(conversation_id),
+                    },
+                )
+            await write_session.commit()
+    except Exception:
+        context_cache.invalidate(conversation_id)
+        raise
+    context_cache.append(
+        conversation_id,
+        ContextMessage(role="assistant", content=content, token_count=token_count),
+        assistant_message_id,
+        after_message_id=user_message_id,
+    )
+
+
+def _trim_context(messages: list[ContextMessage], limit: int) -> list[ContextMessage]:
+    return messages[-limit:] if limit > 0 else []
+
+
+def _last_event_id(request: Request) -> int:
+    raw = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    try:
+        return max(int(raw), 0) if raw else 0
+    except ValueError:
+        return 0
+
+
+def _gateway_error_event(exc: GatewayError) -> dict:
+    return {"code": "gateway_error", "message": str(exc), "retryable": True}
+
+
+async def _resolve_final_text(assembled: str, data: dict) -> str:
+    if "sha256" not in data:
+        return data.get("text") or assembled
+    if matches_final_digest(assembled, data):
+        return assembled
+    logger.warning(
+        "final digest mismatch stream_id=%s length=%s expected=%s",
+        data.get("stream_id"),
+        len(assembled),
+        data.get("length"),
+    )
+    try:
+        return (await fetch_final_text(settings, data["stream_id"])).text
+    except GatewayError as exc:
+        # The gateway keeps finals per worker, so the fetch can miss (404) even
+        # though the reply finished. Keep what the deltas carried instead of
+        # failing a completed reply.
+        logger.warning(
+            "final text fetch failed stream_id=%s err=%s; keeping assembled text",
+            data.get("stream_id"),
+            exc,
+        )
+        return assembled
+
+
+async def _renew_generation_lease(db_bind: AsyncEngine, message_id: int) -> None:
+    # Keeps the claim alive while this worker is still producing, so a long
+    # generation is not taken over by another worker once the lease lapses.
+    lease_seconds = settings.chat_inflight_lease_seconds
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            async with AsyncSession(bind=db_bind) as write_session:
+                renewed = await renew_assistant_generation(write_session, message_id, lease_seconds)
+                await write_session.commit()
+        except Exception:
+            logger.warning("generation lease renewal failed message_id=%s", message_id, exc_info=True)
+            continue
+        if not renewed:
+            return
+
+
+@contextlib.asynccontextmanager
+async def _hold_generation_lease(db_bind: AsyncEngine, message_id: int) -> AsyncIterator[None]:
+    renewal = asyncio.create_task(_renew_generation_lease(db_bind, message_id))
+    try:
+        yield
+    finally:
+        # The producer's own terminal write clears inflight_until; renewal only
+        # touches a lease that is still held, so it cannot bring it back.
+        renewal.cancel()
+        await asyncio.gather(renewal, return_exceptions=True)
+
+
+async def _generate_assistant_reply(
+    stream: InflightStream,
+    db_bind: AsyncEngine,
+    request_payload: ChatRequest,
+    conversation_id: int,
+    user_message_id: int,
+    assistant_message_id: int,
+) -> None:
+    try:
+        if not request_payload.stream:
+            gw_response = await send_chat(settings, request_payload)
+            await _complete_assistant_message(
+                db_bind,
+                conversation_id,
+                user_message_id,
+                assistant_message_id,
+                content=gw_response.text,
+                model=request_payload.model,
+                usage_json=gw_response.usage,
+            )
+            await stream.publish("final", {"text": gw_response.text, "usage": gw_response.usage})
+            return
+        events = coalesce_deltas(
+            stream_chat(settings, request_payload),
+            settings.chat_sse_coalesce_max_latency_ms / 1000,
+            settings.chat_sse_coalesce_max_bytes,
+        )
+        async for event, data in events:
+            if event == "delta":
+                await stream.publish("delta", {"text": data.get("text", "")})
+            elif event == "final":
+                final_text = await _resolve_final_text(stream.text, data)
+                usage = data.get("usage")
+                await _complete_assistant_message(
+                    db_bind,
+                    conversation_id,
+                    user_message_id,
+                    assistant_message_id,
+                    content=final_text,
+                    model=request_payload.model,
+                    usage_json=usage,
+                )
+                await stream.publish("final", {"text": final_text, "usage": usage})
+                return
+            elif event == "error":
+                await _finish_assistant_message(
+                    db_bind, assistant_message_id, status="error", inflight_until=None
+                )
+                await stream.publish("error", data)
+                return
+        if stream.text:
+            await _complete_assistant_message(
+                db_bind,
+                conversation_id,
+                user_message_id,
+                assistant_message_id,
+                content=stream.text,
+                model=request_payload.model,
+            )
+            await stream.publish("final", {"text": stream.text, "usage": None})
+        else:
+            await _finish_assistant_message(db_bind, assistant_message_id, inflight_until=None)
+    except GatewayError as exc:
+        await _finish_assistant_message(
+            db_bind, assistant_message_id, status="error", inflight_until=None
+        )
+        await stream.publish("error", _gateway_error_event(exc))
+    except asyncio.CancelledError:
+        # Every client left and none came back within the detach grace.
+        await _finish_assistant_message(
+            db_bind,
+            assistant_message_id,
+            status="error",
+            content=stream.text,
+            inflight_until=None,
+        )
+        raise
+    except Exception:
+        # Anything else (transport, database, malformed gateway payloads) must
+        # not leave the row pending under a live lease until it lapses.
+        logger.exception("assistant reply failed message_id=%s", assistant_message_id)
+        try:
+            await _finish_assistant_message(
+                db_bind, assistant_message_id, status="error", inflight_until=None
+            )
+        finally:
+            await stream.publish("error", _gateway_error_event(GatewayError("assistant reply failed")))
+
+
+async def _follow_remote_generation(
+    db_bind: AsyncEngine, assistant_message_id: int
+) -> AsyncIterator[tuple[int | None, str, dict]]:
+    while True:
+        async with AsyncSession(bind=db_bind) as read_session:
+            row = (
+                await read_session.execute(
+                    select(
+                        Message.status,
+                        Message.content,
+                        Message.usage_json,
+                        Message.inflight_until,
+                    ).where(Message.id == assistant_message_id)
+                )
+            ).one()
+        if row.status == "completed":
+            yield None, "final", {"text": row.content, "usage": row.usage_json}
+            return
+        if row.status == "error" or row.inflight_until is None or row.inflight_until < utcnow():
+            yield None, "error", {
+                "code": "generation_interrupted",
+                "message": "generation interrupted",
+                "retryable": True,
+            }
+            return
+        await asyncio.sleep(settings.chat_inflight_poll_interval_seconds)
+
+
+def _sse_response(
+    events: AsyncIterator[tuple[int | None, str, dict]],
+    request: Request,
+    digest_final: bool = False,
+) -> StreamingResponse:
+    async def event_stream():
+        # Leaving on disconnect drops this subscriber at once; the generation
+        # itself is cancelled once no subscriber is left past the detach grace.
+        async for event_id, event, data in iterate_until_disconnect(request.receive, events):
+            # Only events of a live stream are numbered; a final read back from
+            # the database was not preceded by deltas and keeps its text.
+            if digest_final and event == "final" and event_id is not None:
+                data = final_digest(data["text"], data.get("usage"))
+            yield format_sse(event, data, event_id)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+async def _inflight_response(
+    events: AsyncIterator[tuple[int | None, str, dict]],
+    request: Request,
+    payload: ChatIn,
+    conversation_id: int,
+    user_message_id: int,
+    assistant_message_id: int,
+):
+    if payload.stream:
+        return _sse_response(events, request, digest_final=payload.final_mode == "digest")
+
+    result = None
+    async with contextlib.aclosing(events) as items:
+        async for _event_id, event, _data in items:
+            if event in INFLIGHT_TERMINAL_EVENTS:
+                result = event
+    if result != "final":
+        raise HTTPException(status_code=502, detail="gateway error")
+    return {
+        "conversation_id": conversation_id,
+        "user_message_id": user_message_id,
+        "assistant_message_id": assistant_message_id,
+        "assistant_status": "completed",
+        "client_message_id": payload.client_message_id,
+    }
 
 
 def _insufficient_company_credits_detail() -> dict[str, str]:
@@ -924,74 +1314,103 @@ async def chat_v1(
         payload.stream,
     )
     ip = request.client.host if request.client else "unknown"
-    if not chat_company_limiter.allow(f"company:{company_id}"):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail={"code": "rate_limited", "message": "rate limit"},
-        )
-    if not chat_user_limiter.allow(f"user:{current_user.id}"):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail={"code": "rate_limited", "message": "rate limit"},
-        )
-    if not chat_ip_limiter.allow(f"ip:{ip}"):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail={"code": "rate_limited", "message": "rate limit"},
-        )
+    for limiter, key in (
+        (chat_company_limiter, f"company:{company_id}"),
+        (chat_user_limiter, f"user:{current_user.id}"),
+        (chat_ip_limiter, f"ip:{ip}"),
+    ):
+        decision = await limiter.acquire(key)
+        if not decision.allowed:
+            raise _rate_limited_error(decision)
     conversation_id = payload.conversation_id
-    content_checked = False
-    credits_checked = False
-
-    if conversation_id is not None:
-        result = await session.execute(
-            select(Conversation).where(
-                Conversation.id == conversation_id,
-                Conversation.company_id == company_id,
-                Conversation.user_id == current_user.id,
-            )
-        )
-        conversation = result.scalar_one_or_none()
-        if not conversation:
-            raise HTTPException(status_code=404, detail="conversation not found")
-    else:
-        if len(payload.content) > settings.max_message_chars:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail={"code": "content_too_long", "message": "content too long"},
-            )
-        content_checked = True
-        await _ensure_chat_credits_available(
-            session=session,
-            company_id=company_id,
-            user_id=current_user.id,
+    content_ok = len(payload.content) <= settings.max_message_chars
+    if conversation_id is None and not content_ok:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"code": "content_too_long", "message": "content too long"},
         )
-        credits_checked = True
 
-        conversation = await create_conversation(
+    context_cache = get_context_cache(settings)
+    context_listener = get_context_listener()
+    inflight_registry = get_inflight_registry(settings)
+    cached_context = (
+        context_cache.get(conversation_id, settings.chat_context_limit)
+        if conversation_id is not None
+        else None
+    )
+    try:
+        admission = await admit_chat_message(
             session=session,
             company_id=company_id,
             user_id=current_user.id,
+            conversation_id=conversation_id,
+            client_message_id=payload.client_message_id,
+            content=payload.content,
+            content_ok=content_ok,
+            model=MODEL_GPT_5_2,
+            context_limit=settings.chat_context_limit,
+            token_count=estimate_tokens(payload.content),
+            lease_seconds=settings.chat_inflight_lease_seconds,
+            include_context=cached_context is None,
+            notify_payload=(
+                context_listener.notify_payload(conversation_id)
+                if context_listener is not None and conversation_id is not None
+                else None
+            ),
         )
-        conversation_id = conversation.id
+        await session.commit()
+    except IntegrityError:
+        # A concurrent request with the same client_message_id won the insert.
+        await session.rollback()
+        admission = None
+
+    if admission is not None and admission.admitted:
+        conversation_id = admission.conversation_id
+        user_message_id = admission.user_message_id
+        assistant_message_id = admission.assistant_message_id
+        window = admission.context
+        if cached_context is not None:
+            window = _trim_context(cached_context + window, settings.chat_context_limit)
+        context_cache.store(conversation_id, settings.chat_context_limit, window, user_message_id)
+    else:
+        if admission is not None and conversation_id is not None and admission.conversation_id is None:
+            raise HTTPException(status_code=404, detail="conversation not found")
+        prior_message_id = admission.prior_message_id if admission is not None else None
+        if admission is None:
+            existing = await session.execute(
+                select(Message.id).where(
+                    Message.conversation_id == conversation_id,
+                    Message.client_message_id == payload.client_message_id,
+                )
+            )
+            prior_message_id = existing.scalar_one_or_none()
+            if prior_message_id is None:
+                raise HTTPException(status_code=409, detail="message conflict")
+        elif prior_message_id is None:
+            if not content_ok:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={"code": "content_too_long", "message": "content too long"},
+                )
+            await _ensure_chat_credits_available(
+                session=session,
+                company_id=company_id,
+                user_id=current_user.id,
+            )
+            raise HTTPException(
+                status_code=402,
+                detail=_insufficient_user_credits_detail(),
+            )
 
-    existing = await session.execute(
-        select(Message).where(
-            Message.conversation_id == conversation_id,
-            Message.client_message_id == payload.client_message_id,
-        )
-    )
-    user_message = existing.scalar_one_or_none()
-    if user_message:
         assistant_message = await _get_or_create_assistant_stub(
             session=session,
             conversation_id=conversation_id,
-            parent_message_id=user_message.id,
+            parent_message_id=prior_message_id,
         )
         if assistant_message.status == "completed":
             if payload.stream:
                 async def single_final():
-                    yield _format_sse(
+                    yield format_sse(
                         "final",
                         {
                             "text": assistant_message.content,
@@ -1001,164 +1420,120 @@ async def chat_v1(
                 return StreamingResponse(single_final(), media_type="text/event-stream")
             return {
                 "conversation_id": conversation_id,
-                "user_message_id": user_message.id,
+                "user_message_id": prior_message_id,
                 "assistant_message_id": assistant_message.id,
                 "assistant_status": assistant_message.status,
                 "client_message_id": payload.client_message_id,
             }
-    else:
-        if not content_checked and len(payload.content) > settings.max_message_chars:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail={"code": "content_too_long", "message": "content too long"},
-            )
-        if not credits_checked:
-            await _ensure_chat_credits_available(
-                session=session,
-                company_id=company_id,
-                user_id=current_user.id,
-            )
-
-        try:
-            user_message = Message(
-                conversation_id=conversation_id,
-                role="user",
-                status="completed",
-                model=None,
-                content=payload.content,
-                client_message_id=payload.client_message_id,
-            )
-            session.add(user_message)
-            await session.flush()
-
-            assistant_message = Message(
-                conversation_id=conversation_id,
-                parent_message_id=user_message.id,
-                role="assistant",
-                status="pending",
-                model=MODEL_GPT_5_2,
-                content="",
-            )
-            session.add(assistant_message)
-
-            await reserve_chat_credits(
-                session=session,
-                company_id=company_id,
-                user_id=current_user.id,
-                message_id=user_message.id,
-            )
-            await session.commit()
-        except ChatCreditsCompanyInsufficientError:
-            await session.rollback()
-            raise HTTPException(
-                status_code=402,
-                detail=_insufficient_company_credits_detail(),
+        user_message_id = prior_message_id
+        assistant_message_id = assistant_message.id
+        inflight = inflight_registry.get(assistant_message_id)
+        if inflight is not None:
+            await session.close()
+            return await _inflight_response(
+                inflight.subscribe(_last_event_id(request)),
+                request,
+                payload,
+                conversation_id,
+                user_message_id,
+                assistant_message_id,
             )
-        except ChatCreditsUserInsufficientError:
-            await session.rollback()
-            raise HTTPException(
-                status_code=402,
-                detail=_insufficient_user_credits_detail(),
-            )
-        except IntegrityError:
-            await session.rollback()
-            existing = await session.execute(
-                select(Message).where(
-                    Message.conversation_id == conversation_id,
-                    Message.client_message_id == payload.client_message_id,
-                )
+        claimed = await claim_assistant_generation(
+            session, assistant_message_id, settings.chat_inflight_lease_seconds
+        )
+        await session.commit()
+        if not claimed:
+            # Another worker owns the generation; follow it through the row.
+            db_bind = session.bind
+            await session.close()
+            return await _inflight_response(
+                _follow_remote_generation(db_bind, assistant_message_id),
+                request,
+                payload,
+                conversation_id,
+                user_message_id,
+                assistant_message_id,
             )
-            user_message = existing.scalar_one_or_none()
-            if not user_message:
-                raise HTTPException(status_code=409, detail="message conflict")
-            assistant_message = await _get_or_create_assistant_stub(
+        window = cached_context
+        if window is None:
+            window = await _load_chat_context(
                 session=session,
                 conversation_id=conversation_id,
-                parent_message_id=user_message.id,
+                limit=settings.chat_context_limit,
             )
+            context_cache.store(conversation_id, settings.chat_context_limit, window, None)
 
-    messages = await _load_chat_context(
-        session=session,
-        conversation_id=conversation_id,
-        limit=settings.chat_context_limit,
-    )
+    context = select_context(window, settings.chat_context_token_budget)
     request_payload = ChatRequest(
-        messages=messages,
+        messages=[ChatMessage(role=item.role, content=item.content) for item in context],
         model=MODEL_GPT_5_2,
         stream=payload.stream,
         timeout=settings.gateway_timeout_seconds,
+        final_mode="digest" if settings.gateway_digest_final else "full",
         metadata=ChatMetadata(
             company_id=company_id,
             user_id=current_user.id,
             conversation_id=conversation_id,
-            message_id=user_message.id,
+            message_id=user_message_id,
+            context_token_budget=settings.chat_context_token_budget,
+            context_tokens=sum(item.prompt_tokens for item in context),
         ),
     )
-    if payload.stream:
-        async def event_stream():
-            buffer_text = ""
-            try:
-                async for event, data in stream_chat(settings, request_payload):
-                    if await request.is_disconnected():
-                        assistant_message.status = "error"
-                        assistant_message.content = buffer_text
-                        await session.commit()
-                        return
-                    if event == "delta":
-                        delta_text = data.get("text", "")
-                        if delta_text:
-                            buffer_text += delta_text
-                        yield _format_sse("delta", {"text": delta_text})
-                    elif event == "final":
-                        final_text = data.get("text") or buffer_text
-                        usage = data.get("usage")
-                        assistant_message.status = "completed"
-                        assistant_message.content = final_text
-                        assistant_message.model = request_payload.model
-                        assistant_message.usage_json = usage
-                        await session.commit()
-                        yield _format_sse("final", {"text": final_text, "usage": usage})
-                        return
-                    elif event == "error":
-                        assistant_message.status = "error"
-                        await session.commit()
-                        yield _format_sse("error", data)
-                        return
-                if buffer_text:
-                    assistant_message.status = "completed"
-                    assistant_message.content = buffer_text
-                    assistant_message.model = request_payload.model
-                    await session.commit()
-                    yield _format_sse("final", {"text": buffer_text, "usage": None})
-            except GatewayError as exc:
-                assistant_message.status = "error"
-                await session.commit()
-                yield _format_sse(
-                    "error",
-                    {"code": "gateway_error", "message": str(exc), "retryable": True},
-                )
+    # Everything below only talks to the gateway; hand the pooled connection
+    # back now and write the outcome through a short-lived session.
+    db_bind = session.bind
+    await session.close()
+
+    async def produce(stream: InflightStream) -> None:
+        async with _hold_generation_lease(db_bind, assistant_message_id):
+            await _generate_assistant_reply(
+                stream,
+                db_bind,
+                request_payload,
+                conversation_id,
+                user_message_id,
+                assistant_message_id,
+            )
 
-        return StreamingResponse(event_stream(), media_type="text/event-stream")
+    inflight = inflight_registry.open(assistant_message_id, produce)
+    return await _inflight_response(
+        inflight.subscribe(),
+        request,
+        payload,
+        conversation_id,
+        user_message_id,
+        assistant_message_id,
+    )
 
-    try:
-        gw_response = await send_chat(settings, request_payload)
-        assistant_message.status = "completed"
-        assistant_message.content = gw_response.text
-        assistant_message.model = request_payload.model
-        assistant_message.usage_json = gw_response.usage
-        await session.commit()
-    except GatewayError:
-        assistant_message.status = "error"
-        await session.commit()
-        raise HTTPException(status_code=502, detail="gateway error")
 
-    return {
-        "conversation_id": conversation_id,
-        "user_message_id": user_message.id,
-        "assistant_message_id": assistant_message.id,
-        "assistant_status": assistant_message.status,
-        "client_message_id": payload.client_message_id,
-    }
+@app.get("/v1/chat/messages/{message_id}/stream")
+async def chat_v1_resume(
+    message_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    company_id = _require_company_id(current_user)
+    result = await session.execute(
+        select(Message.id)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(
+            Message.id == message_id,
+            Message.role == "assistant",
+            Conversation.company_id == company_id,
+            Conversation.user_id == current_user.id,
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="message not found")
+    db_bind = session.bind
+    await session.close()
+
+    inflight = get_inflight_registry(settings).get(message_id)
+    if inflight is not None:
+        return _sse_response(inflight.subscribe(_last_event_id(request)), request)
+    # Finished (or owned by another worker): serve the persisted outcome.
+    return _sse_response(_follow_remote_generation(db_bind, message_id), request)
 
 
 @app.post("/company/users/{user_id}/deactivate")
@@ -5,7 +5,9 @@ from sqlalchemy import (
     JSON,
     Boolean,
     DateTime,
+    Float,
     ForeignKey,
+    SmallInteger,
     String,
     Text,
     func,
@@ -145,6 +147,19 @@ class Ledger(Base):
     )
 
 
+class CompanyBalance(Base):
+    __tablename__ = "company_balances"
+
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id"), primary_key=True)
+    slot: Mapped[int] = mapped_column(SmallInteger, primary_key=True, server_default=text("0"))
+    balance: Mapped[int] = mapped_column(server_default=text("0"), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
@@ -181,6 +196,8 @@ class Message(Base):
     model: Mapped[str | None] = mapped_column(String(64))
     content: Mapped[str] = mapped_column(nullable=False)
     usage_json: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    token_count: Mapped[int | None] = mapped_column(nullable=True)
+    inflight_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -236,6 +253,21 @@ class UserCreditLimit(Base):
     )
 
 
+class RateLimitState(Base):
+    __tablename__ = "rate_limit_state"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    tat: Mapped[float] = mapped_column(Float(precision=53), nullable=False, index=True)
+
+
+class Counterparty(Base):
+    __tablename__ = "counterparties"
+
+    inn: Mapped[str] = mapped_column(String(16), primary_key=True)
+    payload_json: Mapped[dict] = mapped_column(JSON, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
 class Claim(Base):
     __tablename__ = "claims"
     __table_args__ = (
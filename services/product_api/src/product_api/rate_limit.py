@@ -1,29 +1,143 @@
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
 
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
 
 @dataclass
 class RateLimitConfig:
     max_requests: int = 5
     window_seconds: int = 60
 
+    @property
+    def emission_interval(self) -> float:
+        return self.window_seconds / self.max_requests
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitDecision:
+    allowed: bool
+    retry_after_seconds: float = 0.0
+
+
+def _gcra_decision(
+    config: RateLimitConfig,
+    tat: float | None,
+    now: float,
+) -> tuple[RateLimitDecision, float | None]:
+    # GCRA: a key is described by its theoretical arrival time (TAT). A request
+    # is admitted while TAT stays within one window of "now".
+    base = now if tat is None or tat < now else tat
+    next_tat = base + config.emission_interval
+    allow_at = next_tat - config.window_seconds
+    if allow_at > now:
+        return RateLimitDecision(allowed=False, retry_after_seconds=allow_at - now), None
+    return RateLimitDecision(allowed=True), next_tat
+
 
 class RateLimiter:
-    def __init__(self, config: RateLimitConfig) -> None:
+    def __init__(self, config: RateLimitConfig, max_keys: int = 100_000) -> None:
         self._config = config
-        self._hits: dict[str, list[float]] = {}
+        self._max_keys = max_keys
+        self._tats: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def _evict(self, now: float) -> None:
+        # Keys are kept in last-touched order, so idle keys (TAT in the past and
+        # therefore indistinguishable from an unseen key) collect at the front.
+        while self._tats:
+            key, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self._max_keys:
+                break
+            del self._tats[key]
+
+    def check(self, key: str, now: float | None = None) -> RateLimitDecision:
+        now = time.time() if now is None else now
+        self._evict(now)
+        decision, next_tat = _gcra_decision(self._config, self._tats.get(key), now)
+        if next_tat is not None:
+            self._tats[key] = next_tat
+            self._tats.move_to_end(key)
+        return decision
+
+    async def acquire(self, key: str) -> RateLimitDecision:
+        return self.check(key)
 
     def allow(self, key: str) -> bool:
+        return self.check(key).allowed
+
+
+class PostgresRateLimiter:
+    def __init__(
+        self,
+        config: RateLimitConfig,
+        session_maker: async_sessionmaker[AsyncSession],
+        cleanup_interval_seconds: float | None = None,
+    ) -> None:
+        self._config = config
+        self._session_maker = session_maker
+        self._cleanup_interval_seconds = (
+            cleanup_interval_seconds
+            if cleanup_interval_seconds is not None
+            else float(config.window_seconds)
+        )
+        self._next_cleanup_at = 0.0
+
+    async def acquire(self, key: str) -> RateLimitDecision:
         now = time.time()
-        window_start = now - self._config.window_seconds
-        hits = self._hits.get(key, [])
-        hits = [t for t in hits if t >= window_start]
-        if len(hits) >= self._config.max_requests:
-            self._hits[key] = hits
-            return False
-        hits.append(now)
-        self._hits[key] = hits
-        return True
+        interval = self._config.emission_interval
+        async with self._session_maker() as session:
+            result = await session.execute(
+                text(
+                    "INSERT INTO rate_limit_state (key, tat) "
+                    "VALUES (:key, CAST(:first_tat AS DOUBLE PRECISION)) "
+                    "ON CONFLICT (key) DO UPDATE SET tat = "
+                    "GREATEST(rate_limit_state.tat, CAST(:now AS DOUBLE PRECISION)) "
+                    "+ CAST(:interval AS DOUBLE PRECISION) "
+                    "WHERE GREATEST(rate_limit_state.tat, CAST(:now AS DOUBLE PRECISION)) "
+                    "+ CAST(:interval AS DOUBLE PRECISION) <= CAST(:limit AS DOUBLE PRECISION) "
+                    "RETURNING tat"
+                ),
+                {
+                    "key": key,
+                    "now": now,
+                    "interval": interval,
+                    "first_tat": now + interval,
+                    "limit": now + self._config.window_seconds,
+                },
+            )
+            decision = RateLimitDecision(allowed=True)
+            if result.first() is None:
+                tat_result = await session.execute(
+                    text("SELECT tat FROM rate_limit_state WHERE key = :key"),
+                    {"key": key},
+                )
+                tat = tat_result.scalar_one_or_none() or now
+                retry_after = tat + interval - self._config.window_seconds - now
+                decision = RateLimitDecision(allowed=False, retry_after_seconds=max(retry_after, 0.0))
+            if now >= self._next_cleanup_at:
+                self._next_cleanup_at = now + self._cleanup_interval_seconds
+                await session.execute(
+                    text("DELETE FROM rate_limit_state WHERE tat < CAST(:now AS DOUBLE PRECISION)"),
+                    {"now": now},
+                )
+            await session.commit()
+        return decision
+
+
+def build_rate_limiter(
+    config: RateLimitConfig,
+    backend: str,
+) -> RateLimiter | PostgresRateLimiter:
+    if backend == "postgres":
+        from product_api.db.session import AsyncSessionMaker
+
+        return PostgresRateLimiter(config, AsyncSessionMaker)
+    return RateLimiter(config)
 
 
 class MultiRateLimiter:
@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import logging
+
+from product_api.db.session import AsyncSessionMaker
+from product_api.logging_config import configure_logging
+from product_api.repositories import reconcile_company_pool_balances
+from product_api.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+async def run_reconciliation(repair: bool = False) -> int:
+    async with AsyncSessionMaker() as session:
+        mismatches = await reconcile_company_pool_balances(session, repair=repair)
+    for item in mismatches:
+        logger.warning(
+            "company balance mismatch company_id=%s ledger=%s stored=%s repaired=%s",
+            item["company_id"],
+            item["ledger_balance"],
+            item["stored_balance"],
+            repair,
+        )
+    logger.info("company balance reconciliation done mismatches=%s", len(mismatches))
+    return len(mismatches)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare company_balances with SUM(ledger.delta) per company."
+    )
+    parser.add_argument("--repair", action="store_true", help="overwrite drifted balances")
+    args = parser.parse_args()
+
+    configure_logging(get_settings().log_level)
+    mismatches = asyncio.run(run_reconciliation(repair=args.repair))
+    raise SystemExit(1 if mismatches and not args.repair else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
-from sqlalchemy import func, select, text
+from dataclasses import dataclass
+
+from sqlalchemy import JSON, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from product_api.auth import utcnow
+from product_api.tokens import ContextMessage, context_message
 from product_api.models import (
     Company,
+    CompanyBalance,
     Conversation,
     Invite,
     Ledger,
@@ -14,6 +18,10 @@ from product_api.models import (
 )
 
 
+# Must match the modulus used by the ledger_apply_company_balance trigger.
+COMPANY_BALANCE_SLOTS = 16
+
+
 class UserLimitUpdateError(Exception):
     pass
 
@@ -176,73 +184,395 @@ async def add_ledger_entry(
     return entry
 
 
+_RESERVE_CHAT_CREDITS_SQL = text(
+    """
+    WITH debit AS (
+        UPDATE user_credit_limits AS l
+        SET remaining_credits = l.remaining_credits - :units
+        FROM users AS u
+        WHERE l.user_id = :user_id
+          AND l.company_id = :company_id
+          AND u.id = l.user_id
+          AND u.company_id = l.company_id
+          AND l.remaining_credits >= :units
+          AND (
+              SELECT COALESCE(SUM(b.balance), 0)
+              FROM company_balances AS b
+              WHERE b.company_id = :company_id
+          ) >= :units
+        RETURNING l.user_id
+    )
+    INSERT INTO ledger (company_id, user_id, message_id, delta, reason, idempotency_key)
+    SELECT
+        CAST(:company_id AS INTEGER),
+        debit.user_id,
+        CAST(:message_id AS INTEGER),
+        -CAST(:units AS INTEGER),
+        'chat_message',
+        CAST(:idempotency_key AS VARCHAR)
+    FROM debit
+    RETURNING id
+    """
+)
+
+
 async def reserve_chat_credits(
     session: AsyncSession,
     company_id: int,
     user_id: int,
     message_id: int,
     units: int = 1,
-) -> Ledger:
+) -> int:
     if units <= 0:
         raise ValueError("units must be positive")
 
-    company_result = await session.execute(
-        select(Company).where(Company.id == company_id).with_for_update()
+    # One statement debits the user limit and writes the ledger row (the
+    # ledger trigger moves company_balances). The conditional UPDATE replaces
+    # the former FOR UPDATE locks on companies/users/user_credit_limits. Since
+    # active limits never exceed the pool, a successful user debit cannot
+    # overdraw it; the pool predicate only guards an already-underfunded pool.
+    result = await session.execute(
+        _RESERVE_CHAT_CREDITS_SQL,
+        {
+            "company_id": company_id,
+            "user_id": user_id,
+            "message_id": message_id,
+            "units": units,
+            "idempotency_key": f"msg:{message_id}",
+        },
     )
-    company = company_result.scalar_one_or_none()
-    if not company:
+    entry_id = result.scalar_one_or_none()
+    if entry_id is not None:
+        return int(entry_id)
+    await _raise_chat_credits_error(session, company_id, user_id, units)
+    # State changed between the debit and the diagnosis (e.g. a concurrent
+    # debit drained the limit and a top-up restored it); report it as the
+    # user-level shortage the debit actually observed.
+    raise ChatCreditsUserInsufficientError("insufficient user credits")
+
+
+async def _raise_chat_credits_error(
+    session: AsyncSession,
+    company_id: int,
+    user_id: int,
+    units: int,
+) -> None:
+    company_result = await session.execute(select(Company.id).where(Company.id == company_id))
+    if company_result.scalar_one_or_none() is None:
         raise ChatCreditsCompanyInsufficientError("company not found")
 
     user_result = await session.execute(
-        select(User)
-        .where(User.id == user_id, User.company_id == company_id)
-        .with_for_update()
+        select(User.id).where(User.id == user_id, User.company_id == company_id)
     )
-    user = user_result.scalar_one_or_none()
-    if not user:
+    if user_result.scalar_one_or_none() is None:
         raise ChatCreditsUserInsufficientError("user not in company")
 
     limit_result = await session.execute(
-        select(UserCreditLimit)
-        .where(
+        select(UserCreditLimit.remaining_credits).where(
             UserCreditLimit.user_id == user_id,
             UserCreditLimit.company_id == company_id,
         )
-        .with_for_update()
     )
-    limit = limit_result.scalar_one_or_none()
-    if not limit:
+    remaining = limit_result.scalar_one_or_none()
+    if remaining is None:
         raise ChatCreditsUserInsufficientError("user limit not found")
-
-    user_remaining = int(limit.remaining_credits or 0)
-    if user_remaining < units:
+    if int(remaining or 0) < units:
         raise ChatCreditsUserInsufficientError("insufficient user credits")
 
-    pool_balance = await get_company_pool_balance(session, company_id)
-    if pool_balance < units:
+    if await get_company_pool_balance(session, company_id) < units:
         raise ChatCreditsCompanyInsufficientError("insufficient company credits")
 
-    limit.remaining_credits = user_remaining - units
-    entry = Ledger(
-        company_id=company_id,
-        user_id=user_id,
-        message_id=message_id,
-        delta=-units,
-        reason="chat_message",
-        idempotency_key=f"msg:{message_id}",
+
+_ADMIT_CHAT_MESSAGE_SQL = text(
+    """
+    WITH conv_existing AS (
+        SELECT c.id
+        FROM conversations AS c
+        WHERE c.id = CAST(:conversation_id AS INTEGER)
+          AND c.company_id = :company_id
+          AND c.user_id = :user_id
+    ),
+    prior AS (
+        SELECT m.id
+        FROM messages AS m
+        JOIN conv_existing ON conv_existing.id = m.conversation_id
+        WHERE m.client_message_id = :client_message_id
+        ORDER BY m.id
+        LIMIT 1
+    ),
+    debit AS (
+        UPDATE user_credit_limits AS l
+        SET remaining_credits = l.remaining_credits - :units
+        FROM users AS u
+        WHERE l.user_id = :user_id
+          AND l.company_id = :company_id
+          AND u.id = l.user_id
+          AND u.company_id = l.company_id
+          AND l.remaining_credits >= :units
+          AND (
+              SELECT COALESCE(SUM(b.balance), 0)
+              FROM company_balances AS b
+              WHERE b.company_id = :company_id
+          ) >= :units
+          AND CAST(:content_ok AS BOOLEAN)
+          AND (
+              CAST(:conversation_id AS INTEGER) IS NULL
+              OR EXISTS (SELECT 1 FROM conv_existing)
+          )
+          AND NOT EXISTS (SELECT 1 FROM prior)
+        RETURNING l.user_id
+    ),
+    conv_new AS (
+        INSERT INTO conversations (company_id, user_id)
+        SELECT CAST(:company_id AS INTEGER), debit.user_id
+        FROM debit
+        WHERE CAST(:conversation_id AS INTEGER) IS NULL
+        RETURNING id
+    ),
+    conv AS (
+        SELECT id FROM conv_new
+        UNION ALL
+        SELECT id FROM conv_existing
+    ),
+    user_msg AS (
+        INSERT INTO messages (
+            conversation_id, role, status, content, client_message_id, token_count
+        )
+        SELECT conv.id, 'user', 'completed', CAST(:content AS TEXT),
+               CAST(:client_message_id AS VARCHAR), CAST(:token_count AS INTEGER)
+        FROM debit CROSS JOIN conv
+        RETURNING id, conversation_id
+    ),
+    assistant_msg AS (
+        INSERT INTO messages (
+            conversation_id, parent_message_id, role, status, model, content, inflight_until
+        )
+        SELECT conversation_id, id, 'assistant', 'pending', CAST(:model AS VARCHAR), '',
+               now() + make_interval(secs => CAST(:lease_seconds AS INTEGER))
+        FROM user_msg
+        RETURNING id
+    ),
+    charge AS (
+        INSERT INTO ledger (company_id, user_id, message_id, delta, reason, idempotency_key)
+        SELECT CAST(:company_id AS INTEGER), CAST(:user_id AS INTEGER), user_msg.id,
+               -CAST(:units AS INTEGER), 'chat_message', 'msg:' || user_msg.id
+        FROM user_msg
+        RETURNING id
     )
-    session.add(entry)
-    await session.flush()
-    return entry
+    SELECT
+        (SELECT id FROM conv LIMIT 1) AS conversation_id,
+        (SELECT id FROM user_msg) AS user_message_id,
+        (SELECT id FROM assistant_msg) AS assistant_message_id,
+        (SELECT id FROM charge) AS ledger_id,
+        (SELECT id FROM prior) AS prior_message_id,
+        (
+            SELECT json_agg(
+                json_build_array(ctx.role, ctx.content, ctx.token_count)
+                ORDER BY ctx.created_at
+            )
+            FROM (
+                SELECT m.role, m.content, m.token_count, m.created_at
+                FROM messages AS m
+                JOIN conv_existing ON conv_existing.id = m.conversation_id
+                WHERE m.status = 'completed'
+                  AND CAST(:include_context AS BOOLEAN)
+                ORDER BY m.created_at DESC
+                LIMIT :context_limit
+            ) AS ctx
+        ) AS context,
+        (
+            SELECT pg_notify('chat_context', CAST(:notify_payload AS TEXT))
+            FROM user_msg
+            WHERE CAST(:notify_payload AS TEXT) IS NOT NULL
+        ) AS notified
+    """
+).columns(context=JSON)
+
+
+@dataclass(frozen=True, slots=True)
+class ChatAdmission:
+    conversation_id: int | None
+    user_message_id: int | None
+    assistant_message_id: int | None
+    prior_message_id: int | None
+    context: list[ContextMessage]
+
+    @property
+    def admitted(self) -> bool:
+        return self.user_message_id is not None
+
+
+async def admit_chat_message(
+    session: AsyncSession,
+    company_id: int,
+    user_id: int,
+    conversation_id: int | None,
+    client_message_id: str,
+    content: str,
+    content_ok: bool,
+    model: str,
+    context_limit: int,
+    token_count: int,
+    lease_seconds: int,
+    units: int = 1,
+    include_context: bool = True,
+    notify_payload: str | None = None,
+) -> ChatAdmission:
+    # Ownership check, idempotency lookup, credit debit, user/assistant message
+    # inserts, ledger charge and context fetch in one round trip. Nothing is
+    # written unless every precondition holds; the caller diagnoses a refusal.
+    # include_context=False skips the context scan when the caller has the
+    # window cached; notify_payload announces the new message to other workers.
+    result = await session.execute(
+        _ADMIT_CHAT_MESSAGE_SQL,
+        {
+            "company_id": company_id,
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "client_message_id": client_message_id,
+            "content": content,
+            "content_ok": content_ok,
+            "token_count": token_count,
+            "lease_seconds": lease_seconds,
+            "model": model,
+            "units": units,
+            "context_limit": context_limit,
+            "include_context": include_context,
+            "notify_payload": notify_payload,
+        },
+    )
+    row = result.one()
+    context = [context_message(role, body, tokens) for role, body, tokens in (row.context or [])]
+    if row.user_message_id is not None:
+        # The statement snapshot predates the new user message.
+        context.append(ContextMessage(role="user", content=content, token_count=token_count))
+        context = context[-context_limit:] if context_limit > 0 else []
+    return ChatAdmission(
+        conversation_id=row.conversation_id,
+        user_message_id=row.user_message_id,
+        assistant_message_id=row.assistant_message_id,
+        prior_message_id=row.prior_message_id,
+        context=context,
+    )
+
+
+async def claim_assistant_generation(
+    session: AsyncSession,
+    message_id: int,
+    lease_seconds: int,
+) -> bool:
+    # Whoever flips the lease owns the upstream call for this message; a
+    # lapsed lease means the previous owner died without finishing.
+    result = await session.execute(
+        text(
+            "UPDATE messages SET status = 'pending', "
+            "inflight_until = now() + make_interval(secs => CAST(:lease_seconds AS INTEGER)) "
+            "WHERE id = :id AND role = 'assistant' AND status <> 'completed' "
+            "AND (inflight_until IS NULL OR inflight_until < now()) "
+            "RETURNING id"
+        ),
+        {"id": message_id, "lease_seconds": lease_seconds},
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def renew_assistant_generation(
+    session: AsyncSession,
+    message_id: int,
+    lease_seconds: int,
+) -> bool:
+    # Only a lease that is still held is extended; a row that was finished or
+    # released (inflight_until cleared) stays that way.
+    result = await session.execute(
+        text(
+            "UPDATE messages SET "
+            "inflight_until = now() + make_interval(secs => CAST(:lease_seconds AS INTEGER)) "
+            "WHERE id = :id AND status = 'pending' AND inflight_until IS NOT NULL "
+            "RETURNING id"
+        ),
+        {"id": message_id, "lease_seconds": lease_seconds},
+    )
+    return result.scalar_one_or_none() is not None
 
 
 async def get_company_pool_balance(session: AsyncSession, company_id: int) -> int:
+    # company_balances is maintained by a trigger on ledger inserts, striped
+    # over at most COMPANY_BALANCE_SLOTS rows, so this does not scan the ledger.
     result = await session.execute(
-        select(func.coalesce(func.sum(Ledger.delta), 0)).where(Ledger.company_id == company_id)
+        select(func.coalesce(func.sum(CompanyBalance.balance), 0)).where(
+            CompanyBalance.company_id == company_id
+        )
     )
     return int(result.scalar_one() or 0)
 
 
+async def reconcile_company_pool_balances(
+    session: AsyncSession,
+    repair: bool = False,
+) -> list[dict[str, int]]:
+    ledger_totals = (
+        select(
+            Ledger.company_id.label("company_id"),
+            func.sum(Ledger.delta).label("ledger_balance"),
+        )
+        .group_by(Ledger.company_id)
+        .subquery()
+    )
+    stored_totals = (
+        select(
+            CompanyBalance.company_id.label("company_id"),
+            func.sum(CompanyBalance.balance).label("stored_balance"),
+        )
+        .group_by(CompanyBalance.company_id)
+        .subquery()
+    )
+    ledger_balance = func.coalesce(ledger_totals.c.ledger_balance, 0)
+    stored_balance = func.coalesce(stored_totals.c.stored_balance, 0)
+    result = await session.execute(
+        select(Company.id, ledger_balance, stored_balance)
+        .select_from(Company)
+        .outerjoin(ledger_totals, ledger_totals.c.company_id == Company.id)
+        .outerjoin(stored_totals, stored_totals.c.company_id == Company.id)
+        .where(ledger_balance != stored_balance)
+        .order_by(Company.id)
+    )
+    mismatches = [
+        {
+            "company_id": int(company_id),
+            "ledger_balance": int(ledger_total),
+            "stored_balance": int(stored_total),
+        }
+        for company_id, ledger_total, stored_total in result.all()
+    ]
+    if repair and mismatches:
+        for item in mismatches:
+            # Materialize and lock every slot first so concurrent ledger
+            # inserts wait instead of slipping between the SUM and the write.
+            await session.execute(
+                text(
+                    "INSERT INTO company_balances (company_id, slot, balance) "
+                    "SELECT :id, slot, 0 FROM generate_series(0, :slots - 1) AS slot "
+                    "ON CONFLICT (company_id, slot) DO NOTHING"
+                ),
+                {"id": item["company_id"], "slots": COMPANY_BALANCE_SLOTS},
+            )
+            await session.execute(
+                select(CompanyBalance.slot)
+                .where(CompanyBalance.company_id == item["company_id"])
+                .with_for_update()
+            )
+            await session.execute(
+                text(
+                    "UPDATE company_balances SET balance = CASE WHEN slot = 0 THEN "
+                    "(SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE company_id = :id) "
+                    "ELSE 0 END, updated_at = now() WHERE company_id = :id"
+                ),
+                {"id": item["company_id"]},
+            )
+        await session.commit()
+    return mismatches
+
+
 async def get_company_allocated_total(session: AsyncSession, company_id: int) -> int:
     result = await session.execute(
         select(func.coalesce(func.sum(UserCreditLimit.remaining_credits), 0)).where(
@@ -265,6 +595,30 @@ async def get_company_active_allocated_total(session: AsyncSession, company_id:
     return int(result.scalar_one() or 0)
 
 
+async def get_company_credit_totals(session: AsyncSession, company_id: int) -> tuple[int, int]:
+    # Pool balance and active allocated total from one statement, so both come
+    # from the same snapshot. Chat debits run without the company lock and move
+    # both by the same amount; reading them apart could pair the pool from
+    # before a debit with the allocation from after it.
+    pool_balance = (
+        select(func.coalesce(func.sum(CompanyBalance.balance), 0))
+        .where(CompanyBalance.company_id == company_id)
+        .scalar_subquery()
+    )
+    allocated_active = (
+        select(func.coalesce(func.sum(UserCreditLimit.remaining_credits), 0))
+        .select_from(UserCreditLimit)
+        .join(User, User.id == UserCreditLimit.user_id)
+        .where(
+            UserCreditLimit.company_id == company_id,
+            User.is_active.is_(True),
+        )
+        .scalar_subquery()
+    )
+    row = (await session.execute(select(pool_balance, allocated_active))).one()
+    return int(row[0] or 0), int(row[1] or 0)
+
+
 async def get_user_credit_limit(session: AsyncSession, user_id: int) -> UserCreditLimit | None:
     result = await session.execute(
         select(UserCreditLimit).where(UserCreditLimit.user_id == user_id)
@@ -396,8 +750,7 @@ async def apply_user_limit_delta(
         if next_remaining < 0:
             raise UserLimitNegativeError("limit cannot be negative")
 
-        pool_balance = await get_company_pool_balance(session, company_id)
-        allocated_active = await get_company_active_allocated_total(session, company_id)
+        pool_balance, allocated_active = await get_company_credit_totals(session, company_id)
         proposed_allocated_active = allocated_active + delta if user.is_active else allocated_active
         if proposed_allocated_active > pool_balance:
             raise UserLimitExceedsPoolError("allocation exceeds company pool balance")
@@ -12,7 +12,10 @@ from product_api.claims.notifications import (
     NotificationSendError,
     notify_admins_about_paid_claim,
 )
-from product_api.claims.preview_header_enrichment import rebuild_claim_preview_header
+from product_api.claims.preview_header_enrichment import (
+    preview_header_needs_rebuild,
+    rebuild_claim_preview_header,
+)
 from product_api.claims.rules import evaluate_claim_rules
 from product_api.claims.schemas import (
     ClaimContactIn,
@@ -214,7 +217,7 @@ async def update_public_claim(
         raise HTTPException(status_code=400, detail=str(exc))
 
     preview_header_rebuilt = False
-    if _must_rebuild_preview_header(changed_fields) or not isinstance(claim.preview_header_json, dict):
+    if _must_rebuild_preview_header(changed_fields) or preview_header_needs_rebuild(claim.preview_header_json):
         await rebuild_claim_preview_header(settings, claim)
         preview_header_rebuilt = True
 
@@ -268,7 +271,7 @@ async def generate_public_claim_preview(
     claim: Claim = Depends(require_claim_access),
     session: AsyncSession = Depends(get_session),
 ):
-    if not isinstance(claim.preview_header_json, dict):
+    if preview_header_needs_rebuild(claim.preview_header_json):
         await rebuild_claim_preview_header(settings, claim)
 
     decision = evaluate_claim_rules(
@@ -351,7 +354,7 @@ async def get_public_claim_preview(
     session: AsyncSession = Depends(get_session),
 ):
     preview_header_rebuilt = False
-    if not isinstance(claim.preview_header_json, dict):
+    if preview_header_needs_rebuild(claim.preview_header_json):
         await rebuild_claim_preview_header(settings, claim)
         preview_header_rebuilt = True
 
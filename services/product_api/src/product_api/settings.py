@@ -5,6 +5,8 @@ from typing import Annotated
 from pydantic import Field, field_validator, model_validator
 from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
 
+from shared.compression import SUPPORTED_ENCODINGS
+
 _PROMPT_VERSION_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,32}$")
 
 
@@ -15,6 +17,9 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     database_url: str = Field(..., validation_alias="DATABASE_URL")
     gateway_url: str = Field(..., validation_alias="GATEWAY_URL")
+    gateway_urls: Annotated[list[str], NoDecode] = Field(
+        default=[], validation_alias="GATEWAY_URLS"
+    )
     gateway_shared_secret: str = Field(..., validation_alias="GATEWAY_SHARED_SECRET")
     openai_api_key: str | None = Field(default=None, validation_alias="OPENAI_API_KEY")
     superadmin_email: str | None = Field(default=None, validation_alias="SUPERADMIN_EMAIL")
@@ -72,7 +77,42 @@ class Settings(BaseSettings):
     app_base_url: str = Field("http://localhost:8000", validation_alias="APP_BASE_URL")
     invite_ttl_seconds: int = Field(default=604800, validation_alias="INVITE_TTL_SECONDS")
     chat_context_limit: int = Field(default=20, validation_alias="CHAT_CONTEXT_LIMIT")
+    chat_context_token_budget: int = Field(
+        default=8000,
+        validation_alias="CHAT_CONTEXT_TOKEN_BUDGET",
+    )
     gateway_timeout_seconds: int = Field(default=30, validation_alias="GATEWAY_TIMEOUT_SECONDS")
+    gateway_http2: bool = Field(default=True, validation_alias="GATEWAY_HTTP2")
+    gateway_digest_final: bool = Field(default=True, validation_alias="GATEWAY_DIGEST_FINAL")
+    gateway_request_compression: str = Field(
+        default="none", validation_alias="GATEWAY_REQUEST_COMPRESSION"
+    )
+    gateway_compression_min_bytes: int = Field(
+        default=1024, validation_alias="GATEWAY_COMPRESSION_MIN_BYTES"
+    )
+    gateway_pool_max_connections: int = Field(
+        default=100,
+        validation_alias="GATEWAY_POOL_MAX_CONNECTIONS",
+    )
+    gateway_pool_max_keepalive_connections: int = Field(
+        default=20,
+        validation_alias="GATEWAY_POOL_MAX_KEEPALIVE_CONNECTIONS",
+    )
+    gateway_pool_keepalive_expiry_seconds: float = Field(
+        default=60.0,
+        validation_alias="GATEWAY_POOL_KEEPALIVE_EXPIRY_SECONDS",
+    )
+    gateway_ewma_alpha: float = Field(default=0.3, validation_alias="GATEWAY_EWMA_ALPHA")
+    gateway_eject_after_failures: int = Field(
+        default=3, validation_alias="GATEWAY_EJECT_AFTER_FAILURES"
+    )
+    gateway_eject_seconds: float = Field(default=30.0, validation_alias="GATEWAY_EJECT_SECONDS")
+    gateway_probe_interval_seconds: float = Field(
+        default=10.0, validation_alias="GATEWAY_PROBE_INTERVAL_SECONDS"
+    )
+    gateway_probe_timeout_seconds: float = Field(
+        default=2.0, validation_alias="GATEWAY_PROBE_TIMEOUT_SECONDS"
+    )
     claims_fio_ai_enabled: bool = Field(
         default=False,
         validation_alias="CLAIMS_FIO_AI_ENABLED",
@@ -97,6 +137,10 @@ class Settings(BaseSettings):
         default=300,
         validation_alias="CLAIMS_FIO_AI_NEGATIVE_CACHE_TTL_SECONDS",
     )
+    claims_preview_header_deadline_seconds: float = Field(
+        default=15.0,
+        validation_alias="CLAIMS_PREVIEW_HEADER_DEADLINE_SECONDS",
+    )
     datanewton_enabled: bool = Field(default=False, validation_alias="DATANEWTON_ENABLED")
     datanewton_base_url: str = Field(
         default="https://api.datanewton.ru",
@@ -116,10 +160,56 @@ class Settings(BaseSettings):
         default=300,
         validation_alias="DATANEWTON_CACHE_TTL_SECONDS",
     )
+    datanewton_cache_max_entries: int = Field(
+        default=10000,
+        validation_alias="DATANEWTON_CACHE_MAX_ENTRIES",
+    )
+    datanewton_pool_max_connections: int = Field(
+        default=20,
+        validation_alias="DATANEWTON_POOL_MAX_CONNECTIONS",
+    )
+    datanewton_path_revalidate_seconds: int = Field(
+        default=3600,
+        validation_alias="DATANEWTON_PATH_REVALIDATE_SECONDS",
+    )
+    datanewton_store_enabled: bool = Field(default=True, validation_alias="DATANEWTON_STORE_ENABLED")
+    datanewton_store_refresh_seconds: int = Field(
+        default=7 * 24 * 3600,
+        validation_alias="DATANEWTON_STORE_REFRESH_SECONDS",
+    )
+    datanewton_store_max_age_seconds: int = Field(
+        default=90 * 24 * 3600,
+        validation_alias="DATANEWTON_STORE_MAX_AGE_SECONDS",
+    )
     max_message_chars: int = Field(default=4000, validation_alias="MAX_MESSAGE_CHARS")
     rate_limit_company_rpm: int = Field(default=60, validation_alias="RATE_LIMIT_COMPANY_RPM")
     rate_limit_user_rpm: int = Field(default=30, validation_alias="RATE_LIMIT_USER_RPM")
     rate_limit_ip_rpm: int = Field(default=120, validation_alias="RATE_LIMIT_IP_RPM")
+    rate_limit_backend: str = Field(default="memory", validation_alias="RATE_LIMIT_BACKEND")
+    chat_inflight_lease_seconds: int = Field(
+        default=300,
+        validation_alias="CHAT_INFLIGHT_LEASE_SECONDS",
+    )
+    chat_inflight_detach_grace_seconds: float = Field(
+        default=15.0,
+        validation_alias="CHAT_INFLIGHT_DETACH_GRACE_SECONDS",
+    )
+    chat_inflight_poll_interval_seconds: float = Field(
+        default=0.5,
+        validation_alias="CHAT_INFLIGHT_POLL_INTERVAL_SECONDS",
+    )
+    chat_stream_replay_events: int = Field(default=1000, validation_alias="CHAT_STREAM_REPLAY_EVENTS")
+    chat_sse_coalesce_max_latency_ms: int = Field(
+        default=30, validation_alias="CHAT_SSE_COALESCE_MAX_LATENCY_MS"
+    )
+    chat_sse_coalesce_max_bytes: int = Field(default=4096, validation_alias="CHAT_SSE_COALESCE_MAX_BYTES")
+    # Unset means 1000 with CHAT_CONTEXT_CACHE_NOTIFY and 0 (off) without it:
+    # a cache that is not invalidated across workers serves stale context.
+    chat_context_cache_size: int | None = Field(default=None, validation_alias="CHAT_CONTEXT_CACHE_SIZE")
+    chat_context_cache_notify: bool = Field(
+        default=False,
+        validation_alias="CHAT_CONTEXT_CACHE_NOTIFY",
+    )
 
     @model_validator(mode="after")
     def _no_openai_key_in_product_api(self) -> "Settings":
@@ -127,6 +217,12 @@ class Settings(BaseSettings):
             raise ValueError("OPENAI_API_KEY must not be set in product_api")
         return self
 
+    @model_validator(mode="after")
+    def _default_chat_context_cache_size(self) -> "Settings":
+        if self.chat_context_cache_size is None:
+            self.chat_context_cache_size = 1000 if self.chat_context_cache_notify else 0
+        return self
+
     @field_validator("superadmin_email")
     @classmethod
     def _email_like(cls, value: str | None) -> str | None:
@@ -142,6 +238,162 @@ class Settings(BaseSettings):
             raise ValueError("COOKIE_SAMESITE must be one of: lax, strict, none")
         return value
 
+    @field_validator("gateway_pool_max_connections")
+    @classmethod
+    def _validate_gateway_pool_max_connections(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("GATEWAY_POOL_MAX_CONNECTIONS must be > 0")
+        return value
+
+    @field_validator("gateway_pool_max_keepalive_connections")
+    @classmethod
+    def _validate_gateway_pool_max_keepalive_connections(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("GATEWAY_POOL_MAX_KEEPALIVE_CONNECTIONS must be >= 0")
+        return value
+
+    @field_validator("gateway_pool_keepalive_expiry_seconds")
+    @classmethod
+    def _validate_gateway_pool_keepalive_expiry_seconds(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("GATEWAY_POOL_KEEPALIVE_EXPIRY_SECONDS must be > 0")
+        return value
+
+    @field_validator("gateway_urls", mode="before")
+    @classmethod
+    def _parse_gateway_urls(cls, value: str | list[str]) -> list[str]:
+        if isinstance(value, str):
+            parts = [item.strip() for item in value.split(",")]
+            return [item for item in parts if item]
+        return value
+
+    @field_validator("gateway_urls")
+    @classmethod
+    def _validate_gateway_urls(cls, value: list[str]) -> list[str]:
+        normalized: list[str] = []
+        for item in value:
+            candidate = item.strip().rstrip("/")
+            if not candidate.startswith(("http://", "https://")):
+                raise ValueError("GATEWAY_URLS must contain http(s) URLs")
+            if candidate not in normalized:
+                normalized.append(candidate)
+        return normalized
+
+    @field_validator("gateway_ewma_alpha")
+    @classmethod
+    def _validate_gateway_ewma_alpha(cls, value: float) -> float:
+        if not 0 < value <= 1:
+            raise ValueError("GATEWAY_EWMA_ALPHA must be in (0, 1]")
+        return value
+
+    @field_validator("gateway_eject_after_failures")
+    @classmethod
+    def _validate_gateway_eject_after_failures(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("GATEWAY_EJECT_AFTER_FAILURES must be > 0")
+        return value
+
+    @field_validator("gateway_eject_seconds")
+    @classmethod
+    def _validate_gateway_eject_seconds(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("GATEWAY_EJECT_SECONDS must be >= 0")
+        return value
+
+    @field_validator("gateway_probe_interval_seconds")
+    @classmethod
+    def _validate_gateway_probe_interval_seconds(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("GATEWAY_PROBE_INTERVAL_SECONDS must be >= 0")
+        return value
+
+    @field_validator("gateway_probe_timeout_seconds")
+    @classmethod
+    def _validate_gateway_probe_timeout_seconds(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("GATEWAY_PROBE_TIMEOUT_SECONDS must be > 0")
+        return value
+
+    @field_validator("gateway_request_compression")
+    @classmethod
+    def _validate_gateway_request_compression(cls, value: str) -> str:
+        normalized = value.strip().lower()
+        allowed = ("none", *SUPPORTED_ENCODINGS)
+        if normalized not in allowed:
+            raise ValueError(f"GATEWAY_REQUEST_COMPRESSION must be one of: {', '.join(allowed)}")
+        return normalized
+
+    @field_validator("gateway_compression_min_bytes")
+    @classmethod
+    def _validate_gateway_compression_min_bytes(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("GATEWAY_COMPRESSION_MIN_BYTES must be >= 0")
+        return value
+
+    @field_validator("rate_limit_backend")
+    @classmethod
+    def _validate_rate_limit_backend(cls, value: str) -> str:
+        normalized = value.strip().lower()
+        if normalized not in {"memory", "postgres"}:
+            raise ValueError("RATE_LIMIT_BACKEND must be one of: memory, postgres")
+        return normalized
+
+    @field_validator("chat_context_token_budget")
+    @classmethod
+    def _validate_chat_context_token_budget(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("CHAT_CONTEXT_TOKEN_BUDGET must be > 0")
+        return value
+
+    @field_validator("chat_inflight_lease_seconds")
+    @classmethod
+    def _validate_chat_inflight_lease_seconds(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("CHAT_INFLIGHT_LEASE_SECONDS must be > 0")
+        return value
+
+    @field_validator("chat_inflight_detach_grace_seconds")
+    @classmethod
+    def _validate_chat_inflight_detach_grace_seconds(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("CHAT_INFLIGHT_DETACH_GRACE_SECONDS must be >= 0")
+        return value
+
+    @field_validator("chat_inflight_poll_interval_seconds")
+    @classmethod
+    def _validate_chat_inflight_poll_interval_seconds(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("CHAT_INFLIGHT_POLL_INTERVAL_SECONDS must be > 0")
+        return value
+
+    @field_validator("chat_stream_replay_events")
+    @classmethod
+    def _validate_chat_stream_replay_events(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("CHAT_STREAM_REPLAY_EVENTS must be > 0")
+        return value
+
+    @field_validator("chat_sse_coalesce_max_latency_ms")
+    @classmethod
+    def _validate_chat_sse_coalesce_max_latency_ms(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("CHAT_SSE_COALESCE_MAX_LATENCY_MS must be >= 0")
+        return value
+
+    @field_validator("chat_sse_coalesce_max_bytes")
+    @classmethod
+    def _validate_chat_sse_coalesce_max_bytes(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("CHAT_SSE_COALESCE_MAX_BYTES must be > 0")
+        return value
+
+    @field_validator("chat_context_cache_size")
+    @classmethod
+    def _validate_chat_context_cache_size(cls, value: int | None) -> int | None:
+        if value is not None and value < 0:
+            raise ValueError("CHAT_CONTEXT_CACHE_SIZE must be >= 0")
+        return value
+
     @field_validator("claims_fio_ai_model")
     @classmethod
     def _validate_claims_fio_ai_model(cls, value: str) -> str:
@@ -183,6 +435,13 @@ class Settings(BaseSettings):
             raise ValueError("CLAIMS_FIO_AI_NEGATIVE_CACHE_TTL_SECONDS must be >= 0")
         return value
 
+    @field_validator("claims_preview_header_deadline_seconds")
+    @classmethod
+    def _validate_claims_preview_header_deadline_seconds(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("CLAIMS_PREVIEW_HEADER_DEADLINE_SECONDS must be > 0")
+        return value
+
     @field_validator("claims_price_rub")
     @classmethod
     def _validate_claims_price(cls, value: int) -> int:
@@ -343,6 +602,41 @@ class Settings(BaseSettings):
             raise ValueError("DATANEWTON_CACHE_TTL_SECONDS must be >= 0")
         return value
 
+    @field_validator("datanewton_cache_max_entries")
+    @classmethod
+    def _validate_datanewton_cache_max_entries(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("DATANEWTON_CACHE_MAX_ENTRIES must be > 0")
+        return value
+
+    @field_validator("datanewton_pool_max_connections")
+    @classmethod
+    def _validate_datanewton_pool_max_connections(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("DATANEWTON_POOL_MAX_CONNECTIONS must be > 0")
+        return value
+
+    @field_validator("datanewton_path_revalidate_seconds")
+    @classmethod
+    def _validate_datanewton_path_revalidate_seconds(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("DATANEWTON_PATH_REVALIDATE_SECONDS must be >= 0")
+        return value
+
+    @field_validator("datanewton_store_refresh_seconds")
+    @classmethod
+    def _validate_datanewton_store_refresh_seconds(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("DATANEWTON_STORE_REFRESH_SECONDS must be > 0")
+        return value
+
+    @field_validator("datanewton_store_max_age_seconds")
+    @classmethod
+    def _validate_datanewton_store_max_age_seconds(cls, value: int) -> int:
+        if value <= 0:
+            raise ValueError("DATANEWTON_STORE_MAX_AGE_SECONDS must be > 0")
+        return value
+
 
 @lru_cache
 def get_settings() -> Settings:
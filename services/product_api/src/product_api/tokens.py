@@ -0,0 +1,55 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Chat-format framing (role markers, separators) added per message.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    # BPE vocabularies cover common latin words with one token (~5 chars per
+    # token on long words) and cyrillic at ~3 chars per token; punctuation
+    # marks are usually tokens of their own.
+    total = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isascii():
+            total += (len(piece) + 4) // 5
+        else:
+            total += (len(piece) + 2) // 3
+    return total
+
+
+@dataclass(frozen=True, slots=True)
+class ContextMessage:
+    role: str
+    content: str
+    token_count: int
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.token_count + MESSAGE_OVERHEAD_TOKENS
+
+
+def context_message(role: str, content: str, token_count: int | None) -> ContextMessage:
+    return ContextMessage(
+        role=role,
+        content=content,
+        token_count=token_count if token_count is not None else estimate_tokens(content),
+    )
+
+
+def select_context(messages: list[ContextMessage], token_budget: int) -> list[ContextMessage]:
+    # Newest first until the budget is spent; the newest message is always
+    # kept so the current turn reaches the model even if it alone is too big.
+    selected: list[ContextMessage] = []
+    used = 0
+    for message in reversed(messages):
+        if selected and used + message.prompt_tokens > token_budget:
+            break
+        selected.append(message)
+        used += message.prompt_tokens
+    selected.reverse()
+    return selected
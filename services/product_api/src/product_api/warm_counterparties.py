@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import logging
+from collections.abc import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from product_api.claims.counterparty_store import CounterpartyStore
+from product_api.claims.datanewton_client import DataNewtonClient, DataNewtonError
+from product_api.claims.normalization import normalize_inn
+from product_api.db.session import AsyncSessionMaker
+from product_api.logging_config import configure_logging
+from product_api.settings import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+async def load_claim_inns(session: AsyncSession) -> list[str]:
+    result = await session.execute(
+        text(
+            "SELECT normalized_data_json->>'creditor_inn' FROM claims "
+            "UNION SELECT normalized_data_json->>'debtor_inn' FROM claims"
+        )
+    )
+    return [value for value in result.scalars() if value]
+
+
+def _normalize_inns(values: Iterable[str]) -> list[str]:
+    inns: list[str] = []
+    for value in values:
+        inn = normalize_inn(value, field_name="inn", strict=False)
+        if inn and inn not in inns:
+            inns.append(inn)
+    return inns
+
+
+async def warm_counterparties(
+    settings: Settings,
+    session_maker: async_sessionmaker[AsyncSession],
+    inns: Iterable[str] | None = None,
+    concurrency: int = 4,
+    force: bool = False,
+) -> dict[str, int]:
+    # Fetches every INN that is missing from the store or due for refresh.
+    # Without explicit INNs, every creditor and debtor INN seen in claims is used.
+    if inns is None:
+        async with session_maker() as session:
+            inns = await load_claim_inns(session)
+    candidates = _normalize_inns(inns)
+    store = CounterpartyStore(session_maker)
+    stored = {} if force else await store.get_many(candidates)
+    pending = [
+        inn
+        for inn in candidates
+        if inn not in stored or stored[inn].age_seconds() >= settings.datanewton_store_refresh_seconds
+    ]
+    counts = {
+        "candidates": len(candidates),
+        "fresh": len(candidates) - len(pending),
+        "found": 0,
+        "not_found": 0,
+        "failed": 0,
+    }
+
+    client = DataNewtonClient(settings, store=store)
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def warm_one(inn: str) -> None:
+        async with semaphore:
+            try:
+                party = await client.refresh_party(inn)
+            except DataNewtonError:
+                counts["failed"] += 1
+                return
+        counts["found" if party is not None else "not_found"] += 1
+
+    try:
+        await asyncio.gather(*(warm_one(inn) for inn in pending))
+    finally:
+        await client.aclose()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Fill the counterparties table from DataNewton ahead of claim previews."
+    )
+    parser.add_argument("inns", nargs="*", help="INNs to warm (default: every INN found in claims)")
+    parser.add_argument("--file", help="read INNs from a file, one per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel DataNewton requests")
+    parser.add_argument("--force", action="store_true", help="refetch rows that are still fresh")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    configure_logging(settings.log_level)
+    if not settings.datanewton_enabled or not settings.datanewton_api_key:
+        parser.error("DATANEWTON_ENABLED and DATANEWTON_API_KEY must be set")
+
+    inns: list[str] | None = list(args.inns) or None
+    if args.file:
+        with open(args.file, encoding="utf-8") as handle:
+            inns = (inns or []) + [line.strip() for line in handle if line.strip()]
+
+    counts = asyncio.run(
+        warm_counterparties(settings, AsyncSessionMaker, inns, concurrency=args.concurrency, force=args.force)
+    )
+    logger.info("counterparty warm-up done %s", " ".join(f"{key}={value}" for key, value in counts.items()))
+    raise SystemExit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
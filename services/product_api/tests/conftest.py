@@ -31,6 +31,8 @@ os.environ.setdefault("DATANEWTON_TIMEOUT_SECONDS", "10")
 os.environ.setdefault("DATANEWTON_RETRY_COUNT", "1")
 os.environ.setdefault("DATANEWTON_COUNTERPARTY_FILTERS", "MANAGER_BLOCK,ADDRESS_BLOCK")
 os.environ.setdefault("DATANEWTON_CACHE_TTL_SECONDS", "300")
+os.environ.setdefault("DATANEWTON_STORE_ENABLED", "false")
+os.environ.setdefault("CHAT_CONTEXT_CACHE_SIZE", "1000")
 os.environ.setdefault(
     "CLAIMS_UPLOAD_DIR", str((ROOT / ".tmp" / "product_api_claims").as_posix())
 )
@@ -51,10 +53,16 @@ from product_api import settings as settings_module
 
 settings_module.get_settings.cache_clear()
 
+from product_api.context_cache import get_context_cache
+from product_api.gateway_router import reset_gateway_router
+from product_api.inflight import get_inflight_registry
 from product_api.db.session import get_session
 from product_api.main import app
 
 TABLES = [
+    "counterparties",
+    "rate_limit_state",
+    "company_balances",
     "claim_events",
     "claim_files",
     "claims",
@@ -120,6 +128,10 @@ async def _clean_db(engine):
         await conn.execute(
             text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
         )
+    # Conversation ids restart with the tables; drop windows cached for old ones.
+    get_context_cache(settings_module.get_settings()).clear()
+    get_inflight_registry(settings_module.get_settings()).clear()
+    reset_gateway_router()
     yield
     async with engine.begin() as conn:
         await conn.execute(
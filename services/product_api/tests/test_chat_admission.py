@@ -0,0 +1,149 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.schemas import ChatResponse
+
+import product_api.main as product_main
+from product_api.models import Conversation, Ledger, Message, UserCreditLimit
+from product_api.repositories import admit_chat_message
+from product_api.settings import get_settings
+
+from .utils import (
+    add_credits,
+    add_message,
+    create_company,
+    create_conversation,
+    create_session_cookie,
+    create_user,
+    utc_at,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _seed_member(session: AsyncSession, email: str, pool: int, limit: int):
+    company = await create_company(session, f"Admission {email}")
+    user = await create_user(session, email, "member", company.id)
+    await add_credits(session, company.id, pool)
+    session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=limit))
+    await session.commit()
+    return company, user
+
+
+async def test_admission_inserts_messages_and_returns_context(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company, user = await _seed_member(session, "ctx@admission.test", pool=5, limit=5)
+        convo = await create_conversation(session, company.id, user.id)
+        await add_message(session, convo.id, "user", "first", created_at=utc_at(-30))
+        await add_message(session, convo.id, "assistant", "answer", created_at=utc_at(-20))
+        await add_message(session, convo.id, "assistant", "", status="error", created_at=utc_at(-10))
+
+        admission = await admit_chat_message(
+            session,
+            company_id=company.id,
+            user_id=user.id,
+            conversation_id=convo.id,
+            client_message_id="ctx-1",
+            content="second",
+            content_ok=True,
+            model="gpt-5.2",
+            context_limit=2,
+            token_count=1,
+            lease_seconds=300,
+        )
+        await session.commit()
+
+        assert admission.admitted is True
+        assert admission.conversation_id == convo.id
+        assert [(item.role, item.content) for item in admission.context] == [
+            ("assistant", "answer"),
+            ("user", "second"),
+        ]
+
+        assistant = await session.get(Message, admission.assistant_message_id)
+        assert assistant.parent_message_id == admission.user_message_id
+        assert assistant.status == "pending"
+        charge = (
+            await session.execute(select(Ledger).where(Ledger.message_id == admission.user_message_id))
+        ).scalar_one()
+        assert charge.delta == -1
+
+
+async def test_admission_refusal_writes_nothing(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company, user = await _seed_member(session, "empty@admission.test", pool=5, limit=0)
+
+        admission = await admit_chat_message(
+            session,
+            company_id=company.id,
+            user_id=user.id,
+            conversation_id=None,
+            client_message_id="empty-1",
+            content="hi",
+            content_ok=True,
+            model="gpt-5.2",
+            context_limit=10,
+            token_count=1,
+            lease_seconds=300,
+        )
+        await session.commit()
+
+        assert admission.admitted is False
+        assert admission.conversation_id is None
+        conversations = (
+            await session.execute(select(func.count()).select_from(Conversation))
+        ).scalar_one()
+        assert conversations == 0
+
+
+async def test_chat_admission_error_codes(async_client, engine, monkeypatch):
+    settings = get_settings()
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company, user = await _seed_member(session, "codes@admission.test", pool=1, limit=1)
+        other_company, other_user = await _seed_member(
+            session, "other@admission.test", pool=1, limit=1
+        )
+        foreign_convo = await create_conversation(session, other_company.id, other_user.id)
+        own_convo = await create_conversation(session, company.id, user.id)
+        cookie = await create_session_cookie(session, user.id)
+
+    async def fake_send_chat(_settings, _payload):
+        return ChatResponse(text="ok", usage=None)
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+    cookies = {settings.session_cookie_name: cookie}
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={"conversation_id": foreign_convo.id, "client_message_id": "c-1", "content": "hi"},
+        cookies=cookies,
+    )
+    assert resp.status_code == 404
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={
+            "conversation_id": own_convo.id,
+            "client_message_id": "c-2",
+            "content": "x" * (settings.max_message_chars + 1),
+        },
+        cookies=cookies,
+    )
+    assert resp.status_code == 400
+    assert resp.json()["detail"]["code"] == "content_too_long"
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={"conversation_id": own_convo.id, "client_message_id": "c-3", "content": "hi"},
+        cookies=cookies,
+    )
+    assert resp.status_code == 200
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={"conversation_id": own_convo.id, "client_message_id": "c-4", "content": "hi"},
+        cookies=cookies,
+    )
+    assert resp.status_code == 402
+    assert resp.json()["detail"]["code"] == "insufficient_company_credits"
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.schemas import ChatResponse
+
+import product_api.main as product_main
+from product_api.context_cache import ContextInvalidationListener, get_context_cache
+from product_api.models import UserCreditLimit
+from product_api.repositories import admit_chat_message
+from product_api.settings import get_settings
+
+from .utils import (
+    add_credits,
+    create_company,
+    create_conversation,
+    create_session_cookie,
+    create_user,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_warm_turn_uses_cached_context(async_client, engine, monkeypatch):
+    settings = get_settings()
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "ContextCacheCo")
+        user = await create_user(session, "user@context-cache.test", "member", company.id)
+        await add_credits(session, company.id, 10, reason="seed")
+        session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=10))
+        await session.commit()
+        cookie = await create_session_cookie(session, user.id)
+
+    sent_payloads = []
+
+    async def fake_send_chat(_settings, payload):
+        sent_payloads.append(payload)
+        return ChatResponse(text=f"reply {len(sent_payloads)}", usage=None)
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+    cookies = {settings.session_cookie_name: cookie}
+    cache = get_context_cache(settings)
+
+    first = await async_client.post(
+        "/v1/chat", json={"client_message_id": "cc-1", "content": "one"}, cookies=cookies
+    )
+    conversation_id = first.json()["conversation_id"]
+    hits_before = cache.stats()["hits"]
+
+    second = await async_client.post(
+        "/v1/chat",
+        json={"conversation_id": conversation_id, "client_message_id": "cc-2", "content": "two"},
+        cookies=cookies,
+    )
+
+    assert second.status_code == 200
+    assert cache.stats()["hits"] == hits_before + 1
+    assert [(m.role, m.content) for m in sent_payloads[1].messages] == [
+        ("user", "one"),
+        ("assistant", "reply 1"),
+        ("user", "two"),
+    ]
+    assert [(m.role, m.content) for m in cache.get(conversation_id, settings.chat_context_limit)] == [
+        ("user", "one"),
+        ("assistant", "reply 1"),
+        ("user", "two"),
+        ("assistant", "reply 2"),
+    ]
+
+
+async def test_admission_notifies_other_workers(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "ContextNotifyCo")
+        user = await create_user(session, "user@context-notify.test", "member", company.id)
+        await add_credits(session, company.id, 10, reason="seed")
+        session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=10))
+        await session.commit()
+        convo = await create_conversation(session, company.id, user.id)
+
+    cache = get_context_cache(get_settings())
+    cache.store(convo.id, 20, [], last_message_id=None)
+    listener = ContextInvalidationListener(cache)
+    other_worker = ContextInvalidationListener(cache)
+    await listener.start(engine)
+    try:
+        async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+            admission = await admit_chat_message(
+                session,
+                company_id=company.id,
+                user_id=user.id,
+                conversation_id=convo.id,
+                client_message_id="notify-1",
+                content="hi",
+                content_ok=True,
+                model="gpt-5.2",
+                context_limit=20,
+                token_count=1,
+                lease_seconds=300,
+                include_context=False,
+                notify_payload=other_worker.notify_payload(convo.id),
+            )
+            await session.commit()
+        assert admission.admitted is True
+        assert [(item.role, item.content) for item in admission.context] == [("user", "hi")]
+
+        for _ in range(50):
+            if cache.get(convo.id, 20) is None:
+                break
+            await asyncio.sleep(0.02)
+        assert cache.get(convo.id, 20) is None
+    finally:
+        await listener.stop()
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from product_api.models import Ledger, UserCreditLimit
+from product_api.repositories import (
+    ChatCreditsCompanyInsufficientError,
+    ChatCreditsUserInsufficientError,
+    UserLimitExceedsPoolError,
+    apply_user_limit_delta,
+    get_company_credit_totals,
+    get_company_pool_balance,
+    reserve_chat_credits,
+)
+
+from .utils import add_credits, add_message, create_company, create_conversation, create_user
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _seed(session: AsyncSession, pool: int, limit: int, messages: int):
+    company = await create_company(session, "Debit Co")
+    user = await create_user(session, "user@debit.test", "member", company.id)
+    await add_credits(session, company.id, pool)
+    session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=limit))
+    await session.commit()
+    convo = await create_conversation(session, company.id, user.id)
+    message_ids = []
+    for idx in range(messages):
+        message = await add_message(session, convo.id, "user", f"m{idx}")
+        message_ids.append(message.id)
+    return company.id, user.id, message_ids
+
+
+async def test_reserve_debits_user_limit_and_pool(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company_id, user_id, (message_id,) = await _seed(session, pool=10, limit=3, messages=1)
+
+        entry_id = await reserve_chat_credits(session, company_id, user_id, message_id)
+        await session.commit()
+
+        entry = await session.get(Ledger, entry_id)
+        assert entry.delta == -1
+        assert entry.idempotency_key == f"msg:{message_id}"
+        limit = (
+            await session.execute(
+                select(UserCreditLimit.remaining_credits).where(UserCreditLimit.user_id == user_id)
+            )
+        ).scalar_one()
+        assert limit == 2
+        assert await get_company_pool_balance(session, company_id) == 9
+
+
+async def test_reserve_keeps_insufficient_error_semantics(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company_id, user_id, message_ids = await _seed(session, pool=1, limit=1, messages=3)
+        other_company = await create_company(session, "Other Debit Co")
+
+        with pytest.raises(ChatCreditsCompanyInsufficientError, match="company not found"):
+            await reserve_chat_credits(session, 999_999, user_id, message_ids[0])
+        with pytest.raises(ChatCreditsUserInsufficientError, match="user not in company"):
+            await reserve_chat_credits(session, other_company.id, user_id, message_ids[0])
+
+        await reserve_chat_credits(session, company_id, user_id, message_ids[0])
+        await session.commit()
+        with pytest.raises(ChatCreditsUserInsufficientError, match="insufficient user credits"):
+            await reserve_chat_credits(session, company_id, user_id, message_ids[1])
+
+        # A negative adjustment can leave the pool below the allocated limits.
+        await session.execute(
+            UserCreditLimit.__table__.update()
+            .where(UserCreditLimit.user_id == user_id)
+            .values(remaining_credits=5)
+        )
+        await session.commit()
+        with pytest.raises(
+            ChatCreditsCompanyInsufficientError, match="insufficient company credits"
+        ):
+            await reserve_chat_credits(session, company_id, user_id, message_ids[2])
+
+
+async def test_concurrent_reserves_never_overdraw(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company_id, user_id, message_ids = await _seed(session, pool=100, limit=5, messages=20)
+
+    async def _attempt(message_id: int) -> bool:
+        async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+            try:
+                await reserve_chat_credits(session, company_id, user_id, message_id)
+            except ChatCreditsUserInsufficientError:
+                await session.rollback()
+                return False
+            await session.commit()
+            return True
+
+    results = await asyncio.gather(*(_attempt(message_id) for message_id in message_ids))
+
+    assert sum(results) == 5
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        assert await get_company_pool_balance(session, company_id) == 95
+        charged = (
+            await session.execute(
+                select(func.count()).select_from(Ledger).where(Ledger.reason == "chat_message")
+            )
+        ).scalar_one()
+        assert charged == 5
+
+
+async def test_limit_change_during_debit_keeps_allocation_within_pool(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company_id, debtor_id, (message_id,) = await _seed(session, pool=10, limit=6, messages=1)
+        other = await create_user(session, "other@debit.test", "member", company_id)
+        session.add(UserCreditLimit(company_id=company_id, user_id=other.id, remaining_credits=0))
+        await session.commit()
+
+    async def _debit() -> None:
+        async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+            await reserve_chat_credits(session, company_id, debtor_id, message_id)
+            await session.commit()
+
+    debit_task: asyncio.Task | None = None
+    async with AsyncSession(bind=engine, expire_on_commit=False) as admin:
+        execute = admin.execute
+
+        async def execute_then_debit(statement, *args, **kwargs):
+            # Lets a chat debit run right after the pool has been read.
+            nonlocal debit_task
+            result = await execute(statement, *args, **kwargs)
+            if debit_task is None and "company_balances" in str(statement):
+                debit_task = asyncio.create_task(_debit())
+                await asyncio.sleep(0.2)
+            return result
+
+        admin.execute = execute_then_debit
+        # 6 allocated + 5 exceeds the pool of 10 whether or not the debit of 1
+        # lands first; it only fits if an old pool is paired with a new total.
+        with pytest.raises(UserLimitExceedsPoolError):
+            await apply_user_limit_delta(admin, company_id, other.id, 5)
+    await debit_task
+
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        pool_balance, allocated_active = await get_company_credit_totals(session, company_id)
+    assert (pool_balance, allocated_active) == (9, 5)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.schemas import ChatResponse
+from shared.sse import final_digest
+
+import product_api.main as product_main
+from product_api.models import Message, UserCreditLimit
+from product_api.settings import get_settings
+
+from .utils import add_credits, create_company, create_session_cookie, create_user
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _seed_cookies(engine, name: str) -> dict[str, str]:
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, f"{name}Co")
+        user = await create_user(session, f"user@{name.lower()}.test", "member", company.id)
+        await add_credits(session, company.id, 10, reason="seed")
+        session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=10))
+        await session.commit()
+        cookie = await create_session_cookie(session, user.id)
+    return {get_settings().session_cookie_name: cookie}
+
+
+def _install_gateway(monkeypatch, deltas: list[str], final_text: str, fetched: list[str]):
+    requests = []
+
+    async def fake_stream_chat(_settings, payload):
+        requests.append(payload)
+        for piece in deltas:
+            yield "delta", {"text": piece}
+        yield "final", {**final_digest(final_text, {"total_tokens": 4}), "stream_id": "s-1"}
+
+    async def fake_fetch_final_text(_settings, stream_id):
+        fetched.append(stream_id)
+        return ChatResponse(text=final_text, usage={"total_tokens": 4})
+
+    monkeypatch.setattr(product_main, "stream_chat", fake_stream_chat)
+    monkeypatch.setattr(product_main, "fetch_final_text", fake_fetch_final_text)
+    return requests
+
+
+async def _assistant(engine) -> Message:
+    async with AsyncSession(bind=engine) as session:
+        result = await session.execute(select(Message).where(Message.role == "assistant"))
+        return result.scalar_one()
+
+
+async def test_digest_final_rebuilds_text_from_deltas(async_client, engine, monkeypatch):
+    cookies = await _seed_cookies(engine, "DigestOk")
+    fetched: list[str] = []
+    requests = _install_gateway(monkeypatch, ["Hel", "lo"], "Hello", fetched)
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={"client_message_id": "digest-1", "content": "hi", "stream": True},
+        cookies=cookies,
+    )
+
+    assert resp.status_code == 200
+    assert requests[0].final_mode == "digest"
+    assert fetched == []
+    assert 'event: final\ndata: {"text": "Hello", "usage": {"total_tokens": 4}}' in resp.text
+    row = await _assistant(engine)
+    assert row.content == "Hello"
+    assert row.usage_json == {"total_tokens": 4}
+
+
+async def test_digest_mismatch_fetches_full_text(async_client, engine, monkeypatch):
+    cookies = await _seed_cookies(engine, "DigestMismatch")
+    fetched: list[str] = []
+    _install_gateway(monkeypatch, ["Hel"], "Hello", fetched)
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={"client_message_id": "digest-2", "content": "hi", "stream": True},
+        cookies=cookies,
+    )
+
+    assert resp.status_code == 200
+    assert fetched == ["s-1"]
+    assert (await _assistant(engine)).content == "Hello"
+
+
+async def test_digest_mismatch_keeps_deltas_when_final_is_gone(async_client, engine, monkeypatch):
+    cookies = await _seed_cookies(engine, "DigestMissing")
+    _install_gateway(monkeypatch, ["Hel"], "Hello", [])
+
+    async def missing_final_text(_settings, stream_id):
+        # Another gateway worker served the stream.
+        raise product_main.GatewayError("gateway status 404")
+
+    monkeypatch.setattr(product_main, "fetch_final_text", missing_final_text)
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={"client_message_id": "digest-4", "content": "hi", "stream": True},
+        cookies=cookies,
+    )
+
+    assert resp.status_code == 200
+    assert "event: error" not in resp.text
+    row = await _assistant(engine)
+    assert row.status == "completed"
+    assert row.content == "Hel"
+
+
+async def test_browser_can_negotiate_digest_final(async_client, engine, monkeypatch):
+    cookies = await _seed_cookies(engine, "DigestBrowser")
+    _install_gateway(monkeypatch, ["Hel", "lo"], "Hello", [])
+
+    resp = await async_client.post(
+        "/v1/chat",
+        json={
+            "client_message_id": "digest-3",
+            "content": "hi",
+            "stream": True,
+            "final_mode": "digest",
+        },
+        cookies=cookies,
+    )
+
+    final_frame = [frame for frame in resp.text.split("\n\n") if "event: final" in frame][0]
+    final = json.loads(final_frame.split("data: ", 1)[1])
+    assert final == {
+        "length": 5,
+        "sha256": hashlib.sha256(b"Hello").hexdigest(),
+        "usage": {"total_tokens": 4},
+    }
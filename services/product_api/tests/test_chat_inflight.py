@@ -0,0 +1,309 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.schemas import ChatResponse
+
+import product_api.main as product_main
+from product_api.inflight import get_inflight_registry
+from product_api.models import Message, UserCreditLimit
+from product_api.settings import get_settings
+
+from .utils import (
+    add_credits,
+    add_message,
+    create_company,
+    create_conversation,
+    create_session_cookie,
+    create_user,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _seed_user(engine, name: str) -> str:
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, f"{name}Co")
+        user = await create_user(session, f"user@{name.lower()}.test", "member", company.id)
+        await add_credits(session, company.id, 10, reason="seed")
+        session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=10))
+        await session.commit()
+        return await create_session_cookie(session, user.id)
+
+
+async def test_duplicate_request_attaches_to_inflight_generation(async_client, engine, monkeypatch):
+    settings = get_settings()
+    cookies = {settings.session_cookie_name: await _seed_user(engine, "InflightAttach")}
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = []
+
+    async def fake_send_chat(_settings, payload):
+        calls.append(payload)
+        started.set()
+        await release.wait()
+        return ChatResponse(text="only once", usage={"total_tokens": 2})
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+    body = {"client_message_id": "dup-1", "content": "hello"}
+
+    first = asyncio.create_task(async_client.post("/v1/chat", json=body, cookies=cookies))
+    await asyncio.wait_for(started.wait(), timeout=5)
+    conversation_id = (await _assistant_row(engine)).conversation_id
+    retry_body = dict(body, conversation_id=conversation_id)
+    second = asyncio.create_task(async_client.post("/v1/chat", json=retry_body, cookies=cookies))
+    await asyncio.sleep(0.05)
+    release.set()
+
+    first_resp, second_resp = await asyncio.gather(first, second)
+
+    assert first_resp.status_code == 200
+    assert second_resp.status_code == 200
+    assert second_resp.json()["assistant_message_id"] == first_resp.json()["assistant_message_id"]
+    assert second_resp.json()["assistant_status"] == "completed"
+    assert len(calls) == 1
+    row = await _assistant_row(engine)
+    assert row.status == "completed"
+    assert row.content == "only once"
+    assert row.inflight_until is None
+
+
+async def test_unexpected_failure_releases_lease(async_client, engine, monkeypatch):
+    settings = get_settings()
+    cookies = {settings.session_cookie_name: await _seed_user(engine, "InflightCrash")}
+
+    async def fake_send_chat(_settings, payload):
+        raise httpx.ReadTimeout("timed out")
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+
+    resp = await async_client.post(
+        "/v1/chat", json={"client_message_id": "crash-1", "content": "hello"}, cookies=cookies
+    )
+
+    assert resp.status_code == 502
+    row = await _assistant_row(engine)
+    assert row.status == "error"
+    assert row.inflight_until is None
+
+
+async def test_long_generation_renews_its_lease(async_client, engine, monkeypatch):
+    settings = get_settings()
+    cookies = {settings.session_cookie_name: await _seed_user(engine, "InflightRenew")}
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fake_send_chat(_settings, payload):
+        started.set()
+        await release.wait()
+        return ChatResponse(text="slow", usage=None)
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+    monkeypatch.setattr(settings, "chat_inflight_lease_seconds", 3)
+
+    first = asyncio.create_task(
+        async_client.post("/v1/chat", json={"client_message_id": "renew-1", "content": "hello"}, cookies=cookies)
+    )
+    await asyncio.wait_for(started.wait(), timeout=5)
+    claimed_until = (await _assistant_row(engine)).inflight_until
+    await asyncio.sleep(1.5)
+    renewed_until = (await _assistant_row(engine)).inflight_until
+    release.set()
+    resp = await first
+
+    assert resp.status_code == 200
+    assert renewed_until > claimed_until
+    row = await _assistant_row(engine)
+    assert row.status == "completed"
+    assert row.inflight_until is None
+
+
+async def test_duplicate_on_other_worker_follows_leased_row(async_client, engine, monkeypatch):
+    settings = get_settings()
+    cookies = {settings.session_cookie_name: await _seed_user(engine, "InflightRemote")}
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = []
+
+    async def fake_send_chat(_settings, payload):
+        calls.append(payload)
+        started.set()
+        await release.wait()
+        return ChatResponse(text="from elsewhere", usage=None)
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+    monkeypatch.setattr(settings, "chat_inflight_poll_interval_seconds", 0.01)
+    body = {"client_message_id": "remote-1", "content": "hello"}
+
+    first = asyncio.create_task(async_client.post("/v1/chat", json=body, cookies=cookies))
+    await asyncio.wait_for(started.wait(), timeout=5)
+    row = await _assistant_row(engine)
+    # Pretend the owner lives in another process.
+    get_inflight_registry(settings).clear()
+
+    second = asyncio.create_task(
+        async_client.post(
+            "/v1/chat",
+            json=dict(body, conversation_id=row.conversation_id, stream=True),
+            cookies=cookies,
+        )
+    )
+    await asyncio.sleep(0.05)
+    assert not second.done()
+    async with AsyncSession(bind=engine) as session:
+        await session.execute(
+            update(Message)
+            .where(Message.id == row.id)
+            .values(status="completed", content="from elsewhere", inflight_until=None)
+        )
+        await session.commit()
+
+    second_resp = await asyncio.wait_for(second, timeout=5)
+    release.set()
+    await first
+
+    assert second_resp.status_code == 200
+    assert 'event: final\ndata: {"text": "from elsewhere", "usage": null}' in second_resp.text
+    assert len(calls) == 1
+
+
+async def _assistant_row(engine):
+    async with AsyncSession(bind=engine) as session:
+        result = await session.execute(select(Message).where(Message.role == "assistant"))
+        return result.scalar_one()
+
+
+async def test_resume_stream_replays_after_last_event_id(async_client, engine, monkeypatch):
+    settings = get_settings()
+    cookies = {settings.session_cookie_name: await _seed_user(engine, "InflightResume")}
+    halfway = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fake_stream_chat(_settings, _payload):
+        yield "delta", {"text": "Hel"}
+        yield "delta", {"text": "lo"}
+        halfway.set()
+        await release.wait()
+        yield "delta", {"text": "!"}
+        yield "final", {"text": "Hello!", "usage": None}
+
+    monkeypatch.setattr(product_main, "stream_chat", fake_stream_chat)
+    monkeypatch.setattr(settings, "chat_sse_coalesce_max_latency_ms", 0)
+    body = {"client_message_id": "resume-1", "content": "hello", "stream": True}
+
+    first = asyncio.create_task(async_client.post("/v1/chat", json=body, cookies=cookies))
+    await asyncio.wait_for(halfway.wait(), timeout=5)
+    row = await _assistant_row(engine)
+    resumed = asyncio.create_task(
+        async_client.get(
+            f"/v1/chat/messages/{row.id}/stream",
+            headers={"Last-Event-ID": "2"},
+            cookies=cookies,
+        )
+    )
+    await asyncio.sleep(0.05)
+    release.set()
+    first_resp, resumed_resp = await asyncio.gather(first, resumed)
+
+    assert 'id: 1\nevent: delta\ndata: {"text": "Hel"}' in first_resp.text
+    assert resumed_resp.status_code == 200
+    assert resumed_resp.text == (
+        'id: 3\nevent: delta\ndata: {"text": "!"}\n\n'
+        'id: 4\nevent: final\ndata: {"text": "Hello!", "usage": null}\n\n'
+    )
+
+    # Once the generation is over the persisted answer is served.
+    late = await async_client.get(
+        f"/v1/chat/messages/{row.id}/stream", headers={"Last-Event-ID": "2"}, cookies=cookies
+    )
+    assert late.text == 'event: final\ndata: {"text": "Hello!", "usage": null}\n\n'
+
+
+async def test_resume_stream_is_scoped_to_owner(async_client, engine):
+    settings = get_settings()
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "InflightOwnerCo")
+        owner = await create_user(session, "owner@inflight-owner.test", "member", company.id)
+        other = await create_user(session, "other@inflight-owner.test", "member", company.id)
+        convo = await create_conversation(session, company.id, owner.id)
+        assistant = await add_message(session, convo.id, "assistant", "done")
+        cookie = await create_session_cookie(session, other.id)
+
+    resp = await async_client.get(
+        f"/v1/chat/messages/{assistant.id}/stream",
+        cookies={settings.session_cookie_name: cookie},
+    )
+
+    assert resp.status_code == 404
+
+
+async def test_client_disconnect_cancels_gateway_stream(async_client, engine, monkeypatch):
+    # async_client installs the session override; the app is driven directly
+    # below so the disconnect can be sent mid-stream.
+    settings = get_settings()
+    cookie = await _seed_user(engine, "InflightCancel")
+    registry = get_inflight_registry(settings)
+    monkeypatch.setattr(registry, "_detach_grace_seconds", 0.0)
+    first_delta = asyncio.Event()
+    gateway_closed = asyncio.Event()
+
+    async def fake_stream_chat(_settings, _payload):
+        try:
+            yield "delta", {"text": "partial answer"}
+            first_delta.set()
+            await asyncio.Event().wait()
+        finally:
+            gateway_closed.set()
+
+    monkeypatch.setattr(product_main, "stream_chat", fake_stream_chat)
+    monkeypatch.setattr(settings, "chat_sse_coalesce_max_latency_ms", 0)
+    body = json.dumps({"client_message_id": "cancel-1", "content": "hi", "stream": True}).encode()
+    received = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+        await first_delta.wait()
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/chat",
+        "raw_path": b"/v1/chat",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"test"),
+            (b"content-type", b"application/json"),
+            (b"cookie", f"{settings.session_cookie_name}={cookie}".encode()),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    await asyncio.wait_for(product_main.app(scope, receive, send), timeout=5)
+    await asyncio.wait_for(gateway_closed.wait(), timeout=5)
+    for _ in range(50):
+        row = await _assistant_row(engine)
+        if row.status == "error":
+            break
+        await asyncio.sleep(0.01)
+
+    assert sent[0]["status"] == 200
+    assert row.status == "error"
+    assert row.content == "partial answer"
+    assert row.inflight_until is None
+    assert registry.stats()["cancelled"] >= 1
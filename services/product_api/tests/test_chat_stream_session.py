@@ -0,0 +1,66 @@
+import httpx
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import product_api.main as product_main
+from product_api.db.session import get_session
+from product_api.models import Message, UserCreditLimit
+from product_api.settings import get_settings
+
+from .utils import add_credits, create_company, create_session_cookie, create_user
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_stream_releases_db_connection_while_proxying(engine, db_url, monkeypatch):
+    settings = get_settings()
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "StreamPoolCo")
+        user = await create_user(session, "user@stream-pool.test", "member", company.id)
+        await add_credits(session, company.id, 5, reason="seed")
+        session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=5))
+        await session.commit()
+        cookie = await create_session_cookie(session, user.id)
+
+    # One connection in total: any query issued mid-stream only succeeds if the
+    # request handed its connection back before proxying the gateway.
+    single_conn_engine = create_async_engine(db_url, pool_size=1, max_overflow=0, pool_timeout=2)
+    mid_stream_checks: list[int] = []
+
+    async def fake_stream_chat(_settings, _payload):
+        yield "delta", {"text": "Hel"}
+        async with single_conn_engine.connect() as conn:
+            mid_stream_checks.append((await conn.execute(text("SELECT 1"))).scalar_one())
+        yield "delta", {"text": "lo"}
+        yield "final", {"text": "Hello", "usage": {"total_tokens": 2}}
+
+    async def _override_get_session():
+        async with AsyncSession(bind=single_conn_engine, expire_on_commit=False) as session:
+            yield session
+
+    monkeypatch.setattr(product_main, "stream_chat", fake_stream_chat)
+    product_main.app.dependency_overrides[get_session] = _override_get_session
+    try:
+        transport = httpx.ASGITransport(app=product_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/v1/chat",
+                json={"client_message_id": "stream-pool-1", "content": "hi", "stream": True},
+                cookies={settings.session_cookie_name: cookie},
+            )
+    finally:
+        product_main.app.dependency_overrides.clear()
+        await single_conn_engine.dispose()
+
+    assert resp.status_code == 200
+    assert "event: final" in resp.text
+    assert mid_stream_checks == [1]
+
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        assistant = (
+            await session.execute(select(Message).where(Message.role == "assistant"))
+        ).scalar_one()
+        assert assistant.status == "completed"
+        assert assistant.content == "Hello"
+        assert assistant.usage_json == {"total_tokens": 2}
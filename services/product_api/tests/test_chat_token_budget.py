@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.schemas import ChatResponse
+
+import product_api.main as product_main
+from product_api.models import Message, UserCreditLimit
+from product_api.settings import get_settings
+from product_api.tokens import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+
+from .utils import add_credits, create_company, create_session_cookie, create_user
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_chat_context_respects_token_budget(async_client, engine, monkeypatch):
+    settings = get_settings()
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "TokenBudgetCo")
+        user = await create_user(session, "user@token-budget.test", "member", company.id)
+        await add_credits(session, company.id, 10, reason="seed")
+        session.add(UserCreditLimit(company_id=company.id, user_id=user.id, remaining_credits=10))
+        await session.commit()
+        cookie = await create_session_cookie(session, user.id)
+
+    sent_payloads = []
+
+    async def fake_send_chat(_settings, payload):
+        sent_payloads.append(payload)
+        return ChatResponse(text="short reply", usage=None)
+
+    monkeypatch.setattr(product_main, "send_chat", fake_send_chat)
+    cookies = {settings.session_cookie_name: cookie}
+    long_text = "word " * 400
+
+    first = await async_client.post(
+        "/v1/chat", json={"client_message_id": "tb-1", "content": long_text}, cookies=cookies
+    )
+    conversation_id = first.json()["conversation_id"]
+
+    budget = (
+        estimate_tokens("short reply")
+        + estimate_tokens("next")
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    monkeypatch.setattr(product_main.settings, "chat_context_token_budget", budget)
+    second = await async_client.post(
+        "/v1/chat",
+        json={"conversation_id": conversation_id, "client_message_id": "tb-2", "content": "next"},
+        cookies=cookies,
+    )
+
+    assert second.status_code == 200
+    payload = sent_payloads[1]
+    assert [(m.role, m.content) for m in payload.messages] == [
+        ("assistant", "short reply"),
+        ("user", "next"),
+    ]
+    assert payload.metadata.context_token_budget == budget
+    assert payload.metadata.context_tokens == budget
+
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        counts = (
+            await session.execute(
+                select(Message.content, Message.token_count).order_by(Message.id)
+            )
+        ).all()
+    assert [count for _content, count in counts] == [
+        estimate_tokens(long_text),
+        estimate_tokens("short reply"),
+        estimate_tokens("next"),
+        estimate_tokens("short reply"),
+    ]
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from product_api.repositories import get_company_pool_balance, reconcile_company_pool_balances
+from product_api.settings import get_settings
+
+from .utils import add_credits, create_company, create_session_cookie, create_user
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_ledger_inserts_maintain_company_balance(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "Balance Co")
+        other = await create_company(session, "Other Balance Co")
+        assert await get_company_pool_balance(session, company.id) == 0
+
+        await add_credits(session, company.id, 100)
+        await add_credits(session, company.id, -30)
+        await add_credits(session, other.id, 7)
+
+        assert await get_company_pool_balance(session, company.id) == 70
+        assert await get_company_pool_balance(session, other.id) == 7
+        assert await reconcile_company_pool_balances(session) == []
+
+
+async def test_reconcile_reports_and_repairs_drift(engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "Drift Co")
+        await add_credits(session, company.id, 50)
+        await session.execute(
+            text("UPDATE company_balances SET balance = 5 WHERE company_id = :id"),
+            {"id": company.id},
+        )
+        await session.commit()
+
+        mismatches = await reconcile_company_pool_balances(session)
+        assert mismatches == [
+            {"company_id": company.id, "ledger_balance": 50, "stored_balance": 5}
+        ]
+        assert await get_company_pool_balance(session, company.id) == 5
+
+        await reconcile_company_pool_balances(session, repair=True)
+        assert await get_company_pool_balance(session, company.id) == 50
+        assert await reconcile_company_pool_balances(session) == []
+
+
+async def test_reconcile_endpoint_requires_superadmin(async_client, engine):
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        company = await create_company(session, "Reconcile Endpoint Co")
+        member = await create_user(session, "member@reconcile.test", "member", company.id)
+        superadmin = await create_user(
+            session, "super@reconcile.test", None, None, is_superadmin=True
+        )
+        member_cookie = await create_session_cookie(session, member.id)
+        super_cookie = await create_session_cookie(session, superadmin.id)
+        await add_credits(session, company.id, 10)
+
+    cookie_name = get_settings().session_cookie_name
+    resp = await async_client.post(
+        "/admin/ledger/reconcile", cookies={cookie_name: member_cookie}
+    )
+    assert resp.status_code == 403
+
+    resp = await async_client.post(
+        "/admin/ledger/reconcile", cookies={cookie_name: super_cookie}
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "ok", "repaired": False, "mismatches": []}
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from product_api.auth import utcnow
+from product_api.claims.counterparty_store import CounterpartyStore
+from product_api.claims.datanewton_client import DataNewtonClient
+from product_api.settings import get_settings
+from product_api.warm_counterparties import warm_counterparties
+
+
+def _party(name: str) -> dict:
+    return {
+        "kind": "legal_entity",
+        "company_name": name,
+        "position_raw": "директор",
+        "person_name": "Иванов Иван Иванович",
+        "address": None,
+    }
+
+
+async def test_counterparty_store_upsert_keeps_newest_row(engine):
+    store = CounterpartyStore(async_sessionmaker(engine, expire_on_commit=False))
+    now = utcnow()
+
+    await store.put("7701234567", _party("ООО «Новое»"), fetched_at=now)
+    await store.put("7701234567", _party("ООО «Старое»"), fetched_at=now - timedelta(days=1))
+
+    stored = await store.get("7701234567")
+    assert stored is not None
+    assert stored.payload["company_name"] == "ООО «Новое»"
+    assert stored.fetched_at == now
+    assert await store.get("7801234567") is None
+    assert set(await store.get_many(["7701234567", "7801234567"])) == {"7701234567"}
+
+
+async def test_warm_counterparties_fetches_missing_and_stale_rows(engine, monkeypatch):
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    store = CounterpartyStore(session_maker)
+    await store.put("7701234567", _party("ООО «Свежее»"))
+    await store.put("7801234567", _party("ООО «Старое»"), fetched_at=utcnow() - timedelta(days=30))
+    settings = get_settings().model_copy(
+        update={"datanewton_enabled": True, "datanewton_api_key": "test-key", "datanewton_retry_count": 0}
+    )
+    calls: list[str] = []
+
+    async def fake_request_once(self, inn: str):
+        calls.append(inn)
+        return None if inn == "7901234567" else _party(f"ООО «{inn}»")
+
+    monkeypatch.setattr(DataNewtonClient, "_request_counterparty_once", fake_request_once)
+
+    counts = await warm_counterparties(
+        settings,
+        session_maker,
+        ["7701234567", " 7801234567 ", "7901234567", "7601234567", "7601234567"],
+    )
+
+    assert sorted(calls) == ["7601234567", "7801234567", "7901234567"]
+    assert counts == {"candidates": 4, "fresh": 1, "found": 2, "not_found": 1, "failed": 0}
+    rows = await store.get_many(["7601234567", "7701234567", "7801234567", "7901234567"])
+    assert rows["7701234567"].payload["company_name"] == "ООО «Свежее»"
+    assert rows["7801234567"].payload["company_name"] == "ООО «7801234567»"
+    assert "7901234567" not in rows
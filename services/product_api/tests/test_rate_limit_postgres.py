@@ -0,0 +1,19 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from product_api.rate_limit import PostgresRateLimiter, RateLimitConfig
+
+
+async def test_postgres_rate_limiter_is_shared_between_instances(engine):
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    config = RateLimitConfig(max_requests=2, window_seconds=60)
+    worker_a = PostgresRateLimiter(config, session_maker)
+    worker_b = PostgresRateLimiter(config, session_maker)
+
+    assert (await worker_a.acquire("email:ip")).allowed is True
+    assert (await worker_b.acquire("email:ip")).allowed is True
+
+    denied = await worker_a.acquire("email:ip")
+    assert denied.allowed is False
+    assert 0 < denied.retry_after_seconds <= 30
+
+    assert (await worker_b.acquire("other:ip")).allowed is True
@@ -26,6 +26,7 @@ os.environ.setdefault("DATANEWTON_TIMEOUT_SECONDS", "10")
 os.environ.setdefault("DATANEWTON_RETRY_COUNT", "1")
 os.environ.setdefault("DATANEWTON_COUNTERPARTY_FILTERS", "MANAGER_BLOCK,ADDRESS_BLOCK")
 os.environ.setdefault("DATANEWTON_CACHE_TTL_SECONDS", "300")
+os.environ.setdefault("DATANEWTON_STORE_ENABLED", "false")
 os.environ.setdefault(
     "CLAIMS_UPLOAD_DIR", str((REPO_ROOT / ".tmp" / "product_api_claims").as_posix())
 )
@@ -47,9 +48,17 @@ from product_api import settings as settings_module
 settings_module.get_settings.cache_clear()
 
 from product_api.db.session import get_session
+from product_api.gateway_router import reset_gateway_router
 from product_api.main import app as fastapi_app
 
 
+@pytest.fixture(autouse=True)
+def _reset_gateway_router():
+    reset_gateway_router()
+    yield
+    reset_gateway_router()
+
+
 @pytest.fixture()
 def mock_session():
     session = MagicMock()
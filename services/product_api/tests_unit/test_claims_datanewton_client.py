@@ -1,5 +1,11 @@
+import asyncio
+from datetime import timedelta
+
 import pytest
+from sqlalchemy.exc import OperationalError
 
+from product_api.auth import utcnow
+from product_api.claims.counterparty_store import StoredCounterparty
 from product_api.claims.datanewton_client import DataNewtonClient, DataNewtonError
 from product_api.settings import Settings
 
@@ -173,3 +179,273 @@ async def test_datanewton_client_sends_filters_to_all_candidate_paths(monkeypatc
     assert requests[1]["url"].endswith("/api_ext/v1/counterparty")
     for request in requests:
         assert request["params"]["filters"] == "MANAGER_BLOCK,ADDRESS_BLOCK"
+
+
+def _enabled_settings(**overrides) -> Settings:
+    values = {
+        "DATANEWTON_ENABLED": True,
+        "DATANEWTON_API_KEY": "test-key",
+        "DATANEWTON_RETRY_COUNT": 0,
+        "DATANEWTON_CACHE_TTL_SECONDS": 60,
+    }
+    values.update(overrides)
+    return _build_settings(**values)
+
+
+def _party(name: str) -> dict:
+    return {
+        "kind": "legal_entity",
+        "company_name": name,
+        "position_raw": "директор",
+        "person_name": "Иванов Иван Иванович",
+        "address": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_coalesces_concurrent_lookups(monkeypatch):
+    client = DataNewtonClient(_enabled_settings())
+    release = asyncio.Event()
+    calls: list[str] = []
+
+    async def fake_request_once(inn: str):
+        calls.append(inn)
+        await release.wait()
+        return _party("ООО «Вектор»")
+
+    monkeypatch.setattr(client, "_request_counterparty_once", fake_request_once)
+
+    lookups = [asyncio.create_task(client.fetch_party_by_inn(inn)) for inn in ["7701234567", " 7701234567 "] * 3]
+    await asyncio.sleep(0)
+    # The first caller going away does not cancel the shared request.
+    lookups[0].cancel()
+    release.set()
+    results = await asyncio.gather(*lookups[1:])
+
+    assert calls == ["7701234567"]
+    assert all(result["company_name"] == "ООО «Вектор»" for result in results)
+    stats = client.stats()
+    assert stats["requests"] == 1
+    assert stats["coalesced"] == 5
+    assert stats["in_flight"] == 0
+
+    assert (await client.fetch_party_by_inn("7701234567"))["company_name"] == "ООО «Вектор»"
+    assert client.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_caches_empty_results_but_not_failures(monkeypatch):
+    client = DataNewtonClient(_enabled_settings())
+    outcomes = {"7701234567": [None], "7801234567": [DataNewtonError("status_503"), _party("ООО «Альфа»")]}
+    calls: list[str] = []
+
+    async def fake_request_once(inn: str):
+        calls.append(inn)
+        outcome = outcomes[inn].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(client, "_request_counterparty_once", fake_request_once)
+
+    assert await client.fetch_party_by_inn("7701234567") is None
+    assert await client.fetch_party_by_inn("7701234567") is None
+    assert await client.fetch_party_by_inn("7801234567") is None
+    assert (await client.fetch_party_by_inn("7801234567"))["company_name"] == "ООО «Альфа»"
+
+    assert calls == ["7701234567", "7801234567", "7801234567"]
+    stats = client.stats()
+    assert stats["hits"] == 1
+    assert stats["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_cache_is_bounded_lru_with_expiry(monkeypatch):
+    client = DataNewtonClient(_enabled_settings(DATANEWTON_CACHE_MAX_ENTRIES=2))
+    now = [1000.0]
+    monkeypatch.setattr("product_api.claims.datanewton_client.time.time", lambda: now[0])
+
+    async def fake_request_once(inn: str):
+        return _party(inn)
+
+    monkeypatch.setattr(client, "_request_counterparty_once", fake_request_once)
+
+    await client.fetch_party_by_inn("7701234567")
+    await client.fetch_party_by_inn("7801234567")
+    await client.fetch_party_by_inn("7701234567")  # now most recently used
+    await client.fetch_party_by_inn("7901234567")
+
+    assert list(client._cache) == ["7701234567", "7901234567"]
+    assert client.stats()["evictions"] == 1
+
+    # Entries past their TTL are swept on the next access, not only on read.
+    now[0] += 61
+    await client.fetch_party_by_inn("500100732259")
+    assert list(client._cache) == ["500100732259"]
+    assert client.stats()["expired"] == 2
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_reuses_one_http_client(monkeypatch):
+    client = DataNewtonClient(_enabled_settings(DATANEWTON_CACHE_TTL_SECONDS=0))
+    created: list[object] = []
+
+    class FakeResponse:
+        status_code = 200
+        text = ""
+
+        def json(self) -> dict:
+            return {"data": {"company": {"company_names": {"short_name": "Vector LLC"}}}}
+
+    class FakeAsyncClient:
+        def __init__(self, *args, **kwargs):
+            created.append(self)
+            self.closed = False
+
+        async def get(self, url, params=None):
+            return FakeResponse()
+
+        async def aclose(self):
+            self.closed = True
+
+    monkeypatch.setattr("product_api.claims.datanewton_client.httpx.AsyncClient", FakeAsyncClient)
+
+    for inn in ("7701234567", "7801234567", "7701234567"):
+        assert (await client.fetch_party_by_inn(inn))["company_name"] == "Vector LLC"
+
+    assert len(created) == 1
+    await client.aclose()
+    assert created[0].closed is True
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_remembers_working_path(monkeypatch):
+    client = DataNewtonClient(_enabled_settings(DATANEWTON_CACHE_TTL_SECONDS=0))
+    now = [100.0]
+    monkeypatch.setattr("product_api.claims.datanewton_client.time.monotonic", lambda: now[0])
+    live_paths = {"/api_ext/v1/counterparty"}
+    requested: list[str] = []
+
+    class FakeResponse:
+        def __init__(self, status_code: int):
+            self.status_code = status_code
+            self.text = ""
+
+        def json(self) -> dict:
+            return {"data": {"company": {"company_names": {"short_name": "Vector LLC"}}}}
+
+    class FakeAsyncClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def get(self, url, params=None):
+            path = url.removeprefix("https://api.datanewton.ru")
+            requested.append(path)
+            return FakeResponse(200 if path in live_paths else 404)
+
+    monkeypatch.setattr("product_api.claims.datanewton_client.httpx.AsyncClient", FakeAsyncClient)
+
+    await client.fetch_party_by_inn("7701234567")
+    await client.fetch_party_by_inn("7801234567")
+    await client.fetch_party_by_inn("7901234567")
+    assert requested == ["/v1/counterparty", "/api_ext/v1/counterparty"] + ["/api_ext/v1/counterparty"] * 2
+
+    # After the revalidation interval the preferred path is tried again.
+    live_paths.add("/v1/counterparty")
+    now[0] += 3600
+    requested.clear()
+    await client.fetch_party_by_inn("7701234567")
+    await client.fetch_party_by_inn("7801234567")
+    assert requested == ["/v1/counterparty", "/v1/counterparty"]
+
+    # A remembered path that disappears falls back to the other candidate.
+    live_paths = {"/api_ext/v1/counterparty"}
+    requested.clear()
+    await client.fetch_party_by_inn("7701234567")
+    await client.fetch_party_by_inn("7801234567")
+    assert requested == ["/v1/counterparty", "/api_ext/v1/counterparty", "/api_ext/v1/counterparty"]
+
+    stats = client.stats()
+    assert stats["path_misses"] == 2
+    assert stats["path_discoveries"] == 3
+    assert stats["known_paths"] == {"https://api.datanewton.ru": "/api_ext/v1/counterparty"}
+
+
+class _MemoryStore:
+    def __init__(self, rows: dict[str, StoredCounterparty] | None = None, fail: bool = False) -> None:
+        self.rows = dict(rows or {})
+        self.fail = fail
+
+    async def get(self, inn: str):
+        if self.fail:
+            raise OperationalError("SELECT", {}, Exception("connection refused"))
+        return self.rows.get(inn)
+
+    async def put(self, inn: str, payload: dict) -> None:
+        if self.fail:
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+        self.rows[inn] = StoredCounterparty(payload=payload, fetched_at=utcnow())
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_reads_through_persistent_store(monkeypatch):
+    day = 24 * 3600
+    store = _MemoryStore(
+        {
+            "7701234567": StoredCounterparty(_party("ООО «Свежее»"), utcnow() - timedelta(days=1)),
+            "7801234567": StoredCounterparty(_party("ООО «Старое»"), utcnow() - timedelta(days=10)),
+            "7901234567": StoredCounterparty(_party("ООО «Древнее»"), utcnow() - timedelta(days=100)),
+        }
+    )
+    client = DataNewtonClient(
+        _enabled_settings(
+            DATANEWTON_CACHE_TTL_SECONDS=0,
+            DATANEWTON_STORE_REFRESH_SECONDS=7 * day,
+            DATANEWTON_STORE_MAX_AGE_SECONDS=90 * day,
+        ),
+        store=store,
+    )
+    calls: list[str] = []
+
+    async def fake_request_once(inn: str):
+        calls.append(inn)
+        return _party(f"ООО «{inn}»")
+
+    monkeypatch.setattr(client, "_request_counterparty_once", fake_request_once)
+
+    # Fresh row: no request.
+    assert (await client.fetch_party_by_inn("7701234567"))["company_name"] == "ООО «Свежее»"
+    assert calls == []
+
+    # Stale row: served at once and refreshed in the background.
+    assert (await client.fetch_party_by_inn("7801234567"))["company_name"] == "ООО «Старое»"
+    await asyncio.gather(*client._refreshing.values())
+    assert calls == ["7801234567"]
+    assert store.rows["7801234567"].payload["company_name"] == "ООО «7801234567»"
+
+    # Rows past the max age and unknown INNs are fetched and stored.
+    assert (await client.fetch_party_by_inn("7901234567"))["company_name"] == "ООО «7901234567»"
+    assert (await client.fetch_party_by_inn("7601234567"))["company_name"] == "ООО «7601234567»"
+    assert calls == ["7801234567", "7901234567", "7601234567"]
+    assert "7601234567" in store.rows
+
+    stats = client.stats()
+    assert stats["store_hits"] == 2
+    assert stats["store_misses"] == 2
+    assert stats["refreshes"] == 1
+    assert stats["refreshing"] == 0
+
+
+@pytest.mark.asyncio
+async def test_datanewton_client_falls_back_to_api_when_store_fails(monkeypatch):
+    client = DataNewtonClient(_enabled_settings(), store=_MemoryStore(fail=True))
+
+    async def fake_request_once(inn: str):
+        return _party("ООО «Вектор»")
+
+    monkeypatch.setattr(client, "_request_counterparty_once", fake_request_once)
+
+    assert (await client.fetch_party_by_inn("7701234567"))["company_name"] == "ООО «Вектор»"
+    stats = client.stats()
+    assert stats["requests"] == 1
+    assert stats["store_errors"] == 2
@@ -95,3 +95,34 @@ def test_parse_datanewton_prefers_manager_fio_over_unrelated_fio():
     assert parsed is not None
     assert parsed["person_name"] == "Петров Петр Петрович"
     assert parsed["position_raw"] == "директор"
+
+
+def test_parse_datanewton_nested_lookups_follow_document_order():
+    payload = {
+        "data": {
+            "founders": [{"inn": "7701111111", "is_organization": True}],
+            "branches": [
+                {
+                    "head": {
+                        "name": "  ",
+                        "deputy": {"fio": "Сидоров Сидор Сидорович"},
+                        "title": "руководитель филиала",
+                    }
+                }
+            ],
+            "manager": {"fio": "Иванов Иван Иванович", "position": "директор"},
+            "contacts": {"legal_address": "г. Тверь"},
+        }
+    }
+
+    parsed = parse_datanewton_counterparty_payload(payload, fallback_inn="780123456789")
+
+    # The first manager-like block in document order wins, and lookups inside
+    # it stay within that block.
+    assert parsed == {
+        "kind": "legal_entity",
+        "company_name": None,
+        "position_raw": "руководитель филиала",
+        "person_name": "Сидоров Сидор Сидорович",
+        "address": "г. Тверь",
+    }
@@ -316,6 +316,47 @@ async def test_get_preview_with_null_header_keeps_null_without_artificial_shape(
     assert payload["preview_header"] is None
 
 
+async def test_get_preview_rebuilds_partial_header(async_client, mock_session, monkeypatch):
+    claim = _base_claim(311)
+    claim.generated_preview_text = "Draft preview text"
+    claim.preview_header_json = {
+        "format_version": 2,
+        "from_party": {},
+        "to_party": {},
+        "partial": True,
+    }
+    mock_session.execute.return_value = DummyResult(claim)
+
+    from product_api.claims.preview_header_enrichment import build_preview_header_from_normalized_data
+    from product_api.routers import public_claims as public_claims_router
+
+    rebuilt: list[int] = []
+
+    async def fake_rebuild_claim_preview_header(_settings, target_claim):
+        rebuilt.append(target_claim.id)
+        target_claim.preview_header_json = build_preview_header_from_normalized_data(
+            target_claim.normalized_data_json
+        )
+        return target_claim.preview_header_json
+
+    monkeypatch.setattr(
+        public_claims_router,
+        "rebuild_claim_preview_header",
+        fake_rebuild_claim_preview_header,
+    )
+
+    resp = await async_client.get(
+        "/claims/311/preview",
+        headers={"X-Claim-Edit-Token": "valid-token"},
+    )
+
+    assert resp.status_code == 200
+    assert rebuilt == [311]
+    assert mock_session.commit.await_count == 1
+    assert "partial" not in claim.preview_header_json
+    assert resp.json()["preview_header"]["to_party"]["rendered"]["line2"] == "OOO Vector"
+
+
 async def test_get_preview_old_payload_line2_null_bridge_is_stable(async_client, mock_session):
     claim = _base_claim(305)
     claim.generated_preview_text = "Draft preview text"
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+
 import pytest
 
 from product_api.claims import preview_header_enrichment
@@ -682,3 +684,130 @@ async def test_rebuild_claim_preview_header_skips_ai_when_feature_flag_disabled(
 
     assert ai_call_count == 0
     assert header["from_party"]["rendered"]["line3"] == "Петрова Петра Петровича"
+
+
+def _legal_entity_party(company_name: str, person_name: str) -> dict[str, object]:
+    return {
+        "kind": "legal_entity",
+        "company_name": company_name,
+        "position_raw": "директор",
+        "person_name": person_name,
+        "address": None,
+    }
+
+
+async def test_rebuild_claim_preview_header_runs_both_sides_concurrently(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    settings = _build_settings(CLAIMS_PREVIEW_HEADER_DEADLINE_SECONDS=5)
+    claim = _build_claim(
+        {
+            "creditor_name": "OOO Alpha",
+            "creditor_inn": "7701234567",
+            "debtor_name": "OOO Vector",
+            "debtor_inn": "7801234567",
+        }
+    )
+    parties = {
+        "7701234567": _legal_entity_party("OOO Alpha", "Петров Петр Петрович"),
+        "7801234567": _legal_entity_party("OOO Vector", "Иванов Иван Иванович"),
+    }
+    started: list[str] = []
+    both_started = asyncio.Event()
+    transformed: list[str] = []
+
+    async def fake_fetch(_settings: Settings, inn: str) -> dict[str, object] | None:
+        # Only returns once both lookups are in flight.
+        started.append(inn)
+        if len(started) == 2:
+            both_started.set()
+        await both_started.wait()
+        return parties[inn]
+
+    async def fake_transform(
+        _settings: Settings,
+        *,
+        raw_fio: str | None,
+        target_case: str,
+        entity_kind: str,
+        strip_ip_prefix: bool,
+    ) -> PersonNameAIResult:
+        transformed.append(target_case)
+        return PersonNameAIResult(
+            status="ok",
+            fio=f"{raw_fio} ({target_case})",
+            preprocessed_fio=raw_fio,
+            error_code=None,
+            cache_hit=False,
+        )
+
+    monkeypatch.setattr(preview_header_enrichment, "fetch_datanewton_party_by_inn", fake_fetch)
+    monkeypatch.setattr(preview_header_enrichment, "transform_person_name_with_ai", fake_transform)
+
+    header = await asyncio.wait_for(
+        preview_header_enrichment.rebuild_claim_preview_header(settings, claim),
+        timeout=1,
+    )
+
+    assert sorted(started) == ["7701234567", "7801234567"]
+    assert sorted(transformed) == ["dative", "genitive"]
+    assert header["from_party"]["rendered"]["line3"] == "Петров Петр Петрович (genitive)"
+    assert header["to_party"]["rendered"]["line3"] == "Иванов Иван Иванович (dative)"
+    assert "partial" not in header
+
+
+async def test_rebuild_claim_preview_header_deadline_keeps_finished_side(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    settings = _build_settings(CLAIMS_PREVIEW_HEADER_DEADLINE_SECONDS=0.05)
+    claim = _build_claim(
+        {
+            "creditor_name": "OOO Alpha",
+            "creditor_inn": "7701234567",
+            "debtor_name": "OOO Vector",
+            "debtor_inn": "7801234567",
+        }
+    )
+    cancelled: list[str] = []
+
+    async def fake_fetch(_settings: Settings, inn: str) -> dict[str, object] | None:
+        if inn == "7701234567":
+            return _legal_entity_party("OOO Alpha", "Петров Петр Петрович")
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(inn)
+            raise
+        return None
+
+    async def fake_transform(
+        _settings: Settings,
+        *,
+        raw_fio: str | None,
+        target_case: str,
+        entity_kind: str,
+        strip_ip_prefix: bool,
+    ) -> PersonNameAIResult:
+        return PersonNameAIResult(
+            status="ok",
+            fio="Петрова Петра Петровича",
+            preprocessed_fio=raw_fio,
+            error_code=None,
+            cache_hit=False,
+        )
+
+    monkeypatch.setattr(preview_header_enrichment, "fetch_datanewton_party_by_inn", fake_fetch)
+    monkeypatch.setattr(preview_header_enrichment, "transform_person_name_with_ai", fake_transform)
+
+    header = await preview_header_enrichment.rebuild_claim_preview_header(settings, claim)
+
+    assert cancelled == ["7801234567"]
+    assert header["from_party"]["person_name"] == "Петров Петр Петрович"
+    assert header["from_party"]["rendered"]["line3"] == "Петрова Петра Петровича"
+    # The debtor side falls back to what the claim itself provides.
+    assert header["to_party"]["company_name"] == "OOO Vector"
+    assert header["to_party"]["person_name"] is None
+    assert header["to_party"]["rendered"]["line2"] == "OOO Vector"
+    # Stored as-is for this response, but rebuilt on the next read.
+    assert header["partial"] is True
+    assert preview_header_enrichment.preview_header_needs_rebuild(claim.preview_header_json)
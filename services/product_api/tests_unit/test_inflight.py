@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from product_api.inflight import InflightRegistry
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _collect(stream) -> list[tuple[str, dict]]:
+    return [item async for item in stream.subscribe()]
+
+
+async def test_late_subscriber_replays_buffer_and_follows_live_events():
+    registry = InflightRegistry(detach_grace_seconds=1.0)
+    release = asyncio.Event()
+
+    async def producer(stream):
+        await stream.publish("delta", {"text": "Hel"})
+        await release.wait()
+        await stream.publish("delta", {"text": "lo"})
+        await stream.publish("final", {"text": "Hello", "usage": None})
+
+    stream = registry.open(1, producer)
+    first = asyncio.create_task(_collect(stream))
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert registry.get(1) is stream
+
+    second = asyncio.create_task(_collect(stream))
+    await asyncio.sleep(0)
+    release.set()
+
+    expected = [
+        (1, "delta", {"text": "Hel"}),
+        (2, "delta", {"text": "lo"}),
+        (3, "final", {"text": "Hello", "usage": None}),
+    ]
+    assert await first == expected
+    assert await second == expected
+    assert registry.get(1) is None
+    assert len(registry) == 0
+
+
+async def test_wait_result_returns_terminal_event():
+    registry = InflightRegistry(detach_grace_seconds=1.0)
+
+    async def producer(stream):
+        await stream.publish("error", {"code": "gateway_error"})
+
+    stream = registry.open(2, producer)
+
+    assert await stream.wait_result() == ("error", {"code": "gateway_error"})
+
+
+async def test_orphaned_stream_is_cancelled_after_grace():
+    registry = InflightRegistry(detach_grace_seconds=0.01)
+    cancelled = asyncio.Event()
+
+    async def producer(stream):
+        await stream.publish("delta", {"text": "x"})
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    stream = registry.open(3, producer)
+    events = stream.subscribe()
+    assert await events.__anext__() == (1, "delta", {"text": "x"})
+    await events.aclose()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1.0)
+    await asyncio.sleep(0)
+    assert stream.done is True
+    assert registry.get(3) is None
+
+
+async def test_reattach_within_grace_keeps_producer_running():
+    registry = InflightRegistry(detach_grace_seconds=0.05)
+    release = asyncio.Event()
+
+    async def producer(stream):
+        await stream.publish("delta", {"text": "a"})
+        await release.wait()
+        await stream.publish("final", {"text": "ab", "usage": None})
+
+    stream = registry.open(4, producer)
+    events = stream.subscribe()
+    await events.__anext__()
+    await events.aclose()
+
+    retry = asyncio.create_task(_collect(stream))
+    await asyncio.sleep(0.1)
+    release.set()
+
+    assert await retry == [(1, "delta", {"text": "a"}), (2, "final", {"text": "ab", "usage": None})]
+
+
+async def test_resume_after_last_event_id_skips_delivered_events():
+    registry = InflightRegistry(detach_grace_seconds=1.0)
+
+    async def producer(stream):
+        for piece in ("a", "b", "c"):
+            await stream.publish("delta", {"text": piece})
+        await stream.publish("final", {"text": "abc", "usage": None})
+
+    stream = registry.open(5, producer)
+    events = [item async for item in stream.subscribe(after_event_id=2)]
+
+    assert events == [(3, "delta", {"text": "c"}), (4, "final", {"text": "abc", "usage": None})]
+
+
+async def test_resume_before_replay_window_gets_catch_up_delta():
+    registry = InflightRegistry(detach_grace_seconds=1.0, replay_events=2)
+    release = asyncio.Event()
+
+    async def producer(stream):
+        for piece in ("a", "b", "c", "d"):
+            await stream.publish("delta", {"text": piece})
+        await release.wait()
+        await stream.publish("final", {"text": "abcd", "usage": None})
+
+    stream = registry.open(6, producer)
+    await asyncio.sleep(0)
+    assert stream.text == "abcd"
+
+    resumed = asyncio.create_task(_collect_after(stream, 1))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await resumed == [
+        (2, "delta", {"text": "b"}),
+        (3, "delta", {"text": "c"}),
+        (4, "delta", {"text": "d"}),
+        (5, "final", {"text": "abcd", "usage": None}),
+    ]
+    # Window holds events 4 and 5 now; everything before collapses into one delta.
+    assert [item async for item in stream.subscribe(after_event_id=1)] == [
+        (3, "delta", {"text": "bc"}),
+        (4, "delta", {"text": "d"}),
+        (5, "final", {"text": "abcd", "usage": None}),
+    ]
+
+
+async def _collect_after(stream, after_event_id: int) -> list[tuple[int, str, dict]]:
+    return [item async for item in stream.subscribe(after_event_id)]
@@ -0,0 +1,69 @@
+import pytest
+
+import product_api.main as product_main
+from product_api.rate_limit import RateLimitConfig, RateLimiter
+
+
+def test_rate_limiter_allows_burst_up_to_max_requests():
+    limiter = RateLimiter(RateLimitConfig(max_requests=3, window_seconds=60))
+
+    decisions = [limiter.check("k", now=1000.0) for _ in range(4)]
+
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert decisions[-1].retry_after_seconds == pytest.approx(20.0)
+
+
+def test_rate_limiter_refills_at_emission_interval():
+    limiter = RateLimiter(RateLimitConfig(max_requests=2, window_seconds=60))
+    assert limiter.check("k", now=0.0).allowed is True
+    assert limiter.check("k", now=0.0).allowed is True
+    assert limiter.check("k", now=10.0).allowed is False
+
+    assert limiter.check("k", now=30.0).allowed is True
+    assert limiter.check("k", now=30.0).allowed is False
+    assert limiter.check("k", now=90.0).allowed is True
+
+
+def test_rate_limiter_keys_are_independent():
+    limiter = RateLimiter(RateLimitConfig(max_requests=1, window_seconds=60))
+
+    assert limiter.allow("a") is True
+    assert limiter.allow("a") is False
+    assert limiter.allow("b") is True
+
+
+def test_rate_limiter_evicts_idle_keys():
+    limiter = RateLimiter(RateLimitConfig(max_requests=10, window_seconds=60))
+    for idx in range(1000):
+        limiter.check(f"ip:{idx}", now=0.0)
+    assert len(limiter) == 1000
+
+    limiter.check("ip:late", now=61.0)
+
+    assert len(limiter) == 1
+
+
+def test_rate_limiter_bounds_key_count():
+    limiter = RateLimiter(RateLimitConfig(max_requests=10, window_seconds=60), max_keys=50)
+
+    for idx in range(200):
+        limiter.check(f"ip:{idx}", now=float(idx) / 100)
+
+    assert len(limiter) <= 51
+
+
+@pytest.mark.asyncio
+async def test_request_link_rate_limited_returns_retry_after(async_client, monkeypatch):
+    monkeypatch.setattr(
+        product_main,
+        "rate_limiter",
+        RateLimiter(RateLimitConfig(max_requests=1, window_seconds=60)),
+    )
+
+    first = await async_client.post("/auth/request-link", json={"email": "user@example.com"})
+    second = await async_client.post("/auth/request-link", json={"email": "user@example.com"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.json()["detail"]["code"] == "rate_limited"
+    assert 1 <= int(second.headers["Retry-After"]) <= 60
@@ -0,0 +1,44 @@
+from product_api.tokens import (
+    MESSAGE_OVERHEAD_TOKENS,
+    ContextMessage,
+    context_message,
+    estimate_tokens,
+    select_context,
+)
+
+
+def _msg(content: str, tokens: int) -> ContextMessage:
+    return ContextMessage(role="user", content=content, token_count=tokens)
+
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello, world!") == 4
+    assert estimate_tokens("internationalization") == 4
+    assert estimate_tokens("привет") == 2
+
+
+def test_estimate_tokens_is_cached():
+    estimate_tokens.cache_clear()
+    estimate_tokens("cached text")
+    estimate_tokens("cached text")
+    assert estimate_tokens.cache_info().hits == 1
+
+
+def test_context_message_estimates_missing_counts():
+    assert context_message("user", "hello world", None).token_count == 2
+    assert context_message("user", "hello world", 7).token_count == 7
+
+
+def test_select_context_fills_budget_newest_first():
+    messages = [_msg("old", 10), _msg("mid", 10), _msg("new", 10)]
+    per_message = 10 + MESSAGE_OVERHEAD_TOKENS
+
+    assert select_context(messages, per_message * 3) == messages
+    assert select_context(messages, per_message * 2 + 1) == messages[1:]
+
+
+def test_select_context_keeps_oversized_newest_message():
+    messages = [_msg("short", 1), _msg("huge paste", 50_000)]
+
+    assert select_context(messages, 100) == messages[1:]
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -11,6 +13,8 @@ class ChatMetadata(BaseModel):
     user_id: int
     conversation_id: int
     message_id: int
+    context_token_budget: int | None = None
+    context_tokens: int | None = None
 
 
 class ChatRequest(BaseModel):
@@ -19,6 +23,9 @@ class ChatRequest(BaseModel):
     stream: bool = False
     timeout: int | None = None
     metadata: ChatMetadata
+    # "digest": the streamed final event carries length + sha256 instead of
+    # the text, which the receiver already assembled from the deltas.
+    final_mode: Literal["full", "digest"] = "full"
 
 
 class ChatResponse(BaseModel):
@@ -0,0 +1,135 @@
+import hashlib
+import json
+from collections.abc import AsyncIterator
+from typing import NamedTuple
+
+
+class SSEEvent(NamedTuple):
+    # A tuple rather than a dataclass: one is built per frame on the hot path.
+    event: str
+    data: str
+    id: str | None = None
+
+    def json(self) -> dict:
+        try:
+            return json.loads(self.data)
+        except json.JSONDecodeError:
+            return {"raw": self.data}
+
+
+def format_sse(event: str, data: dict, event_id: int | None = None) -> str:
+    frame = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return frame if event_id is None else f"id: {event_id}\n{frame}"
+
+
+def final_digest(text: str, usage: dict | None) -> dict:
+    return {
+        "length": len(text),
+        "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "usage": usage,
+    }
+
+
+def matches_final_digest(text: str, data: dict) -> bool:
+    if data.get("length") != len(text):
+        return False
+    return hashlib.sha256(text.encode("utf-8")).hexdigest() == data.get("sha256")
+
+
+class SSEDecoder:
+    # Incremental decoder over raw bytes. Complete frames are cut off the
+    # buffer with one rfind/split per chunk and decoded in one go, so a UTF-8
+    # sequence split across chunks is never a problem.
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._pending_cr = False
+
+    def feed(self, chunk: bytes) -> list[SSEEvent]:
+        if self._pending_cr:
+            chunk = b"\r" + chunk
+            self._pending_cr = False
+        if b"\r" in chunk:
+            if chunk.endswith(b"\r"):
+                chunk = chunk[:-1]
+                self._pending_cr = True
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        buffer = self._buffer
+        search_from = max(len(buffer) - 1, 0)
+        buffer += chunk
+        if buffer.find(b"\n\n", search_from) < 0:
+            return []
+        end = buffer.rfind(b"\n\n")
+        block = buffer[:end].decode("utf-8")
+        del buffer[: end + 2]
+        return _parse_frames(block)
+
+    def flush(self) -> list[SSEEvent]:
+        # A stream may end without the trailing blank line.
+        self._pending_cr = False
+        block = self._buffer.decode("utf-8")
+        self._buffer.clear()
+        return _parse_frames(block)
+
+
+def _parse_frames(block: str) -> list[SSEEvent]:
+    events: list[SSEEvent] = []
+    for frame in block.split("\n\n"):
+        # Fast path for the frames both hops actually send: an optional
+        # "event:" line followed by a single "data:" line.
+        event = "message"
+        head = frame
+        if frame.startswith("event: "):
+            event, _, head = frame[7:].partition("\n")
+        if head.startswith("data: ") and "\n" not in head:
+            events.append(SSEEvent(event, head[6:]))
+            continue
+        event = "message"
+        data: list[str] = []
+        event_id = None
+        for line in frame.split("\n"):
+            field, _, value = line.partition(":")
+            if value[:1] == " ":
+                value = value[1:]
+            if field == "data":
+                data.append(value)
+            elif field == "event":
+                event = value
+            elif field == "id":
+                event_id = value
+        if data:
+            events.append(SSEEvent(event, "\n".join(data), event_id))
+    return events
+
+
+def parse_json_events(events: list[SSEEvent]) -> list[tuple[str, dict]]:
+    # All frames cut from one network chunk are parsed with a single
+    # json.loads over a synthetic array; per-frame parsing is the fallback
+    # when any of them is not JSON.
+    if not events:
+        return []
+    try:
+        payloads = json.loads("[" + ",".join(event.data for event in events) + "]")
+    except json.JSONDecodeError:
+        payloads = None
+    if payloads is None or len(payloads) != len(events):
+        return [(event.event, event.json()) for event in events]
+    return list(zip((event.event for event in events), payloads))
+
+
+async def iter_sse(chunks: AsyncIterator[bytes]) -> AsyncIterator[SSEEvent]:
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
+
+
+async def iter_sse_json(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, dict]]:
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for item in parse_json_events(decoder.feed(chunk)):
+            yield item
+    for item in parse_json_events(decoder.flush()):
+        yield item
@@ -0,0 +1,126 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TypeVar
+
+T = TypeVar("T")
+
+Receive = Callable[[], Awaitable[dict]]
+
+
+async def iterate_until_disconnect(receive: Receive, items: AsyncIterator[T]) -> AsyncIterator[T]:
+    # A background watcher listens for http.disconnect. If it arrives while we
+    # are waiting on items, the wait is cancelled in this task, so the source's
+    # own cleanup (closing its HTTP stream) runs immediately instead of on the
+    # next chunk.
+    task = asyncio.current_task()
+    waiting = False
+    disconnected = False
+
+    async def watch() -> None:
+        nonlocal disconnected
+        while True:
+            message = await receive()
+            if message.get("type") == "http.disconnect":
+                break
+        disconnected = True
+        if waiting and task is not None:
+            task.cancel()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        while not disconnected:
+            waiting = True
+            try:
+                item = await anext(items)
+            except StopAsyncIteration:
+                return
+            except asyncio.CancelledError:
+                if not disconnected or task is None:
+                    raise
+                task.uncancel()
+                return
+            finally:
+                waiting = False
+            yield item
+    finally:
+        watcher.cancel()
+        aclose = getattr(items, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+_END = object()
+
+
+async def coalesce_deltas(
+    items: AsyncIterator[tuple[str, dict]],
+    max_latency_seconds: float,
+    max_bytes: int,
+) -> AsyncIterator[tuple[str, dict]]:
+    # Merges runs of ("delta", {"text": ...}) events into one, flushing when the
+    # oldest buffered delta is max_latency_seconds old, when max_bytes of text
+    # are buffered, or before any other event. Other events pass through
+    # unchanged, so the delta/final/error contract is preserved.
+    if max_latency_seconds <= 0:
+        try:
+            async for item in items:
+                yield item
+        finally:
+            aclose = getattr(items, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+    async def pump() -> None:
+        # The source is iterated and closed entirely inside this task, also
+        # when it is cancelled while waiting for room in the queue.
+        try:
+            async for item in items:
+                await queue.put(item)
+        except Exception as exc:
+            await queue.put((_END, exc))
+        else:
+            await queue.put((_END, None))
+        finally:
+            aclose = getattr(items, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    pump_task = asyncio.create_task(pump())
+    pending: list[str] = []
+    pending_bytes = 0
+    deadline: float | None = None
+    try:
+        while True:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                event, data = None, None
+            if event == "delta":
+                text = data.get("text", "")
+                if not text:
+                    continue
+                if deadline is None:
+                    deadline = loop.time() + max_latency_seconds
+                pending.append(text)
+                pending_bytes += len(text.encode("utf-8"))
+                if pending_bytes < max_bytes:
+                    continue
+            if pending:
+                yield "delta", {"text": "".join(pending)}
+                pending = []
+                pending_bytes = 0
+                deadline = None
+            if event is _END:
+                if data is not None:
+                    raise data
+                return
+            if event is not None and event != "delta":
+                yield event, data
+    finally:
+        pump_task.cancel()
+        await asyncio.gather(pump_task, return_exceptions=True)